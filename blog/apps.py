@@ -1,5 +1,12 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class BlogConfig(AppConfig):
     name = "blog"
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .schema import restore_schema
+
+        post_migrate.connect(restore_schema, sender=self)
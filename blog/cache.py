@@ -0,0 +1,125 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+
+DEFAULT_TIMEOUT = 300
+# Stale entries are kept this much longer than their freshness window so that
+# other workers can keep serving them while one worker recomputes.
+STALE_GRACE = 60
+LOCK_TIMEOUT = 10
+LOCK_WAIT = 0.5
+LOCK_POLL_INTERVAL = 0.05
+
+_stats = {"hits": 0, "stale_hits": 0, "misses": 0, "waits": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def stats():
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _cache():
+    return caches[getattr(settings, "BLOG_CACHE_ALIAS", "default")]
+
+
+def _version_key(pk):
+    return "blog:post:{}:version".format(pk)
+
+
+def _lock_key(pk, version):
+    return "blog:post:{}:{}:lock".format(pk, version)
+
+
+def _data_key(pk, version):
+    return "blog:post:{}:{}".format(pk, version)
+
+
+def _current_version(cache, pk):
+    version = cache.get(_version_key(pk))
+    if version is None:
+        # Start from a clock value rather than 1 so an evicted version key
+        # can never point back at an older entry that is still cached.
+        cache.add(_version_key(pk), int(time.time() * 1000), None)
+        version = cache.get(_version_key(pk))
+    return version
+
+
+def _store(cache, key, value):
+    timeout = getattr(settings, "BLOG_POST_CACHE_TIMEOUT", DEFAULT_TIMEOUT)
+    entry = {"value": value, "fresh_until": time.time() + timeout}
+    cache.set(key, entry, timeout + STALE_GRACE)
+
+
+def _load(cache, pk, version, loader):
+    try:
+        value = loader()
+        _store(cache, _data_key(pk, version), value)
+        return value
+    finally:
+        cache.delete(_lock_key(pk, version))
+
+
+def get_post_payload(pk, loader):
+    """
+    Read-through cache for the serialized payload of post ``pk``.
+
+    ``loader`` is called on a miss and may raise (e.g. ``Post.DoesNotExist``);
+    failures are not cached. Only the worker holding the recompute lock calls
+    ``loader`` for a hot key: others serve the stale entry, or briefly wait
+    for the winner when there is nothing to serve.
+    """
+    cache = _cache()
+    version = _current_version(cache, pk)
+    key = _data_key(pk, version)
+    lock_key = _lock_key(pk, version)
+
+    entry = cache.get(key)
+    if entry is not None:
+        if entry["fresh_until"] > time.time():
+            _count("hits")
+            return entry["value"]
+        if not cache.add(lock_key, 1, LOCK_TIMEOUT):
+            _count("stale_hits")
+            return entry["value"]
+        _count("misses")
+        return _load(cache, pk, version, loader)
+
+    if not cache.add(lock_key, 1, LOCK_TIMEOUT):
+        _count("waits")
+        deadline = time.time() + LOCK_WAIT
+        while time.time() < deadline:
+            time.sleep(LOCK_POLL_INTERVAL)
+            entry = cache.get(key)
+            if entry is not None:
+                _count("hits")
+                return entry["value"]
+        # The lock holder is slow or gone; compute without waiting further.
+        cache.add(lock_key, 1, LOCK_TIMEOUT)
+
+    _count("misses")
+    return _load(cache, pk, version, loader)
+
+
+def _bump_version(pk):
+    try:
+        _cache().incr(_version_key(pk))
+    except ValueError:
+        # No version key means nothing reachable is cached for this post.
+        pass
+
+
+def invalidate_post(pk):
+    _bump_version(pk)
+    # Bump again once the transaction commits, so a reader that recomputed
+    # from pre-commit data in the meantime isn't served afterwards.
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: _bump_version(pk))
@@ -0,0 +1,55 @@
+import hashlib
+
+from django.db.models import Count, Max
+from django.views.decorators.http import condition
+
+
+def collection_state(queryset):
+    """Row count and newest ``updated_date`` of ``queryset`` in one query."""
+    return queryset.aggregate(count=Count("id"), last_modified=Max("updated_date"))
+
+
+def conditional(get_state, modified_since=True):
+    """
+    Answer ``If-None-Match``/``If-Modified-Since`` with 304 before the view
+    runs. ``get_state(request, *args, **kwargs)`` returns the result of
+    ``collection_state`` for what the view would serialize, or ``None`` to
+    skip validation (e.g. so the view can 404). A ``version`` in the state
+    becomes part of the ETag.
+
+    Collections from which rows can be deleted pass ``modified_since=False``:
+    their newest ``updated_date`` goes back when the newest row is deleted,
+    so only the ETag, which includes the row count, can tell they changed.
+    """
+
+    def state(request, *args, **kwargs):
+        if not hasattr(request, "_blog_collection_state"):
+            request._blog_collection_state = get_state(request, *args, **kwargs)
+        return request._blog_collection_state
+
+    def etag(request, *args, **kwargs):
+        current = state(request, *args, **kwargs)
+        if not current or not current["count"]:
+            return None
+        raw = "{}|{}|{}|{}".format(
+            request.get_full_path(),
+            request.META.get("HTTP_ACCEPT", ""),
+            current["count"],
+            current["last_modified"].timestamp(),
+        )
+        digest = hashlib.md5(raw.encode()).hexdigest()
+        if "version" in current:
+            # A single row's ETag leads with its version, so it can be sent
+            # back as If-Match with an edit (see blog.edits.parse_version).
+            return "{}-{}".format(current["version"], digest)
+        return digest
+
+    def last_modified(request, *args, **kwargs):
+        current = state(request, *args, **kwargs)
+        if not current:
+            return None
+        return current["last_modified"]
+
+    return condition(
+        etag_func=etag, last_modified_func=last_modified if modified_since else None
+    )
@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import Comment, Post
+from .serializers import comment_serializer, post_list_serializer
+
+DEFAULT_RECENT = 5
+
+
+def author_counts(author, now=None):
+    """
+    The author's drafts, published posts and comments on them by status, from
+    one query: the author's posts LEFT JOINed with their comments and counted
+    with conditional aggregates.
+    """
+    now = now or timezone.now()
+    # The join repeats a post once per comment, hence the DISTINCT post counts.
+    return Post.objects.filter(author=author).aggregate(
+        drafts=Count("id", filter=Q(published_date__isnull=True), distinct=True),
+        published=Count("id", filter=Q(published_date__lte=now), distinct=True),
+        pending_comments=Count("comments", filter=Q(comments__approved_comment=False)),
+        approved_comments=Count("comments", filter=Q(comments__approved_comment=True)),
+    )
+
+
+def _recent(queryset, serializer, order):
+    limit = getattr(settings, "BLOG_DASHBOARD_RECENT", DEFAULT_RECENT)
+    rows = serializer.values(queryset, serializer.default_fields).order_by(*order)
+    return [
+        serializer.serialize(row, serializer.default_fields) for row in rows[:limit]
+    ]
+
+
+def author_dashboard(author):
+    now = timezone.now()
+    posts = Post.objects.filter(author=author)
+    return {
+        "counts": author_counts(author, now),
+        "drafts": _recent(
+            posts.filter(published_date__isnull=True),
+            post_list_serializer,
+            ("-created_date", "-id"),
+        ),
+        "published": _recent(
+            posts.filter(published_date__lte=now),
+            post_list_serializer,
+            ("-published_date", "-id"),
+        ),
+        "pending_comments": _recent(
+            Comment.objects.filter(
+                post__author=author, post__is_removed=False, approved_comment=False
+            ),
+            comment_serializer,
+            ("-created_date", "-id"),
+        ),
+    }
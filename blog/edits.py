@@ -0,0 +1,141 @@
+import sqlite3
+
+from django.db import connections, router, transaction
+from django.db.models import F, sql
+from django.utils import timezone
+
+from .pagination import is_id
+
+
+class InvalidVersion(ValueError):
+    pass
+
+
+class EditConflict(Exception):
+    """The row was edited since the version the client based its edit on."""
+
+    def __init__(self, version):
+        super().__init__("version {} is current".format(version))
+        self.version = version
+
+
+def etag(version):
+    return '"{}"'.format(version)
+
+
+# Versions start at 1, so an edit conditional on this one never matches.
+NO_VERSION = 0
+
+
+def parse_version(request, data):
+    """
+    The version an edit is based on, from an ``If-Match`` header or a
+    ``version`` field in the body. None (no precondition, or ``If-Match: *``)
+    makes the edit unconditional.
+
+    ``If-Match`` takes the ETag of an edit response, ``"<version>"``, or of
+    post_detail, ``"<version>-<digest>"``. Any other value, including one
+    too large for the version column, names no version and fails the
+    precondition.
+    """
+    header = request.META.get("HTTP_IF_MATCH")
+    if header is not None:
+        value = header.strip()
+        if value == "*":
+            return None
+        if value.startswith("W/"):
+            value = value[2:]
+        value = value.strip('"').split("-", 1)[0]
+        if not value.isdigit() or not is_id(int(value)):
+            return NO_VERSION
+        return int(value)
+
+    value = data.get("version")
+    if value is not None and not is_id(value):
+        raise InvalidVersion(value)
+    return value
+
+
+def _can_return(connection):
+    if connection.vendor == "postgresql":
+        return True
+    # UPDATE ... RETURNING arrived in SQLite 3.35.
+    return connection.vendor == "sqlite" and sqlite3.sqlite_version_info >= (3, 35)
+
+
+def update_returning(queryset, values, names):
+    """
+    ``queryset.update(**values)`` that also returns the updated rows as dicts
+    of the fields in ``names``, like ``.values(*names)``.
+
+    Where the database supports ``UPDATE ... RETURNING`` this is a single
+    statement. Elsewhere the rows are locked, updated and read back in one
+    transaction.
+    """
+    model = queryset.model
+    using = router.db_for_write(model)
+    connection = connections[using]
+    values = dict(values)
+    for field in model._meta.concrete_fields:
+        # What TimestampedQuerySet.update() does for auto_now fields.
+        if getattr(field, "auto_now", False):
+            values.setdefault(field.name, timezone.now())
+
+    if not _can_return(connection):
+        with transaction.atomic(using=using):
+            pks = list(
+                queryset.select_for_update().order_by().values_list("pk", flat=True)
+            )
+            # Not the default manager: its filter (Post hides removed posts)
+            # may no longer match rows this update changed.
+            rows = model._base_manager.using(using).filter(pk__in=pks)
+            rows.update(**values)
+            return list(rows.values(*names))
+
+    query = queryset.query.chain(sql.UpdateQuery)
+    query.add_update_values(values)
+    statement, params = query.get_compiler(using).as_sql()
+
+    columns = []
+    for name in names:
+        column = model._meta.get_field(name).get_col(model._meta.db_table)
+        converters = connection.ops.get_db_converters(column)
+        converters += column.get_db_converters(connection)
+        columns.append((name, column, converters))
+    statement += " RETURNING " + ", ".join(
+        connection.ops.quote_name(column.target.column) for _, column, _ in columns
+    )
+
+    with connection.cursor() as cursor:
+        cursor.execute(statement, params)
+        result = cursor.fetchall()
+
+    rows = []
+    for record in result:
+        row = {}
+        for (name, column, converters), value in zip(columns, record):
+            for converter in converters:
+                value = converter(value, column, connection)
+            row[name] = value
+        rows.append(row)
+    return rows
+
+
+def edit(model, pk, changes, names, version=None):
+    """
+    Write ``changes`` to row ``pk`` and bump its version with one UPDATE,
+    conditional on ``version`` when given, and return the row's ``names``.
+
+    Raises ``model.DoesNotExist`` or ``EditConflict``; telling those apart
+    takes a second query, on the failure path only.
+    """
+    rows = model.objects.filter(pk=pk)
+    matching = rows if version is None else rows.filter(version=version)
+    updated = update_returning(matching, dict(changes, version=F("version") + 1), names)
+    if updated:
+        return updated[0]
+
+    current = rows.values_list("version", flat=True).first()
+    if current is None:
+        raise model.DoesNotExist
+    raise EditConflict(current)
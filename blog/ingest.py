@@ -0,0 +1,275 @@
+import atexit
+import fcntl
+import glob
+import json
+import logging
+import os
+import threading
+import uuid
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Comment, Post
+from .rendering import render_many
+from .threads import fill_paths
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 0.05
+DEFAULT_MAX_ROWS = 500
+JOURNAL_PATTERN = "comments-*.journal"
+
+
+def write_comments(entries):
+    """
+    Insert buffered comments with one bulk_create. Comments whose post or
+    parent comment was deleted after they were accepted are dropped.
+    """
+    html = render_many(entry["text"] for entry in entries)
+    with transaction.atomic():
+        existing = set(
+            Post.objects.filter(pk__in={entry["post"] for entry in entries})
+            .order_by()
+            .values_list("id", flat=True)
+        )
+        parents = set(
+            Comment.objects.filter(
+                pk__in={entry.get("parent") for entry in entries} - {None}
+            )
+            .order_by()
+            .values_list("id", flat=True)
+        )
+        comments = [
+            Comment(
+                post_id=entry["post"],
+                parent_id=entry.get("parent"),
+                author=entry["author"],
+                text=entry["text"],
+                text_html=html[entry["text"]],
+                created_date=parse_datetime(entry["created_date"]),
+            )
+            for entry in entries
+            if entry["post"] in existing and entry.get("parent") in parents | {None}
+        ]
+        # New comments are unapproved, so approved_comment_count, the search
+        # index and the cached post_detail payload are unaffected.
+        Comment.objects.bulk_create(comments)
+        fill_paths({comment.post_id for comment in comments})
+    if len(comments) < len(entries):
+        logger.warning(
+            "Dropped %d buffered comments on deleted posts or comments",
+            len(entries) - len(comments),
+        )
+    return len(comments)
+
+
+def _read_entries(segment):
+    entries = []
+    for line in segment:
+        try:
+            entries.append(json.loads(line))
+        except ValueError:
+            # The last line of a journal cut short by a crash.
+            break
+    return entries
+
+
+def replay(directory):
+    """
+    Write the comments left in journals of processes that exited before
+    flushing them. Journals of live processes are locked and skipped.
+    Delivery is at-least-once: a crash between the INSERT and deleting
+    the journal replays those comments again.
+    """
+    replayed = 0
+    for path in sorted(glob.glob(os.path.join(directory, JOURNAL_PATTERN))):
+        try:
+            segment = open(path, "r+")
+        except FileNotFoundError:
+            continue
+        with segment:
+            try:
+                fcntl.flock(segment, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                continue
+            try:
+                if os.stat(path).st_ino != os.fstat(segment.fileno()).st_ino:
+                    continue
+            except FileNotFoundError:
+                # Another process replayed and removed it first.
+                continue
+            entries = _read_entries(segment)
+            if entries:
+                replayed += write_comments(entries)
+            os.remove(path)
+    return replayed
+
+
+class Journal:
+    """
+    Append-only files of accepted but unwritten comments, one JSON object
+    per line. The buffer starts a new segment for every flush and removes
+    it once the flush commits. Segments stay flock()ed while their process
+    is alive, which is how ``replay`` tells orphans apart.
+    """
+
+    def __init__(self, directory, fsync=False):
+        self.directory = directory
+        self.fsync = fsync
+        self._prefix = "comments-{}-{}".format(os.getpid(), uuid.uuid4().hex[:8])
+        self._sequence = 0
+        self._segment = None
+
+    def _open_segment(self):
+        self._sequence += 1
+        path = os.path.join(
+            self.directory, "{}-{:08d}.journal".format(self._prefix, self._sequence)
+        )
+        segment = open(path, "a")
+        fcntl.flock(segment, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return segment
+
+    def append(self, entry):
+        if self._segment is None:
+            self._segment = self._open_segment()
+        self._segment.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        # flush() is enough to survive a worker crash; fsync() also
+        # survives losing the machine, at the cost of a disk sync per comment.
+        self._segment.flush()
+        if self.fsync:
+            os.fsync(self._segment.fileno())
+
+    def rotate(self):
+        """Close the current segment to new entries and return it."""
+        segment, self._segment = self._segment, None
+        return segment
+
+    @staticmethod
+    def discard(segment):
+        os.remove(segment.name)
+        segment.close()
+
+
+class CommentBuffer:
+    """
+    Accepts comments in memory and writes them from a background thread,
+    every ``interval`` seconds or as soon as ``max_rows`` are waiting.
+    """
+
+    def __init__(self, interval, max_rows, journal=None):
+        self.interval = interval
+        self.max_rows = max_rows
+        self.journal = journal
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._pending = []
+        # Journal segments whose entries haven't been committed yet.
+        self._segments = []
+        self._thread = None
+
+    def submit(self, post_id, author, text, parent_id=None):
+        entry = {
+            "id": uuid.uuid4().hex,
+            "post": post_id,
+            "parent": parent_id,
+            "author": author,
+            "text": text,
+            "created_date": timezone.now().isoformat(),
+        }
+        with self._lock:
+            if self.journal:
+                self.journal.append(entry)
+            self._pending.append(entry)
+            if len(self._pending) in (1, self.max_rows):
+                self._wakeup.notify()
+        return entry["id"]
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="blog-comment-ingest", daemon=True
+            )
+            self._thread.start()
+        atexit.register(self.flush)
+
+    def _run(self):
+        if self.journal:
+            try:
+                replayed = replay(self.journal.directory)
+            except Exception:
+                logger.exception("Replaying comment journals failed")
+            else:
+                if replayed:
+                    logger.info("Replayed %d journaled comments", replayed)
+
+        while True:
+            with self._lock:
+                while not self._pending:
+                    self._wakeup.wait()
+                if len(self._pending) < self.max_rows:
+                    self._wakeup.wait(self.interval)
+            try:
+                self.flush()
+            except Exception:
+                # The batch stays queued and is retried on the next round.
+                logger.exception("Writing buffered comments failed")
+                connection.close_if_unusable_or_obsolete()
+                with self._lock:
+                    self._wakeup.wait(self.interval)
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                entries, self._pending = self._pending, []
+                segment = self.journal.rotate() if self.journal else None
+                if segment:
+                    self._segments.append(segment)
+            if not entries:
+                return 0
+
+            try:
+                written = write_comments(entries)
+            except Exception:
+                with self._lock:
+                    self._pending[:0] = entries
+                raise
+
+            segments, self._segments = self._segments, []
+            for segment in segments:
+                Journal.discard(segment)
+            return written
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            directory = getattr(settings, "BLOG_COMMENT_INGEST_JOURNAL_DIR", None)
+            journal = None
+            if directory:
+                journal = Journal(
+                    directory,
+                    fsync=getattr(settings, "BLOG_COMMENT_INGEST_FSYNC", False),
+                )
+            _buffer = CommentBuffer(
+                getattr(settings, "BLOG_COMMENT_INGEST_INTERVAL", DEFAULT_INTERVAL),
+                getattr(settings, "BLOG_COMMENT_INGEST_MAX_ROWS", DEFAULT_MAX_ROWS),
+                journal,
+            )
+            _buffer.start()
+        return _buffer
+
+
+def submit_comment(post_id, author, text, parent_id=None):
+    """Queue a comment for the next flush and return its provisional id."""
+    return get_buffer().submit(post_id, author, text, parent_id)
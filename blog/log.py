@@ -0,0 +1,183 @@
+import atexit
+import datetime
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+DEFAULT_QUEUE_SIZE = 10000
+
+# Attributes every LogRecord has; anything else was passed in ``extra``.
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+def _configured_prefix(rules, name):
+    # The most specific configured logger name wins, as in logger hierarchy.
+    while name and name not in rules:
+        name = name.rpartition(".")[0]
+    return name or None
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps a fraction of the records below WARNING per logger prefix, e.g.
+    ``{"django.db.backends": 0.01}``. Loggers without a rate keep everything.
+    """
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = dict(rates)
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        prefix = _configured_prefix(self.rates, record.name)
+        return prefix is None or random.random() < self.rates[prefix]
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    At most ``limits[prefix]`` records per second per logger prefix, with
+    bursts of the same size (a token bucket per prefix).
+    """
+
+    def __init__(self, limits):
+        super().__init__()
+        self.limits = dict(limits)
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        prefix = _configured_prefix(self.limits, record.name)
+        if prefix is None:
+            return True
+
+        rate = self.limits[prefix]
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(prefix, (rate, now))
+            tokens = min(rate, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            self._buckets[prefix] = (tokens - 1 if allowed else tokens, now)
+        return allowed
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including any ``extra`` attributes."""
+
+    def format(self, record):
+        data = {
+            "time": datetime.datetime.fromtimestamp(
+                record.created, datetime.timezone.utc
+            ).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for name, value in vars(record).items():
+            if name not in _RECORD_ATTRIBUTES:
+                data[name] = value
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str)
+
+
+class _Listener(QueueListener):
+    def __init__(self, queue, handler, owner):
+        super().__init__(queue, handler)
+        self.owner = owner
+
+    def handle(self, record):
+        dropped = self.owner.take_dropped()
+        if dropped:
+            super().handle(
+                logging.makeLogRecord(
+                    {
+                        "name": __name__,
+                        "levelno": logging.WARNING,
+                        "levelname": "WARNING",
+                        "msg": "Dropped %d log records, the log queue was full",
+                        "args": (dropped,),
+                    }
+                )
+            )
+        super().handle(record)
+
+    def enqueue_sentinel(self):
+        # Wait for room: the sentinel must not be dropped like a record.
+        self.queue.put(self._sentinel)
+
+
+class QueuedStreamHandler(QueueHandler):
+    """
+    A StreamHandler whose formatting and writes happen on a background
+    thread. Logging calls only run the filters and put the record on a
+    bounded queue; when the queue is full the record is dropped (and counted)
+    instead of blocking the request.
+    """
+
+    def __init__(self, stream=None, queue_size=DEFAULT_QUEUE_SIZE):
+        super().__init__(queue.Queue(queue_size))
+        self.queue_size = queue_size
+        self.target = logging.StreamHandler(stream)
+        self.dropped = 0
+        self._listener = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def setFormatter(self, fmt):
+        super().setFormatter(fmt)
+        self.target.setFormatter(fmt)
+
+    def _ensure_listener(self):
+        # Threads don't survive fork(), so a forked worker (gunicorn --preload)
+        # starts its own listener on a fresh queue.
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            if self._pid is not None:
+                self.queue = queue.Queue(self.queue_size)
+            self._listener = _Listener(self.queue, self.target, self)
+            self._listener.start()
+            self._pid = os.getpid()
+            atexit.register(self.close)
+
+    def take_dropped(self):
+        with self._lock:
+            dropped, self.dropped = self.dropped, 0
+        return dropped
+
+    def prepare(self, record):
+        # QueueHandler.prepare() formats the message here; leave it to the
+        # listener thread. Arguments are formatted when the record is written,
+        # so they should not be mutated after the logging call.
+        return record
+
+    def enqueue(self, record):
+        self._ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def flush(self):
+        """Block until every queued record has been written."""
+        if self._listener is not None and self._pid == os.getpid():
+            self.queue.join()
+        self.target.flush()
+
+    def close(self):
+        with self._lock:
+            if self._listener is not None and self._pid == os.getpid():
+                self._listener.stop()
+            self._listener = None
+            self._pid = None
+        self.target.close()
+        super().close()
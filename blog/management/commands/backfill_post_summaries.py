@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from blog.cache import invalidate_post
+from blog.models import Post, summarize
+
+SUMMARY_FIELDS = ("excerpt", "word_count", "reading_time")
+UPDATE = "UPDATE blog_post SET {} WHERE id = %s".format(
+    ", ".join("{} = %s".format(name) for name in SUMMARY_FIELDS)
+)
+
+
+class Command(BaseCommand):
+    help = "Fill excerpt, word_count and reading_time for posts saved before them."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        # Keyset batches by id, one executemany() each. Filled rows no longer
+        # have an empty excerpt, so an interrupted run can simply be rerun.
+        pending = Post.all_objects.filter(excerpt="").exclude(text="").order_by("id")
+        batch_size = options["batch_size"]
+        last_id = 0
+        filled = 0
+        while True:
+            rows = list(
+                pending.filter(id__gt=last_id).values_list("id", "text")[:batch_size]
+            )
+            if not rows:
+                break
+            values = []
+            for pk, text in rows:
+                summary = summarize(text)
+                values.append([summary[name] for name in SUMMARY_FIELDS] + [pk])
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.executemany(UPDATE, values)
+            for pk, _ in rows:
+                invalidate_post(pk)
+
+            filled += len(rows)
+            last_id = rows[-1][0]
+            if options["verbosity"] > 1:
+                self.stdout.write("Filled {} posts".format(filled))
+        self.stdout.write("Backfilled summaries for {} posts".format(filled))
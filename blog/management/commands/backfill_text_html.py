@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from blog.cache import invalidate_post
+from blog.models import Comment, Post
+from blog.rendering import prune, render_many
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill text_html for posts and comments saved before it; with --prune, "
+        "also delete rendered text no post or comment uses any more."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--prune", action="store_true")
+
+    def handle(self, *args, **options):
+        posts = self._backfill(Post.all_objects.all(), "blog_post", "id", options)
+        comments = self._backfill(
+            Comment.objects.all(), "blog_comment", "post_id", options
+        )
+        self.stdout.write(
+            "Backfilled text_html for {} posts and {} comments".format(posts, comments)
+        )
+        if options["prune"]:
+            pruned = prune(options["batch_size"])
+            self.stdout.write("Pruned {} unused rendered texts".format(pruned))
+
+    def _backfill(self, queryset, table, post_field, options):
+        # Keyset batches by id, one executemany() each. Filled rows no longer
+        # have an empty text_html, so an interrupted run can simply be rerun.
+        pending = queryset.filter(text_html="").exclude(text="").order_by("id")
+        update = "UPDATE {} SET text_html = %s WHERE id = %s".format(table)
+        batch_size = options["batch_size"]
+        last_id = 0
+        filled = 0
+        while True:
+            rows = list(
+                pending.filter(id__gt=last_id).values_list("id", "text", post_field)[
+                    :batch_size
+                ]
+            )
+            if not rows:
+                break
+            html = render_many(text for _, text, _ in rows)
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.executemany(update, [[html[text], pk] for pk, text, _ in rows])
+            for post_id in {post_id for _, _, post_id in rows}:
+                invalidate_post(post_id)
+
+            filled += len(rows)
+            last_id = rows[-1][0]
+            if options["verbosity"] > 1:
+                self.stdout.write("Filled {} rows of {}".format(filled, table))
+        return filled
@@ -0,0 +1,466 @@
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, connections
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+
+from blog import urls
+from blog.models import Comment, Post, summarize
+from blog.rendering import render
+from blog.streaming import NDJSON
+from blog.threads import fill_paths
+
+PASSWORD = "bench-password"
+
+
+class Dataset:
+    """Ids of the seeded rows, shared by all client threads."""
+
+    def __init__(self, users, published, drafts, comments, victims, victim_comments):
+        self.users = users
+        self.published = published
+        self.drafts = deque(drafts)
+        self.comments = comments
+        # Rows that destructive endpoints may consume, one per request.
+        self.victims = deque(victims)
+        self.victim_comments = deque(victim_comments)
+
+    def take(self, pool):
+        try:
+            return pool.popleft()
+        except IndexError:
+            raise CommandError("seeded rows exhausted; raise --posts/--comments")
+
+
+IMPORT_BODY = "".join(
+    json.dumps(record) + "\n"
+    for record in [
+        {"type": "post", "id": 1, "author": "bench", "title": "t", "text": "x"},
+        {"type": "post", "id": 2, "author": "bench", "title": "t", "text": "x"},
+    ]
+    + [
+        {"type": "comment", "id": i, "post": 1 + i % 2, "author": "a", "text": "x"}
+        for i in range(20)
+    ]
+)
+
+
+def _json(data):
+    return {"data": json.dumps(data), "content_type": "application/json"}
+
+
+# url name -> function(dataset, rng) returning (method, path, kwargs for Client)
+SCENARIOS = {
+    "post_list": lambda d, r: ("get", reverse("post_list"), {}),
+    "post_detail": lambda d, r: (
+        "get",
+        reverse("post_detail", kwargs={"pk": r.choice(d.published)}),
+        {},
+    ),
+    "post_batch": lambda d, r: (
+        "get",
+        reverse("post_batch"),
+        {"data": {"ids": ",".join(str(pk) for pk in r.sample(d.published, 100))}},
+    ),
+    "post_new": lambda d, r: (
+        "post",
+        reverse("post_new"),
+        _json({"title": "bench", "text": "bench text"}),
+    ),
+    "post_edit": lambda d, r: (
+        "post",
+        reverse("post_edit", kwargs={"pk": r.choice(d.published)}),
+        _json({"title": "edited", "text": "edited text"}),
+    ),
+    "post_draft_list": lambda d, r: ("get", reverse("post_draft_list"), {}),
+    "author_dashboard": lambda d, r: ("get", reverse("author_dashboard"), {}),
+    "post_publish": lambda d, r: (
+        "post",
+        reverse("post_publish", kwargs={"pk": d.take(d.drafts)}),
+        {},
+    ),
+    "post_remove": lambda d, r: (
+        "delete",
+        reverse("post_remove", kwargs={"pk": d.take(d.victims)}),
+        {},
+    ),
+    "add_comment_to_post": lambda d, r: (
+        "post",
+        reverse("add_comment_to_post", kwargs={"pk": r.choice(d.published)}),
+        _json({"author": "bench", "text": "bench comment"}),
+    ),
+    "comment_list": lambda d, r: (
+        "get",
+        reverse("comment_list", kwargs={"pk": r.choice(d.published)}),
+        {},
+    ),
+    "comment_thread": lambda d, r: (
+        "get",
+        reverse("comment_thread", kwargs={"pk": r.choice(d.published)}),
+        {},
+    ),
+    "comment_approve": lambda d, r: (
+        "post",
+        reverse("comment_approve", kwargs={"pk": r.choice(d.comments)}),
+        {},
+    ),
+    "comment_remove": lambda d, r: (
+        "delete",
+        reverse("comment_remove", kwargs={"pk": d.take(d.victim_comments)}),
+        {},
+    ),
+    "comment_edit": lambda d, r: (
+        "post",
+        reverse("comment_edit", kwargs={"pk": r.choice(d.comments)}),
+        _json({"author": "bench", "text": "edited comment"}),
+    ),
+    "post_search": lambda d, r: (
+        "get",
+        reverse("post_search"),
+        {"data": {"q": r.choice(["lorem", "ipsum", "dolor", "sit amet"])}},
+    ),
+    "comment_bulk_approve": lambda d, r: (
+        "post",
+        reverse("comment_bulk_approve"),
+        _json({"ids": r.sample(d.comments, min(10, len(d.comments)))}),
+    ),
+    "comment_bulk_remove": lambda d, r: (
+        "post",
+        reverse("comment_bulk_remove"),
+        _json({"ids": [d.take(d.victim_comments) for _ in range(10)]}),
+    ),
+    "post_export": lambda d, r: ("get", reverse("post_export"), {}),
+    "post_import": lambda d, r: (
+        "post",
+        reverse("post_import"),
+        {"data": IMPORT_BODY, "content_type": NDJSON},
+    ),
+}
+
+WORDS = "lorem ipsum dolor sit amet consectetur adipiscing elit sed do".split()
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * len(sorted_values))) - 1)
+    return sorted_values[max(index, 0)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway database and measure latency, throughput and queries "
+        "per request for every endpoint in blog/urls.py."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10)
+        parser.add_argument("--posts", type=int, default=1000)
+        parser.add_argument("--comments", type=int, default=5, help="per post")
+        parser.add_argument("--requests", type=int, default=200, help="per endpoint")
+        parser.add_argument("--concurrency", type=int, default=4)
+        parser.add_argument("--endpoints", help="comma separated url names")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="write results as JSON to this file")
+        parser.add_argument("--compare", help="baseline JSON from an earlier run")
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=0.2,
+            help="allowed relative regression of p95 latency and queries/request",
+        )
+
+    def handle(self, *args, **options):
+        names = self._endpoint_names(options["endpoints"])
+        baseline = self._load_baseline(options["compare"])
+
+        setup_test_environment(debug=False)
+        old_name = connection.settings_dict["NAME"]
+        directory = tempfile.mkdtemp(prefix="blog-bench-")
+        if connection.vendor == "sqlite":
+            connection.settings_dict["TEST"]["NAME"] = os.path.join(
+                directory, "bench.sqlite3"
+            )
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        results = OrderedDict()
+        try:
+            dataset = self._seed(options)
+            for name in names:
+                if options["verbosity"] > 1:
+                    self.stdout.write("Running {}".format(name))
+                results[name] = self._run(name, dataset, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            shutil.rmtree(directory, ignore_errors=True)
+
+        report = {
+            "config": {
+                key: options[key]
+                for key in ("users", "posts", "comments", "requests", "concurrency")
+            },
+            "vendor": connection.vendor,
+            "endpoints": results,
+        }
+        self._print(results)
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(report, output, indent=2, sort_keys=True)
+        if baseline is not None:
+            self._compare(baseline, report, options["threshold"])
+
+    def _endpoint_names(self, selected):
+        names = [
+            pattern.name
+            for pattern in urls.urlpatterns
+            if getattr(pattern, "name", None)
+        ]
+        missing = [name for name in names if name not in SCENARIOS]
+        for name in missing:
+            self.stderr.write("No benchmark scenario for {}, skipping".format(name))
+        names = [name for name in names if name in SCENARIOS]
+        if selected:
+            unknown = set(selected.split(",")) - set(names)
+            if unknown:
+                raise CommandError("Unknown endpoints: " + ", ".join(sorted(unknown)))
+            names = [name for name in names if name in selected.split(",")]
+        return names
+
+    def _load_baseline(self, path):
+        if not path:
+            return None
+        with open(path) as baseline:
+            return json.load(baseline)
+
+    def _seed(self, options):
+        rng = random.Random(options["seed"])
+        requests = options["requests"]
+        now = timezone.now()
+
+        User.objects.bulk_create(
+            User(username="bench-{}".format(i)) for i in range(options["users"])
+        )
+        user = User.objects.create_user("bench", password=PASSWORD)
+        users = list(User.objects.values_list("id", flat=True))
+
+        def text(words):
+            return " ".join(rng.choice(WORDS) for _ in range(words))
+
+        def post(i, published):
+            author_id, title, body = rng.choice(users), text(5), text(300)
+            # bulk_create skips Post.save(), which fills the derived fields.
+            fields = dict(
+                summarize(body),
+                author_id=author_id,
+                title=title,
+                text=body,
+                text_html=render(body),
+                published_date=(
+                    now - timezone.timedelta(minutes=i) if published else None
+                ),
+            )
+            return Post(**fields)
+
+        def posts(count, published):
+            return (post(i, published) for i in range(count))
+
+        def comment(post_id, author, body, approved, parent_id=None):
+            return Comment(
+                post_id=post_id,
+                parent_id=parent_id,
+                author=author,
+                text=body,
+                text_html=render(body),
+                approved_comment=approved,
+            )
+
+        Post.objects.bulk_create(posts(options["posts"], True), batch_size=500)
+        published = list(Post.objects.values_list("id", flat=True))
+        Post.objects.bulk_create(posts(requests, False), batch_size=500)
+        Post.objects.bulk_create(posts(requests, True), batch_size=500)
+        ids = list(Post.objects.order_by("id").values_list("id", flat=True))
+        drafts = list(
+            Post.objects.filter(published_date__isnull=True).values_list(
+                "id", flat=True
+            )
+        )
+        victims = ids[len(published) + len(drafts) :]
+
+        Comment.objects.bulk_create(
+            (
+                comment(post_id, "reader", text(40), rng.random() < 0.5)
+                for post_id in published
+                for _ in range(options["comments"])
+            ),
+            batch_size=500,
+        )
+        # Every other comment gets a reply, so threads have some shape.
+        Comment.objects.bulk_create(
+            (
+                comment(post_id, "reader", text(20), rng.random() < 0.5, parent_id)
+                for parent_id, post_id in Comment.objects.order_by("id").values_list(
+                    "id", "post_id"
+                )[::2]
+            ),
+            batch_size=500,
+        )
+        comments = list(Comment.objects.values_list("id", flat=True))
+        Comment.objects.bulk_create(
+            (
+                comment(rng.choice(published), "spam", text(10), False)
+                for _ in range(requests * 11)
+            ),
+            batch_size=500,
+        )
+        victim_comments = list(
+            Comment.objects.filter(author="spam").values_list("id", flat=True)
+        )
+        for start in range(0, len(published), 500):
+            fill_paths(published[start : start + 500])
+        Post.objects.all().recount_approved_comments()
+
+        self._user = user
+        return Dataset(users, published, drafts, comments, victims, victim_comments)
+
+    def _run(self, name, dataset, options):
+        lock = threading.Lock()
+        latencies = []
+        queries = []
+        errors = [0]
+        scenario = SCENARIOS[name]
+        per_worker = [options["requests"] // options["concurrency"]] * options[
+            "concurrency"
+        ]
+        for index in range(options["requests"] % options["concurrency"]):
+            per_worker[index] += 1
+
+        def worker(index, count):
+            rng = random.Random("{}-{}-{}".format(options["seed"], name, index))
+            client = Client()
+            client.force_login(self._user)
+            executed = [0]
+
+            def counting(execute, sql, params, many, context):
+                executed[0] += 1
+                return execute(sql, params, many, context)
+
+            local_latencies = []
+            local_queries = []
+            local_errors = 0
+            try:
+                for _ in range(count):
+                    method, path, kwargs = scenario(dataset, rng)
+                    executed[0] = 0
+                    with ExitStack() as stack:
+                        for conn in connections.all():
+                            stack.enter_context(conn.execute_wrapper(counting))
+                        started = time.perf_counter()
+                        try:
+                            response = getattr(client, method)(path, **kwargs)
+                            if response.streaming:
+                                b"".join(response.streaming_content)
+                            failed = response.status_code >= 400
+                        except DatabaseError:
+                            # e.g. SQLite's "database is locked" with
+                            # concurrent writers; the client re-raises it.
+                            failed = True
+                        local_latencies.append(time.perf_counter() - started)
+                    local_queries.append(executed[0])
+                    local_errors += failed
+            finally:
+                for conn in connections.all():
+                    conn.close()
+            with lock:
+                latencies.extend(local_latencies)
+                queries.extend(local_queries)
+                errors[0] += local_errors
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as executor:
+            futures = [
+                executor.submit(worker, index, count)
+                for index, count in enumerate(per_worker)
+            ]
+            for future in futures:
+                future.result()
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        return {
+            "requests": len(latencies),
+            "errors": errors[0],
+            "throughput": len(latencies) / elapsed if elapsed else 0.0,
+            "latency_ms": {
+                "mean": 1000 * sum(latencies) / len(latencies) if latencies else 0.0,
+                "p50": 1000 * percentile(latencies, 0.50),
+                "p95": 1000 * percentile(latencies, 0.95),
+                "p99": 1000 * percentile(latencies, 0.99),
+            },
+            "queries_per_request": sum(queries) / len(queries) if queries else 0.0,
+        }
+
+    def _print(self, results):
+        self.stdout.write(
+            "{:<22} {:>8} {:>8} {:>8} {:>9} {:>8} {:>6}".format(
+                "endpoint", "p50 ms", "p95 ms", "p99 ms", "req/s", "queries", "errors"
+            )
+        )
+        for name, result in results.items():
+            latency = result["latency_ms"]
+            self.stdout.write(
+                "{:<22} {:>8.2f} {:>8.2f} {:>8.2f} {:>9.1f} {:>8.1f} {:>6}".format(
+                    name,
+                    latency["p50"],
+                    latency["p95"],
+                    latency["p99"],
+                    result["throughput"],
+                    result["queries_per_request"],
+                    result["errors"],
+                )
+            )
+
+    def _compare(self, baseline, report, threshold):
+        regressions = []
+        for name, result in report["endpoints"].items():
+            before = baseline.get("endpoints", {}).get(name)
+            if before is None:
+                continue
+            checks = [
+                (
+                    "p95 latency",
+                    before["latency_ms"]["p95"],
+                    result["latency_ms"]["p95"],
+                ),
+                (
+                    "queries/request",
+                    before["queries_per_request"],
+                    result["queries_per_request"],
+                ),
+            ]
+            for label, old, new in checks:
+                if new > old * (1 + threshold) and new - old > 1e-9:
+                    regressions.append(
+                        "{} {}: {:.2f} -> {:.2f}".format(name, label, old, new)
+                    )
+
+        for regression in regressions:
+            self.stderr.write("Regression: " + regression)
+        if regressions:
+            raise CommandError(
+                "{} regression(s) above {:.0%}".format(len(regressions), threshold)
+            )
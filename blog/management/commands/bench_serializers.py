@@ -0,0 +1,92 @@
+import os
+import shutil
+import tempfile
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.forms.models import model_to_dict
+from django.utils import timezone
+
+from blog.models import Post
+from blog.serializers import encode, post_list_serializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare rows/sec of model_to_dict + DjangoJSONEncoder against the "
+        "values()-based serializers on posts in a throwaway test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=5000)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--text-size", type=int, default=2000)
+
+    def _best_of(self, repeat, func):
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    def handle(self, *args, **options):
+        rows = options["rows"]
+        fields = post_list_serializer.default_fields
+
+        def with_model_to_dict():
+            DjangoJSONEncoder().encode(
+                [model_to_dict(post) for post in Post.objects.all()]
+            )
+
+        def with_serializer():
+            encode(
+                [
+                    post_list_serializer.serialize(row, fields)
+                    for row in post_list_serializer.values(Post.objects.all(), fields)
+                ]
+            )
+
+        # Like bench: a separate test database, so the live one is neither
+        # locked nor counted, and every timed row is one of the seeded posts.
+        old_name = connection.settings_dict["NAME"]
+        directory = tempfile.mkdtemp(prefix="blog-bench-")
+        if connection.vendor == "sqlite":
+            connection.settings_dict["TEST"]["NAME"] = os.path.join(
+                directory, "bench.sqlite3"
+            )
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        try:
+            author = User.objects.create_user("bench-serializers")
+            now = timezone.now()
+            Post.objects.bulk_create(
+                Post(
+                    author=author,
+                    title="Post {}".format(i),
+                    text="x" * options["text_size"],
+                    published_date=now,
+                )
+                for i in range(rows)
+            )
+
+            results = [
+                ("model_to_dict", self._best_of(options["repeat"], with_model_to_dict)),
+                ("serializer", self._best_of(options["repeat"], with_serializer)),
+            ]
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            shutil.rmtree(directory, ignore_errors=True)
+
+        baseline = results[0][1]
+        for name, elapsed in results:
+            self.stdout.write(
+                "{:<14} {:>10.0f} rows/sec  ({:.2f}x)".format(
+                    name, rows / elapsed, baseline / elapsed
+                )
+            )
@@ -0,0 +1,29 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from blog.serializers import encode
+from blog.transfer import export_records
+
+
+class Command(BaseCommand):
+    help = "Write every post and comment as NDJSON, for blog_import."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", help="file to write (default: stdout)")
+
+    def handle(self, *args, **options):
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as output:
+                count = self._export(output)
+            self.stderr.write("Exported {} records".format(count))
+        else:
+            self._export(sys.stdout)
+
+    def _export(self, output):
+        count = 0
+        for record in export_records():
+            output.write(encode(record))
+            output.write("\n")
+            count += 1
+        return count
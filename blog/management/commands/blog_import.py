@@ -0,0 +1,42 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.transfer import Checkpoint, Importer, InvalidRecord
+
+
+class Command(BaseCommand):
+    help = "Load NDJSON written by blog_export, resuming from --checkpoint."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="NDJSON file, or - for stdin")
+        parser.add_argument("--batch-size", type=int)
+        parser.add_argument(
+            "--checkpoint",
+            help="progress file; rerun with the same file to resume after a failure",
+        )
+
+    def handle(self, *args, **options):
+        importer = Importer(
+            batch_size=options["batch_size"],
+            checkpoint=Checkpoint(options["checkpoint"]),
+        )
+        try:
+            # Bytes, so the importer decodes each line itself and can report
+            # the one that isn't UTF-8.
+            if options["path"] == "-":
+                counts = importer.run(sys.stdin.buffer)
+            else:
+                with open(options["path"], "rb") as source:
+                    counts = importer.run(source)
+        except InvalidRecord as error:
+            raise CommandError(
+                "{} (imported {} posts and {} comments before it)".format(
+                    error, importer.counts["post"], importer.counts["comment"]
+                )
+            )
+        self.stdout.write(
+            "Imported {} posts and {} comments".format(
+                counts["post"], counts["comment"]
+            )
+        )
@@ -0,0 +1,57 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection
+
+from blog.purge import DEFAULT_CHUNK_SIZE, purge_removed
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 5.0
+# Removed posts purged per tick before sleeping again.
+POSTS_PER_TICK = 100
+
+
+class Command(BaseCommand):
+    help = "Hard-delete removed posts and their comments in bounded chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=getattr(settings, "BLOG_PURGE_CHUNK_SIZE", DEFAULT_CHUNK_SIZE),
+            help="Comments deleted per statement.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=getattr(settings, "BLOG_PURGE_INTERVAL", DEFAULT_INTERVAL),
+            help="Seconds to sleep when nothing is left to purge.",
+        )
+        parser.add_argument(
+            "--once", action="store_true", help="Purge what is removed now and exit."
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                posts, comments = purge_removed(POSTS_PER_TICK, options["chunk_size"])
+            except DatabaseError:
+                if options["once"]:
+                    raise
+                # Retried on the next tick, possibly on a new connection.
+                logger.exception("Purging removed posts failed")
+                connection.close_if_unusable_or_obsolete()
+                posts = 0
+            else:
+                if posts and options["verbosity"] > 0:
+                    self.stdout.write(
+                        "Purged {} posts and {} comments".format(posts, comments)
+                    )
+            if posts == POSTS_PER_TICK:
+                continue
+            if options["once"]:
+                return
+            time.sleep(options["interval"])
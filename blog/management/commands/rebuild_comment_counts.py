@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from blog.models import Post
+
+
+class Command(BaseCommand):
+    help = "Recompute Post.approved_comment_count for every post in one UPDATE."
+
+    def handle(self, *args, **options):
+        updated = Post.objects.all().recount_approved_comments()
+        self.stdout.write(
+            "Rebuilt approved comment counts for {} posts".format(updated)
+        )
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from blog.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index for posts and approved comments."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        indexed = rebuild_index(
+            options["batch_size"],
+            progress=lambda count: (
+                self.stdout.write("Indexed {} documents".format(count))
+                if options["verbosity"] > 1
+                else None
+            ),
+        )
+        self.stdout.write("Rebuilt search index with {} documents".format(indexed))
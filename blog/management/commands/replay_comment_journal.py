@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.ingest import replay
+
+
+class Command(BaseCommand):
+    help = "Write buffered comments left in journals of workers that have exited."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--directory", default=settings.BLOG_COMMENT_INGEST_JOURNAL_DIR
+        )
+
+    def handle(self, *args, **options):
+        if not options["directory"]:
+            raise CommandError("No journal directory configured")
+        replayed = replay(options["directory"])
+        self.stdout.write("Replayed {} comments".format(replayed))
@@ -0,0 +1,56 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection
+
+from blog.publisher import publish_due
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 1.0
+
+
+class Command(BaseCommand):
+    help = "Publish scheduled posts once their publish_at has passed."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=getattr(settings, "BLOG_PUBLISHER_INTERVAL", DEFAULT_INTERVAL),
+            help="Seconds between ticks.",
+        )
+        parser.add_argument(
+            "--once", action="store_true", help="Run a single tick and exit."
+        )
+
+    def handle(self, *args, **options):
+        if not getattr(settings, "BLOG_METRICS_DIR", None):
+            # Metrics stay in this process's memory, where /metrics can't
+            # reach them; the lag printed below is all there is.
+            self.stderr.write(
+                "BLOG_METRICS_DIR is not set: blog_publish_lag_seconds is not "
+                "collected from this process"
+            )
+        while True:
+            started = time.monotonic()
+            try:
+                published = publish_due()
+            except DatabaseError:
+                if options["once"]:
+                    raise
+                # Retried on the next tick, possibly on a new connection.
+                logger.exception("Publishing scheduled posts failed")
+                connection.close_if_unusable_or_obsolete()
+                published = {}
+            if published and options["verbosity"] > 0:
+                self.stdout.write(
+                    "Published {} posts, lag up to {:.3f}s".format(
+                        len(published), max(published.values())
+                    )
+                )
+            if options["once"]:
+                return
+            time.sleep(max(0, options["interval"] - (time.monotonic() - started)))
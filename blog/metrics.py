@@ -0,0 +1,178 @@
+import glob
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+LAG_BUCKETS = (0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+
+HISTOGRAMS = {
+    "blog_request_duration_seconds": ("Wall time per request.", DURATION_BUCKETS),
+    "blog_request_db_seconds": ("Time spent in database queries.", DURATION_BUCKETS),
+    "blog_request_queries": ("Database queries per request.", QUERY_BUCKETS),
+    "blog_response_size_bytes": ("Non-streaming response body size.", SIZE_BUCKETS),
+    "blog_publish_lag_seconds": (
+        "Delay between a post's publish_at and run_publisher publishing it.",
+        LAG_BUCKETS,
+    ),
+}
+COUNTERS = {
+    "blog_requests_total": "Requests by view, method and status code.",
+    "blog_post_cache_events_total": "post_detail cache lookups by result.",
+}
+
+# Snapshots are written at most this often; /metrics always writes a fresh one.
+DEFAULT_FLUSH_INTERVAL = 5.0
+
+
+class Registry:
+    """
+    In-process histograms and counters. Each observation is a bisect and a
+    few integer increments under one uncontended lock. With BLOG_METRICS_DIR
+    set, every process periodically writes a snapshot there and /metrics
+    sums the snapshots of all processes (including ones that have exited, so
+    counters stay monotonic across worker restarts).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._last_flush = 0.0
+
+    def observe(self, name, labels, value):
+        buckets = HISTOGRAMS[name][1]
+        key = (name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * (len(buckets) + 1), 0.0]
+            histogram[0][bisect_left(buckets, value)] += 1
+            histogram[1] += value
+
+    def increment(self, name, labels, amount=1):
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def snapshot(self):
+        from .cache import stats as cache_stats
+
+        with self._lock:
+            histograms = [
+                [name, list(labels), list(counts), total]
+                for (name, labels), (counts, total) in self._histograms.items()
+            ]
+            counters = [
+                [name, list(labels), value]
+                for (name, labels), value in self._counters.items()
+            ]
+        for result, value in cache_stats().items():
+            counters.append(
+                ["blog_post_cache_events_total", [["result", result]], value]
+            )
+        return {"histograms": histograms, "counters": counters}
+
+    def _snapshot_path(self, directory):
+        return os.path.join(directory, "metrics-{}.json".format(os.getpid()))
+
+    def flush(self, force=False):
+        directory = getattr(settings, "BLOG_METRICS_DIR", None)
+        now = time.time()
+        interval = getattr(
+            settings, "BLOG_METRICS_FLUSH_INTERVAL", DEFAULT_FLUSH_INTERVAL
+        )
+        if not directory or (not force and now - self._last_flush < interval):
+            return
+        self._last_flush = now
+
+        path = self._snapshot_path(directory)
+        temporary = path + ".tmp"
+        with open(temporary, "w") as snapshot_file:
+            json.dump(self.snapshot(), snapshot_file)
+        os.replace(temporary, path)
+
+    def collect(self):
+        directory = getattr(settings, "BLOG_METRICS_DIR", None)
+        if not directory:
+            return [self.snapshot()]
+
+        self.flush(force=True)
+        snapshots = []
+        for path in glob.glob(os.path.join(directory, "metrics-*.json")):
+            try:
+                with open(path) as snapshot_file:
+                    snapshots.append(json.load(snapshot_file))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+
+registry = Registry()
+
+
+def _merge(snapshots):
+    histograms = {}
+    counters = {}
+    for snapshot in snapshots:
+        for name, labels, counts, total in snapshot["histograms"]:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            merged = histograms.setdefault(key, [[0] * len(counts), 0.0])
+            merged[0] = [a + b for a, b in zip(merged[0], counts)]
+            merged[1] += total
+        for name, labels, value in snapshot["counters"]:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            counters[key] = counters.get(key, 0) + value
+    return histograms, counters
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join('{}="{}"'.format(k, _escape(v)) for k, v in pairs) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(snapshots):
+    """Prometheus text exposition format (version 0.0.4)."""
+    histograms, counters = _merge(snapshots)
+    lines = []
+
+    for name, (description, buckets) in HISTOGRAMS.items():
+        lines.append("# HELP {} {}".format(name, description))
+        lines.append("# TYPE {} histogram".format(name))
+        for (metric, labels), (counts, total) in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(list(buckets) + ["+Inf"], counts):
+                cumulative += count
+                lines.append(
+                    "{}_bucket{} {}".format(
+                        name, _labels(labels + (("le", bound),)), cumulative
+                    )
+                )
+            lines.append("{}_sum{} {}".format(name, _labels(labels), _number(total)))
+            lines.append("{}_count{} {}".format(name, _labels(labels), cumulative))
+
+    for name, description in COUNTERS.items():
+        lines.append("# HELP {} {}".format(name, description))
+        lines.append("# TYPE {} counter".format(name))
+        for (metric, labels), value in sorted(counters.items()):
+            if metric == name:
+                lines.append("{}{} {}".format(name, _labels(labels), value))
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,160 @@
+import time
+import zlib
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+from django.middleware.gzip import GZipMiddleware, re_accepts_gzip
+from django.utils.cache import patch_vary_headers
+
+from . import routers
+from .metrics import registry, render
+from .streaming import NDJSON
+
+
+class MetricsMiddleware:
+    """
+    Records wall time, database time, query count and response size per
+    resolved URL name, and serves the Prometheus text format at
+    BLOG_METRICS_PATH when that setting is configured.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics_path = getattr(settings, "BLOG_METRICS_PATH", None)
+        if metrics_path and request.path == metrics_path:
+            return HttpResponse(
+                render(registry.collect()),
+                content_type="text/plain; version=0.0.4; charset=utf-8",
+            )
+
+        database = [0, 0.0]
+
+        def timed(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                database[0] += 1
+                database[1] += time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timed))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        match = request.resolver_match
+        view = (("view", match.url_name if match and match.url_name else "other"),)
+        registry.observe("blog_request_duration_seconds", view, elapsed)
+        registry.observe("blog_request_db_seconds", view, database[1])
+        registry.observe("blog_request_queries", view, database[0])
+        if not response.streaming:
+            registry.observe("blog_response_size_bytes", view, len(response.content))
+        registry.increment(
+            "blog_requests_total",
+            view + (("method", request.method), ("status", response.status_code)),
+        )
+        registry.flush()
+        return response
+
+
+PIN_COOKIE = "blog_primary_until"
+PIN_HEADER = "HTTP_X_BLOG_PRIMARY_UNTIL"
+DEFAULT_PIN_SECONDS = 10
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Serves REPLICA_VIEWS from a read replica unless the client wrote
+    recently. A successful write pins the client to the primary for
+    BLOG_PRIMARY_PIN_SECONDS: the response carries the deadline in a cookie
+    and in an X-Blog-Primary-Until header that cookieless clients echo back.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        # Reset here rather than after the response: a streamed body is read
+        # after the middleware returns and should use the same replica.
+        routers.read_from(None)
+        response = self.get_response(request)
+
+        if (
+            routers.replicas()
+            and request.method not in ("GET", "HEAD", "OPTIONS", "TRACE")
+            and response.status_code < 400
+        ):
+            window = getattr(settings, "BLOG_PRIMARY_PIN_SECONDS", DEFAULT_PIN_SECONDS)
+            until = str(int(time.time() + window))
+            response.set_cookie(PIN_COOKIE, until, max_age=window, httponly=True)
+            response["X-Blog-Primary-Until"] = until
+        return response
+
+    def _pinned(self, request):
+        for value in (request.COOKIES.get(PIN_COOKIE), request.META.get(PIN_HEADER)):
+            try:
+                if value and float(value) > time.time():
+                    return True
+            except ValueError:
+                continue
+        return False
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (
+            request.method in ("GET", "HEAD")
+            and request.resolver_match.url_name in routers.REPLICA_VIEWS
+            and not self._pinned(request)
+        ):
+            routers.read_from(routers.choose_replica())
+
+
+COMPRESSIBLE_TYPES = ("application/json", NDJSON)
+DEFAULT_GZIP_MIN_SIZE = 1024
+
+
+def _gzip_stream(chunks):
+    # Sync-flush after every chunk so a streamed body still reaches the
+    # client as it is produced; streaming.py already sends ~64KB chunks.
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        if chunk:
+            yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    Gzips API payloads (JSON and NDJSON) of at least BLOG_GZIP_MIN_SIZE
+    bytes, and streamed ones whatever their size. HTML is left alone: it
+    carries CSRF tokens, which compression would expose to BREACH.
+    """
+
+    def process_response(self, request, response):
+        content_type = response.get("Content-Type", "").split(";")[0].strip()
+        if content_type not in COMPRESSIBLE_TYPES:
+            return response
+        if not response.streaming:
+            minimum = getattr(settings, "BLOG_GZIP_MIN_SIZE", DEFAULT_GZIP_MIN_SIZE)
+            if len(response.content) < minimum:
+                return response
+            return super().process_response(request, response)
+
+        if response.has_header("Content-Encoding"):
+            return response
+        patch_vary_headers(response, ("Accept-Encoding",))
+        if not re_accepts_gzip.search(request.META.get("HTTP_ACCEPT_ENCODING", "")):
+            return response
+
+        response.streaming_content = _gzip_stream(response.streaming_content)
+        del response["Content-Length"]
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = "W/" + etag
+        response["Content-Encoding"] = "gzip"
+        return response
@@ -0,0 +1,41 @@
+# Generated by Django 2.0.13 on 2026-10-17 04:13
+
+from django.db import migrations, models
+
+# post_draft_list: published_date IS NULL ORDER BY created_date, id.
+# Backends with partial index support only index the drafts themselves.
+PARTIAL_INDEX_VENDORS = ('sqlite', 'postgresql')
+DRAFT_INDEX = 'CREATE INDEX blog_post_draft_idx ON blog_post (published_date, created_date, id)'
+
+
+def create_draft_index(apps, schema_editor):
+    if schema_editor.connection.vendor in PARTIAL_INDEX_VENDORS:
+        schema_editor.execute(DRAFT_INDEX + ' WHERE published_date IS NULL')
+    else:
+        schema_editor.execute(DRAFT_INDEX)
+
+
+def drop_draft_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute('DROP INDEX blog_post_draft_idx ON blog_post')
+    else:
+        schema_editor.execute('DROP INDEX IF EXISTS blog_post_draft_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0002_create_model_comment'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'approved_comment'], name='blog_comment_approved_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['published_date', 'id'], name='blog_post_published_idx'),
+        ),
+        migrations.RunPython(create_draft_index, drop_draft_index),
+    ]
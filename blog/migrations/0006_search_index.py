@@ -0,0 +1,108 @@
+from django.db import migrations
+
+# The schema as of this migration, inlined so later changes to blog.search
+# can't change what it does. blog.search.SQLITE_TRIGGERS must stay in step
+# with the triggers created here.
+
+# SQLite: an FTS5 table kept in sync by triggers. Posts and comments share it
+# with rowid = 2 * id for posts and 2 * id + 1 for comments.
+SQLITE_TABLE = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS blog_search USING fts5("
+    "title, body, kind UNINDEXED, object_id UNINDEXED, post_id UNINDEXED, "
+    "tokenize = 'unicode61')"
+)
+INSERT_POST = (
+    "INSERT INTO blog_search (rowid, title, body, kind, object_id, post_id) "
+    "VALUES (new.id * 2, new.title, new.text, 'post', new.id, new.id);"
+)
+INSERT_COMMENT = (
+    "INSERT INTO blog_search (rowid, title, body, kind, object_id, post_id) "
+    "SELECT new.id * 2 + 1, new.author, new.text, 'comment', new.id, new.post_id "
+    "WHERE new.approved_comment;"
+)
+SQLITE_TRIGGERS = [
+    "CREATE TRIGGER IF NOT EXISTS blog_post_search_insert AFTER INSERT ON blog_post "
+    "BEGIN " + INSERT_POST + " END",
+    "CREATE TRIGGER IF NOT EXISTS blog_post_search_update "
+    "AFTER UPDATE OF title, text ON blog_post BEGIN "
+    "DELETE FROM blog_search WHERE rowid = old.id * 2; " + INSERT_POST + " END",
+    "CREATE TRIGGER IF NOT EXISTS blog_post_search_delete AFTER DELETE ON blog_post "
+    "BEGIN DELETE FROM blog_search WHERE rowid = old.id * 2; END",
+    "CREATE TRIGGER IF NOT EXISTS blog_comment_search_insert "
+    "AFTER INSERT ON blog_comment BEGIN " + INSERT_COMMENT + " END",
+    "CREATE TRIGGER IF NOT EXISTS blog_comment_search_update "
+    "AFTER UPDATE OF author, text, approved_comment ON blog_comment BEGIN "
+    "DELETE FROM blog_search WHERE rowid = old.id * 2 + 1; " + INSERT_COMMENT + " END",
+    "CREATE TRIGGER IF NOT EXISTS blog_comment_search_delete "
+    "AFTER DELETE ON blog_comment "
+    "BEGIN DELETE FROM blog_search WHERE rowid = old.id * 2 + 1; END",
+]
+SQLITE_FILL = [
+    "INSERT INTO blog_search (rowid, title, body, kind, object_id, post_id) "
+    "SELECT id * 2, title, text, 'post', id, id FROM blog_post",
+    "INSERT INTO blog_search (rowid, title, body, kind, object_id, post_id) "
+    "SELECT id * 2 + 1, author, text, 'comment', id, post_id "
+    "FROM blog_comment WHERE approved_comment",
+]
+SQLITE_TRIGGER_NAMES = [
+    'blog_post_search_insert',
+    'blog_post_search_update',
+    'blog_post_search_delete',
+    'blog_comment_search_insert',
+    'blog_comment_search_update',
+    'blog_comment_search_delete',
+]
+
+# PostgreSQL: stored tsvector columns with GIN indexes, filled as they are
+# added.
+POSTGRESQL_SCHEMA = [
+    "ALTER TABLE blog_post ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(text, '')), 'B')) STORED",
+    "CREATE INDEX blog_post_search_idx ON blog_post USING GIN (search_vector)",
+    "ALTER TABLE blog_comment ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('simple', coalesce(author, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(text, '')), 'B')) STORED",
+    "CREATE INDEX blog_comment_search_idx ON blog_comment USING GIN (search_vector)",
+]
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        statements = [SQLITE_TABLE] + SQLITE_TRIGGERS + SQLITE_FILL
+    elif vendor == 'postgresql':
+        statements = POSTGRESQL_SCHEMA
+    else:
+        statements = []
+    with schema_editor.connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        statements = ['DROP TRIGGER IF EXISTS {}'.format(name) for name in SQLITE_TRIGGER_NAMES]
+        statements.append('DROP TABLE IF EXISTS blog_search')
+    elif vendor == 'postgresql':
+        statements = [
+            'ALTER TABLE blog_post DROP COLUMN IF EXISTS search_vector',
+            'ALTER TABLE blog_comment DROP COLUMN IF EXISTS search_vector',
+        ]
+    else:
+        statements = []
+    with schema_editor.connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0005_updated_date'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
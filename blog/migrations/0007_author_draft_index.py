@@ -0,0 +1,34 @@
+from django.db import migrations
+
+# post_draft_list?author=: author_id = ? AND published_date IS NULL
+# ORDER BY created_date, id. Partial where supported, like blog_post_draft_idx.
+PARTIAL_INDEX_VENDORS = ('sqlite', 'postgresql')
+AUTHOR_DRAFT_INDEX = (
+    'CREATE INDEX blog_post_author_draft_idx ON blog_post '
+    '(author_id, published_date, created_date, id)'
+)
+
+
+def create_author_draft_index(apps, schema_editor):
+    if schema_editor.connection.vendor in PARTIAL_INDEX_VENDORS:
+        schema_editor.execute(AUTHOR_DRAFT_INDEX + ' WHERE published_date IS NULL')
+    else:
+        schema_editor.execute(AUTHOR_DRAFT_INDEX)
+
+
+def drop_author_draft_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute('DROP INDEX blog_post_author_draft_idx ON blog_post')
+    else:
+        schema_editor.execute('DROP INDEX IF EXISTS blog_post_author_draft_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0006_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_author_draft_index, drop_author_draft_index),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 2.0.13 on 2026-10-17 04:39
+
+from django.db import migrations, models
+
+# run_publisher: published_date IS NULL AND publish_at <= now. Partial where
+# supported, so the index only holds drafts. The leading published_date
+# makes it a better match than blog_post_draft_idx for the due check.
+PARTIAL_INDEX_VENDORS = ('sqlite', 'postgresql')
+DUE_INDEX = 'CREATE INDEX blog_post_due_idx ON blog_post (published_date, publish_at)'
+
+
+def create_due_index(apps, schema_editor):
+    if schema_editor.connection.vendor in PARTIAL_INDEX_VENDORS:
+        schema_editor.execute(DUE_INDEX + ' WHERE published_date IS NULL')
+    else:
+        schema_editor.execute(DUE_INDEX)
+
+
+def drop_due_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute('DROP INDEX blog_post_due_idx ON blog_post')
+    else:
+        schema_editor.execute('DROP INDEX IF EXISTS blog_post_due_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0007_author_draft_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='publish_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(create_due_index, drop_due_index),
+    ]
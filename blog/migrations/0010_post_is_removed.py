@@ -0,0 +1,39 @@
+# Generated by Django 2.0.13 on 2026-10-17 04:44
+
+from django.db import migrations, models
+
+# purge_removed_posts: is_removed ORDER BY id. Partial where supported, so
+# the index only holds posts waiting to be purged.
+PARTIAL_INDEX_VENDORS = ('sqlite', 'postgresql')
+REMOVED_INDEX = 'CREATE INDEX blog_post_removed_idx ON blog_post (is_removed, id)'
+
+
+def create_removed_index(apps, schema_editor):
+    if schema_editor.connection.vendor in PARTIAL_INDEX_VENDORS:
+        schema_editor.execute(REMOVED_INDEX + ' WHERE is_removed')
+    else:
+        schema_editor.execute(REMOVED_INDEX)
+
+
+def drop_removed_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute('DROP INDEX blog_post_removed_idx ON blog_post')
+    else:
+        # Gone already if SQLite rebuilt blog_post in a later migration.
+        schema_editor.execute('DROP INDEX IF EXISTS blog_post_removed_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0009_edit_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='is_removed',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(create_removed_index, drop_removed_index),
+    ]
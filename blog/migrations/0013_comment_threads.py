@@ -0,0 +1,54 @@
+# Generated by Django 2.0.13 on 2026-10-17 04:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Comments written before replies existed are all top-level: their path is
+# their own id (see blog.threads).
+BATCH_SIZE = 1000
+
+
+def fill_top_level_paths(apps, schema_editor):
+    Comment = apps.get_model('blog', 'Comment')
+    pending = Comment.objects.filter(path='').order_by('id')
+    last_id = 0
+    while True:
+        ids = list(pending.filter(id__gt=last_id).values_list('id', flat=True)[:BATCH_SIZE])
+        if not ids:
+            break
+        with schema_editor.connection.cursor() as cursor:
+            cursor.executemany(
+                'UPDATE blog_comment SET path = %s WHERE id = %s',
+                [['{:010d}'.format(pk), pk] for pk in ids],
+            )
+        last_id = ids[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0012_rendered_text'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='blog.Comment'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(blank=True, default='', max_length=250),
+        ),
+        migrations.RunPython(fill_top_level_paths, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'path'], name='blog_comment_thread_idx'),
+        ),
+    ]
@@ -1,6 +1,62 @@
+import math
+
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.utils import timezone
+from django.utils.text import Truncator
+
+from .rendering import render_one
+from .threads import PATH_LENGTH, segment
+
+EXCERPT_LENGTH = 200
+WORDS_PER_MINUTE = 200
+
+
+def summarize(text):
+    """
+    The listing fields derived from a post body: a whitespace-collapsed
+    excerpt, the word count and the reading time in whole minutes.
+    """
+    words = text.split()
+    return {
+        "excerpt": Truncator(" ".join(words)).chars(EXCERPT_LENGTH),
+        "word_count": len(words),
+        "reading_time": math.ceil(len(words) / WORDS_PER_MINUTE),
+    }
+
+
+class TimestampedQuerySet(models.QuerySet):
+    """Keeps ``updated_date`` current for bulk updates, which skip auto_now."""
+
+    def update(self, **kwargs):
+        kwargs.setdefault("updated_date", timezone.now())
+        return super().update(**kwargs)
+
+
+class PostQuerySet(TimestampedQuerySet):
+    def recount_approved_comments(self):
+        """Recompute approved_comment_count for these posts in one UPDATE."""
+        counts = (
+            Comment.objects.filter(post=OuterRef("pk"), approved_comment=True)
+            .order_by()
+            .values("post")
+            .annotate(count=Count("pk"))
+            .values("count")
+        )
+        return self.update(
+            approved_comment_count=Coalesce(
+                Subquery(counts, output_field=IntegerField()), 0
+            )
+        )
+
+
+class PostManager(models.Manager.from_queryset(PostQuerySet)):
+    """Posts that haven't been removed; ``Post.all_objects`` includes them."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(is_removed=False)
 
 
 class Post(models.Model):
@@ -9,10 +65,53 @@ class Post(models.Model):
     text = models.TextField()
     created_date = models.DateTimeField(default=timezone.now)
     published_date = models.DateTimeField(blank=True, null=True)
+    # Drafts with a publish_at are published by `manage.py run_publisher`.
+    publish_at = models.DateTimeField(blank=True, null=True)
+    updated_date = models.DateTimeField(auto_now=True)
+    # Denormalized count of approved comments, maintained by Comment.save()
+    # and Comment.delete(). `manage.py rebuild_comment_counts` repairs drift.
+    approved_comment_count = models.IntegerField(default=0)
+    # Incremented by every edit; edits can be made conditional on it (If-Match).
+    version = models.IntegerField(default=1)
+    # Tombstone set by post_remove. Removed posts are hidden from every
+    # endpoint at once; `manage.py purge_removed_posts` deletes them later.
+    is_removed = models.BooleanField(default=False)
+    # Derived from text by summarize() whenever text is saved, so listings
+    # never have to read the body. `manage.py backfill_post_summaries`
+    # fills them for posts written before they existed.
+    excerpt = models.CharField(max_length=EXCERPT_LENGTH, blank=True, default="")
+    word_count = models.IntegerField(default=0)
+    reading_time = models.IntegerField(default=0)
+    # text rendered to HTML (see blog.rendering), refreshed with the summary.
+    text_html = models.TextField(blank=True, default="")
+
+    objects = PostManager()
+    all_objects = PostQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # post_list: published_date <= now ORDER BY published_date, id
+            models.Index(
+                fields=["published_date", "id"], name="blog_post_published_idx"
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if "text" not in self.get_deferred_fields() and (
+            update_fields is None or "text" in update_fields
+        ):
+            derived = dict(summarize(self.text), text_html=render_one(self.text))
+            for name, value in derived.items():
+                setattr(self, name, value)
+            if update_fields is not None:
+                kwargs["update_fields"] = set(update_fields).union(derived)
+        super().save(*args, **kwargs)
 
     def publish(self):
         self.published_date = timezone.now()
-        self.save()
+        # Only these columns, so a concurrent edit of the text isn't undone.
+        self.save(update_fields=["published_date", "updated_date"])
 
     def approved_comments(self):
         return self.comments.filter(approved_comment=True)
@@ -26,11 +125,113 @@ class Comment(models.Model):
     author = models.CharField(max_length=200)
     text = models.TextField()
     created_date = models.DateTimeField(default=timezone.now)
+    updated_date = models.DateTimeField(auto_now=True)
     approved_comment = models.BooleanField(default=False)
+    # Incremented by every edit; edits can be made conditional on it (If-Match).
+    version = models.IntegerField(default=1)
+    # text rendered to HTML (see blog.rendering)
+    text_html = models.TextField(blank=True, default="")
+    # The comment this replies to; path and depth place it in the thread
+    # (see blog.threads).
+    parent = models.ForeignKey(
+        "self", on_delete=models.CASCADE, null=True, blank=True, related_name="replies"
+    )
+    path = models.CharField(max_length=PATH_LENGTH, blank=True, default="")
+    depth = models.IntegerField(default=0)
+
+    objects = TimestampedQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # blog.threads.thread: post_id = ? ORDER BY path, subtrees by range
+            models.Index(fields=["post", "path"], name="blog_comment_thread_idx"),
+            # Post.approved_comments: post_id = ? AND approved_comment
+            models.Index(
+                fields=["post", "approved_comment"], name="blog_comment_approved_idx"
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if "approved_comment" in field_names:
+            instance._approved_in_db = values[field_names.index("approved_comment")]
+        return instance
+
+    def _claim_approval_change(self):
+        """
+        Return how much this save changes the post's approved comment count.
+
+        An approval toggle is claimed with a conditional UPDATE so that two
+        concurrent saves of the same comment can't both count it.
+        """
+        if self._state.adding:
+            return 1 if self.approved_comment else 0
+
+        previous = getattr(self, "_approved_in_db", None)
+        if previous is None:
+            previous = not self.approved_comment
+        elif previous == self.approved_comment:
+            return 0
+
+        changed = Comment.objects.filter(pk=self.pk, approved_comment=previous).update(
+            approved_comment=self.approved_comment
+        )
+        if not changed:
+            return 0
+        return 1 if self.approved_comment else -1
+
+    def _update_post_count(self, delta):
+        Post.objects.filter(pk=self.post_id).update(
+            approved_comment_count=F("approved_comment_count") + delta
+        )
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if "text" not in self.get_deferred_fields() and (
+            update_fields is None or "text" in update_fields
+        ):
+            self.text_html = render_one(self.text)
+            if update_fields is not None:
+                kwargs["update_fields"] = set(update_fields) | {"text_html"}
+        adding = self._state.adding
+        if adding and self.parent_id:
+            self.depth = self.parent.depth + 1
+        with transaction.atomic():
+            delta = self._claim_approval_change()
+            super().save(*args, **kwargs)
+            if delta:
+                self._update_post_count(delta)
+            if adding and not self.path:
+                # The path ends with the comment's own id, known only now.
+                prefix = self.parent.path if self.parent_id else ""
+                self.path = prefix + segment(self.pk)
+                Comment.objects.filter(pk=self.pk).update(
+                    path=self.path, updated_date=self.updated_date
+                )
+        self._approved_in_db = self.approved_comment
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            deleted, per_model = super().delete(*args, **kwargs)
+            removed = per_model.get(self._meta.label, 0)
+            if removed > 1:
+                # Replies went with it; any of them may have been approved.
+                Post.objects.filter(pk=self.post_id).recount_approved_comments()
+            elif self.approved_comment and removed:
+                self._update_post_count(-1)
+        return deleted, per_model
 
     def approve(self):
         self.approved_comment = True
-        self.save()
+        self.save(update_fields=["approved_comment"])
 
     def __str__(self):
         return self.text
+
+
+class RenderedText(models.Model):
+    """HTML rendered from a post or comment text, keyed by its digest."""
+
+    digest = models.CharField(max_length=64, primary_key=True)
+    html = models.TextField()
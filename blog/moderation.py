@@ -0,0 +1,107 @@
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+
+from .cache import invalidate_post
+from .models import Comment, Post
+from .pagination import is_id
+from .threads import with_replies
+
+DEFAULT_CHUNK_SIZE = 500
+
+
+class InvalidSelection(ValueError):
+    pass
+
+
+def select_comment_ids(data):
+    """
+    Resolve a moderation request body to comment ids: either an explicit
+    ``ids`` list or a filter on ``post``, ``author`` and ``created_before``.
+    """
+    if not isinstance(data, dict):
+        raise InvalidSelection("expected an object")
+
+    if "ids" in data:
+        ids = data["ids"]
+        if not isinstance(ids, list) or not all(is_id(pk) for pk in ids):
+            raise InvalidSelection("ids must be a list of comment ids")
+        return sorted(set(ids))
+
+    criteria = {}
+    if "post" in data:
+        post = data["post"]
+        if not is_id(post):
+            raise InvalidSelection("post must be a post id")
+        criteria["post_id"] = post
+    if "author" in data:
+        if not isinstance(data["author"], str):
+            raise InvalidSelection("author must be a string")
+        criteria["author"] = data["author"]
+    if "created_before" in data:
+        created_before = parse_datetime(str(data["created_before"]))
+        if created_before is None:
+            raise InvalidSelection("created_before must be an ISO 8601 datetime")
+        criteria["created_date__lt"] = created_before
+    if not criteria:
+        raise InvalidSelection("ids or at least one filter is required")
+
+    return list(
+        Comment.objects.filter(**criteria).order_by("id").values_list("id", flat=True)
+    )
+
+
+def _chunks(ids):
+    size = getattr(settings, "BLOG_MODERATION_CHUNK_SIZE", DEFAULT_CHUNK_SIZE)
+    for start in range(0, len(ids), size):
+        yield ids[start : start + size]
+
+
+def _moderate(ids, apply):
+    affected = 0
+    post_ids = set()
+    with transaction.atomic():
+        for chunk in _chunks(ids):
+            chunk_post_ids = set(
+                Comment.objects.filter(pk__in=chunk)
+                .order_by()
+                .values_list("post_id", flat=True)
+                .distinct()
+            )
+            affected += apply(chunk)
+            # Recount inside the same statement instead of applying deltas, so
+            # the result is exact even if other writers touched these posts.
+            Post.objects.filter(pk__in=chunk_post_ids).recount_approved_comments()
+            post_ids |= chunk_post_ids
+
+    for post_id in post_ids:
+        invalidate_post(post_id)
+    return affected
+
+
+def _approve(chunk):
+    return Comment.objects.filter(pk__in=chunk, approved_comment=False).update(
+        approved_comment=True
+    )
+
+
+def _delete(chunk):
+    # QuerySet.delete() would load every row to send signals; counters and
+    # caches are handled by _moderate(), so a plain DELETE is enough.
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "DELETE FROM {} WHERE id IN ({})".format(
+                Comment._meta.db_table, ", ".join(["%s"] * len(chunk))
+            ),
+            chunk,
+        )
+        return cursor.rowcount
+
+
+def approve_comments(ids):
+    return _moderate(ids, _approve)
+
+
+def remove_comments(ids):
+    # Replies go with the comments they reply to.
+    return _moderate(with_replies(ids), _delete)
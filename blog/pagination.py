@@ -0,0 +1,145 @@
+import base64
+import json
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# Integer keys are ids: anything outside a 64-bit column can't match a row.
+MIN_ID = -(2**63)
+MAX_ID = 2**63 - 1
+
+NEXT = "n"
+PREV = "p"
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def is_id(value):
+    """Whether ``value`` (from a client) can be compared with an id column."""
+    return (
+        isinstance(value, int)
+        and not isinstance(value, bool)
+        and MIN_ID <= value <= MAX_ID
+    )
+
+
+def get_page_size(request):
+    default = getattr(settings, "BLOG_PAGE_SIZE", DEFAULT_PAGE_SIZE)
+    maximum = getattr(settings, "BLOG_MAX_PAGE_SIZE", MAX_PAGE_SIZE)
+    try:
+        page_size = int(request.GET.get("page_size", default))
+    except ValueError:
+        raise InvalidCursor("page_size must be an integer")
+    if page_size < 1:
+        raise InvalidCursor("page_size must be positive")
+    return min(page_size, maximum)
+
+
+def encode_cursor(direction, values):
+    payload = [direction] + [
+        value.isoformat() if hasattr(value, "isoformat") else value for value in values
+    ]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor, keys):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw.decode())
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidCursor("malformed cursor")
+    if (
+        not isinstance(payload, list)
+        or len(payload) != len(keys) + 1
+        or payload[0] not in (NEXT, PREV)
+    ):
+        raise InvalidCursor("malformed cursor")
+
+    values = [_decode_value(key, value) for key, value in zip(keys, payload[1:])]
+    return payload[0], values
+
+
+def _decode_value(key, value):
+    # Cursors come from clients: check every value's type before it reaches
+    # a query, where the wrong one is a database error rather than a 400.
+    if key.endswith("_date"):
+        try:
+            value = parse_datetime(value) if isinstance(value, str) else None
+        except ValueError:
+            # Well-formed but impossible, like month 13.
+            value = None
+        valid = value is not None and timezone.is_aware(value)
+    elif key == "path":
+        valid = isinstance(value, str)
+    else:
+        valid = is_id(value)
+    if not valid:
+        raise InvalidCursor("malformed cursor")
+    return value
+
+
+def _seek(keys, values, forward):
+    # (a, b) > (x, y)  <=>  a > x OR (a = x AND b > y)
+    lookup = "gt" if forward else "lt"
+    condition = Q()
+    for index, key in enumerate(keys):
+        term = Q(**{"{}__{}".format(key, lookup): values[index]})
+        for prior_key, prior_value in zip(keys[:index], values[:index]):
+            term &= Q(**{prior_key: prior_value})
+        condition |= term
+    return condition
+
+
+def _key_values(item, keys):
+    if isinstance(item, dict):
+        return [item[key] for key in keys]
+    return [getattr(item, key) for key in keys]
+
+
+def paginate(request, queryset, keys):
+    """
+    Keyset pagination over ``queryset`` ordered ascending by ``keys``.
+
+    ``keys`` must end with a unique column (normally ``id``) so that every
+    row has a distinct position. Returns ``(items, next_cursor, prev_cursor)``
+    and raises ``InvalidCursor`` on a bad ``cursor``/``page_size`` parameter.
+    """
+    page_size = get_page_size(request)
+    cursor = request.GET.get("cursor")
+
+    direction = NEXT
+    if cursor:
+        direction, values = decode_cursor(cursor, keys)
+        queryset = queryset.filter(_seek(keys, values, forward=direction == NEXT))
+
+    if direction == NEXT:
+        queryset = queryset.order_by(*keys)
+    else:
+        queryset = queryset.order_by(*["-" + key for key in keys])
+
+    items = list(queryset[: page_size + 1])
+    has_more = len(items) > page_size
+    items = items[:page_size]
+    if direction == PREV:
+        items.reverse()
+
+    if not items:
+        return items, None, None
+
+    first = _key_values(items[0], keys)
+    last = _key_values(items[-1], keys)
+    if direction == NEXT:
+        next_cursor = encode_cursor(NEXT, last) if has_more else None
+        prev_cursor = encode_cursor(PREV, first) if cursor else None
+    else:
+        next_cursor = encode_cursor(NEXT, last)
+        prev_cursor = encode_cursor(PREV, first) if has_more else None
+    return items, next_cursor, prev_cursor
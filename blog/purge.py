@@ -0,0 +1,61 @@
+from django.db import connection, transaction
+
+from .models import Post
+
+DEFAULT_CHUNK_SIZE = 1000
+
+
+def _delete_comment_chunk(post_id, chunk_size):
+    # Raw DELETEs: the ORM's cascade collector would load every row first.
+    # Deepest paths first, so no chunk deletes a comment whose replies are
+    # left for a later one.
+    with connection.cursor() as cursor:
+        if connection.vendor == "mysql":
+            cursor.execute(
+                "DELETE FROM blog_comment WHERE post_id = %s "
+                "ORDER BY path DESC LIMIT %s",
+                [post_id, chunk_size],
+            )
+        else:
+            cursor.execute(
+                "DELETE FROM blog_comment WHERE id IN ("
+                "SELECT id FROM blog_comment WHERE post_id = %s "
+                "ORDER BY path DESC LIMIT %s)",
+                [post_id, chunk_size],
+            )
+        return cursor.rowcount
+
+
+def purge_post(post_id, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Hard-delete a removed post and its comments. Comments go in chunks of
+    ``chunk_size``, each in its own short transaction, so the write lock is
+    never held for long. Returns the number of comments deleted.
+    """
+    deleted = 0
+    while True:
+        count = _delete_comment_chunk(post_id, chunk_size)
+        deleted += count
+        if count < chunk_size:
+            break
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Comments added while the chunks ran (there should be none: removed
+        # posts don't accept comments) must not be left without a post.
+        cursor.execute("DELETE FROM blog_comment WHERE post_id = %s", [post_id])
+        deleted += cursor.rowcount
+        cursor.execute("DELETE FROM blog_post WHERE id = %s AND is_removed", [post_id])
+    return deleted
+
+
+def purge_removed(limit, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Purge up to ``limit`` removed posts; returns (posts, comments) deleted."""
+    post_ids = list(
+        Post.all_objects.filter(is_removed=True)
+        .order_by("id")
+        .values_list("id", flat=True)[:limit]
+    )
+    comments = 0
+    for post_id in post_ids:
+        comments += purge_post(post_id, chunk_size)
+    return len(post_ids), comments
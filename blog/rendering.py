@@ -0,0 +1,85 @@
+import hashlib
+
+from django.db import IntegrityError, transaction
+from django.utils.html import linebreaks
+
+# Part of every digest: bump it when render() changes so that text rendered
+# by the old version is rendered again instead of being looked up.
+RENDERER_VERSION = "1"
+
+
+def render(text):
+    """Escaped text with blank-line paragraphs and <br> line breaks."""
+    return linebreaks(text, autoescape=True)
+
+
+def digest(text):
+    source = RENDERER_VERSION + "\0" + text
+    return hashlib.sha256(source.encode()).hexdigest()
+
+
+def render_many(texts):
+    """
+    ``{text: html}`` for ``texts``. HTML is stored in RenderedText under the
+    digest of its source, so each distinct text is rendered once however
+    often it is saved, imported or shown: one query finds what was already
+    rendered and one INSERT stores the rest.
+    """
+    from .models import RenderedText
+
+    digests = {text: digest(text) for text in set(texts)}
+    stored = dict(
+        RenderedText.objects.filter(digest__in=set(digests.values())).values_list(
+            "digest", "html"
+        )
+    )
+
+    missing = {}
+    for text, key in digests.items():
+        if key not in stored and key not in missing:
+            missing[key] = render(text)
+    if missing:
+        try:
+            with transaction.atomic():
+                RenderedText.objects.bulk_create(
+                    RenderedText(digest=key, html=html) for key, html in missing.items()
+                )
+        except IntegrityError:
+            # A concurrent writer stored some of them first; the HTML is the
+            # same, so keep theirs and add the rest one by one.
+            for key, html in missing.items():
+                RenderedText.objects.get_or_create(digest=key, defaults={"html": html})
+        stored.update(missing)
+
+    return {text: stored[key] for text, key in digests.items()}
+
+
+def render_one(text):
+    return render_many([text])[text]
+
+
+def prune(chunk_size=1000):
+    """
+    Delete RenderedText rows no post or comment text has the digest of any
+    more: text that was edited or purged, or rendered by an older
+    RENDERER_VERSION. Returns how many were deleted.
+
+    A row stored while this runs can be deleted too; that only costs one
+    render later, since posts and comments keep their own text_html.
+    """
+    from .models import Comment, Post, RenderedText
+
+    live = set()
+    for queryset in (Post.all_objects.all(), Comment.objects.all()):
+        for text in queryset.values_list("text", flat=True).iterator():
+            live.add(digest(text))
+    stale = [
+        key
+        for key in RenderedText.objects.values_list("digest", flat=True).iterator()
+        if key not in live
+    ]
+    deleted = 0
+    for start in range(0, len(stale), chunk_size):
+        chunk = stale[start : start + chunk_size]
+        deleted += RenderedText.objects.filter(digest__in=chunk).delete()[0]
+    return deleted
@@ -0,0 +1,76 @@
+import itertools
+import random
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Read-only views whose blog queries may be served by a replica.
+REPLICA_VIEWS = ("post_list", "post_detail", "comment_list")
+
+# The replica chosen for the current request, if any. Only
+# ReplicaRoutingMiddleware sets it, so everything else reads from the primary.
+_state = threading.local()
+_round_robin = itertools.count()
+
+
+def replicas():
+    return list(getattr(settings, "BLOG_READ_REPLICAS", ()))
+
+
+def choose_replica():
+    aliases = replicas()
+    if not aliases:
+        return None
+    policy = getattr(settings, "BLOG_REPLICA_POLICY", "random")
+    if policy == "random":
+        return random.choice(aliases)
+    if policy == "round_robin":
+        return aliases[next(_round_robin) % len(aliases)]
+    raise ImproperlyConfigured("Unknown BLOG_REPLICA_POLICY: {}".format(policy))
+
+
+def read_from(alias):
+    """Route this thread's blog reads to ``alias`` (None for the primary)."""
+    _state.alias = alias
+
+
+@contextmanager
+def primary():
+    """Read from the primary inside this block, e.g. to fill a shared cache."""
+    previous = getattr(_state, "alias", None)
+    _state.alias = None
+    try:
+        yield
+    finally:
+        _state.alias = previous
+
+
+class ReplicaRouter:
+    """
+    Sends blog reads to the replica picked for the current request and
+    everything else (writes, other apps, reads inside a transaction) to the
+    primary. Replicas are copies of the primary and are never migrated.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = getattr(_state, "alias", None)
+        if (
+            alias is None
+            or model._meta.app_label != "blog"
+            # Reads inside a write transaction must see its changes.
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db not in replicas()
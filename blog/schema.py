@@ -0,0 +1,71 @@
+from django.db import connections
+from django.db.migrations.recorder import MigrationRecorder
+
+PARTIAL_INDEX_VENDORS = ("sqlite", "postgresql")
+
+# Partial indexes can't be declared in Meta.indexes on this Django version, so
+# they are created with raw SQL. SQLite drops them whenever a later migration
+# rebuilds the table, which is why they are re-created after every migrate.
+# (migration that introduced it, name, table, columns, condition)
+PARTIAL_INDEXES = [
+    # post_draft_list: published_date IS NULL ORDER BY created_date, id
+    (
+        "0003_hot_path_indexes",
+        "blog_post_draft_idx",
+        "blog_post",
+        "published_date, created_date, id",
+        "published_date IS NULL",
+    ),
+    # post_draft_list?author=: author_id = ? AND published_date IS NULL
+    (
+        "0007_author_draft_index",
+        "blog_post_author_draft_idx",
+        "blog_post",
+        "author_id, published_date, created_date, id",
+        "published_date IS NULL",
+    ),
+    # run_publisher: published_date IS NULL AND publish_at <= ?
+    (
+        "0008_post_publish_at",
+        "blog_post_due_idx",
+        "blog_post",
+        "published_date, publish_at",
+        "published_date IS NULL",
+    ),
+    # purge_removed_posts: is_removed ORDER BY id
+    (
+        "0010_post_is_removed",
+        "blog_post_removed_idx",
+        "blog_post",
+        "is_removed, id",
+        "is_removed",
+    ),
+]
+
+
+def create_partial_index_sql(name, table, columns, condition):
+    return "CREATE INDEX IF NOT EXISTS {} ON {} ({}) WHERE {}".format(
+        name, table, columns, condition
+    )
+
+
+def ensure_partial_indexes(connection):
+    if connection.vendor not in PARTIAL_INDEX_VENDORS:
+        return
+
+    applied = MigrationRecorder(connection).applied_migrations()
+    with connection.cursor() as cursor:
+        for migration, name, table, columns, condition in PARTIAL_INDEXES:
+            if ("blog", migration) in applied:
+                cursor.execute(
+                    create_partial_index_sql(name, table, columns, condition)
+                )
+
+
+def restore_schema(sender, using, **kwargs):
+    from .search import SEARCH_MIGRATION, ensure_triggers
+
+    connection = connections[using]
+    ensure_partial_indexes(connection)
+    if ("blog", SEARCH_MIGRATION) in MigrationRecorder(connection).applied_migrations():
+        ensure_triggers(connection)
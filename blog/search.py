@@ -0,0 +1,207 @@
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.html import escape
+
+from .models import Comment, Post
+
+SEARCH_MIGRATION = "0006_search_index"
+
+# SQLite: an FTS5 table, blog_search, kept in sync by triggers. Posts and
+# comments share it with rowid = 2 * id for posts and 2 * id + 1 for comments,
+# so sync and deletes are rowid lookups. Only approved comments are indexed.
+# PostgreSQL: stored tsvector columns with GIN indexes. Both are created by
+# migration 0006; these triggers must match the ones it creates.
+_INSERT_POST = (
+    "INSERT INTO blog_search (rowid, title, body, kind, object_id, post_id) "
+    "VALUES (new.id * 2, new.title, new.text, 'post', new.id, new.id);"
+)
+_INSERT_COMMENT = (
+    "INSERT INTO blog_search (rowid, title, body, kind, object_id, post_id) "
+    "SELECT new.id * 2 + 1, new.author, new.text, 'comment', new.id, new.post_id "
+    "WHERE new.approved_comment;"
+)
+SQLITE_TRIGGERS = [
+    "CREATE TRIGGER IF NOT EXISTS blog_post_search_insert AFTER INSERT ON blog_post "
+    "BEGIN " + _INSERT_POST + " END",
+    "CREATE TRIGGER IF NOT EXISTS blog_post_search_update "
+    "AFTER UPDATE OF title, text ON blog_post BEGIN "
+    "DELETE FROM blog_search WHERE rowid = old.id * 2; " + _INSERT_POST + " END",
+    "CREATE TRIGGER IF NOT EXISTS blog_post_search_delete AFTER DELETE ON blog_post "
+    "BEGIN DELETE FROM blog_search WHERE rowid = old.id * 2; END",
+    "CREATE TRIGGER IF NOT EXISTS blog_comment_search_insert "
+    "AFTER INSERT ON blog_comment BEGIN " + _INSERT_COMMENT + " END",
+    "CREATE TRIGGER IF NOT EXISTS blog_comment_search_update "
+    "AFTER UPDATE OF author, text, approved_comment ON blog_comment BEGIN "
+    "DELETE FROM blog_search WHERE rowid = old.id * 2 + 1; " + _INSERT_COMMENT + " END",
+    "CREATE TRIGGER IF NOT EXISTS blog_comment_search_delete "
+    "AFTER DELETE ON blog_comment "
+    "BEGIN DELETE FROM blog_search WHERE rowid = old.id * 2 + 1; END",
+]
+
+# Snippet highlight markers; they are swapped for <mark> after HTML escaping.
+_MARK_START = "\x02"
+_MARK_END = "\x03"
+SNIPPET_TOKENS = 16
+# Ranked search reads and sorts every row before OFFSET, so deep pages are
+# refused rather than served slowly.
+MAX_PAGE = 50
+
+
+def ensure_triggers(connection):
+    # SQLite drops triggers along with the table when a migration rebuilds it.
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            for statement in SQLITE_TRIGGERS:
+                cursor.execute(statement)
+
+
+def rebuild_index(batch_size, progress=None):
+    """Re-index every post and approved comment, one transaction per batch."""
+    if connection.vendor != "sqlite":
+        # Generated columns on PostgreSQL are never out of date.
+        return 0
+
+    with connection.cursor() as cursor:
+        cursor.execute("DELETE FROM blog_search")
+
+    indexed = 0
+    sources = [
+        (
+            Post,
+            "SELECT id * 2, title, text, 'post', id, id FROM blog_post "
+            "WHERE id > %s AND id <= %s",
+        ),
+        (
+            Comment,
+            "SELECT id * 2 + 1, author, text, 'comment', id, post_id "
+            "FROM blog_comment WHERE approved_comment AND id > %s AND id <= %s",
+        ),
+    ]
+    for model, select in sources:
+        # The base manager: the default Post manager hides removed posts.
+        last_id = (
+            model._base_manager.order_by("-id").values_list("id", flat=True).first()
+        )
+        for start in range(0, last_id or 0, batch_size):
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(
+                    "INSERT INTO blog_search "
+                    "(rowid, title, body, kind, object_id, post_id) " + select,
+                    [start, start + batch_size],
+                )
+                indexed += cursor.rowcount
+            if progress:
+                progress(indexed)
+    return indexed
+
+
+# Terms match as prefixes: the tokenizers only split at spaces and
+# punctuation, so Korean particles and endings stay attached ("블로그에", "환영합니다") and a whole
+# word query would miss them.
+def _match_expression(query):
+    # Quote every term so user input can't use (or break on) FTS syntax.
+    terms = ['"{}"*'.format(term.replace('"', '""')) for term in query.split()]
+    return " ".join(terms)
+
+
+def _tsquery(query):
+    # The to_tsquery() counterpart: quoted lexemes, all required.
+    terms = [
+        "'{}':*".format(term.replace("\\", "\\\\").replace("'", "''"))
+        for term in query.split()
+    ]
+    return " & ".join(terms)
+
+
+def _highlight(snippet):
+    return escape(snippet).replace(_MARK_START, "<mark>").replace(_MARK_END, "</mark>")
+
+
+def _search_sqlite(query, now, limit, offset):
+    sql = (
+        "SELECT blog_search.kind, blog_search.object_id, blog_search.post_id, "
+        "blog_post.title, snippet(blog_search, 1, %s, %s, '…', %s) "
+        "FROM blog_search JOIN blog_post ON blog_post.id = blog_search.post_id "
+        "WHERE blog_search MATCH %s AND blog_post.published_date <= %s "
+        "AND NOT blog_post.is_removed "
+        "ORDER BY bm25(blog_search, 5.0, 1.0) LIMIT %s OFFSET %s"
+    )
+    params = [
+        _MARK_START,
+        _MARK_END,
+        SNIPPET_TOKENS,
+        _match_expression(query),
+        now,
+        limit,
+        offset,
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def _search_postgresql(query, now, limit, offset):
+    headline = (
+        "ts_headline('simple', {}.text, query, "
+        "'StartSel=' || %s || ', StopSel=' || %s || ', MaxWords=' || %s)"
+    )
+    sql = (
+        "WITH hits AS ("
+        "  SELECT 'post' AS kind, p.id AS object_id, p.id AS post_id, p.title, "
+        "         p.text, ts_rank(p.search_vector, query) AS rank "
+        "  FROM blog_post p, to_tsquery('simple', %s) query "
+        "  WHERE p.search_vector @@ query AND p.published_date <= %s "
+        "    AND NOT p.is_removed "
+        "  UNION ALL "
+        "  SELECT 'comment', c.id, c.post_id, p.title, c.text, "
+        "         ts_rank(c.search_vector, query) "
+        "  FROM blog_comment c JOIN blog_post p ON p.id = c.post_id, "
+        "       to_tsquery('simple', %s) query "
+        "  WHERE c.search_vector @@ query AND c.approved_comment "
+        "    AND p.published_date <= %s AND NOT p.is_removed "
+        "  ORDER BY rank DESC LIMIT %s OFFSET %s"
+        ") "
+        "SELECT kind, object_id, post_id, title, " + headline.format("hits") + " "
+        "FROM hits, to_tsquery('simple', %s) query ORDER BY rank DESC"
+    )
+    tsquery = _tsquery(query)
+    params = [tsquery, now, tsquery, now, limit, offset]
+    params += [_MARK_START, _MARK_END, SNIPPET_TOKENS, tsquery]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def _search_fallback(query, limit, offset):
+    # No full-text index on this backend: a plain scan over published posts.
+    posts = (
+        Post.objects.filter(published_date__lte=timezone.now(), text__icontains=query)
+        .order_by("-published_date", "-id")
+        .values_list("id", "title", "text")[offset : offset + limit]
+    )
+    return [("post", pk, pk, title, text[:200]) for pk, title, text in posts]
+
+
+def search(query, limit, offset=0):
+    """
+    Ranked full-text search over published posts and their approved
+    comments. Snippets are HTML-escaped with matches wrapped in ``<mark>``.
+    """
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    if connection.vendor == "sqlite":
+        rows = _search_sqlite(query, now, limit, offset)
+    elif connection.vendor == "postgresql":
+        rows = _search_postgresql(query, now, limit, offset)
+    else:
+        rows = _search_fallback(query, limit, offset)
+
+    return [
+        {
+            "kind": kind,
+            "id": pk,
+            "post": post_id,
+            "title": title,
+            "snippet": _highlight(snippet),
+        }
+        for kind, pk, post_id, title, snippet in rows
+    ]
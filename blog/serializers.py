@@ -0,0 +1,129 @@
+import json
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.db import models
+from django.http import HttpResponse
+
+from .models import Comment, Post
+
+# One encoder instance, compact output and no ``default`` hook: rows only
+# contain JSON-native values once their datetimes have been formatted.
+_encoder = json.JSONEncoder(separators=(",", ":"))
+encode = _encoder.encode
+
+
+class InvalidFields(ValueError):
+    pass
+
+
+def format_datetime(value):
+    # Same output as DjangoJSONEncoder (millisecond precision, "Z" for UTC)
+    # without its isinstance() cascade.
+    if value is None:
+        return None
+    result = value.isoformat()
+    if value.microsecond:
+        result = result[:23] + result[26:]
+    if result.endswith("+00:00"):
+        result = result[:-6] + "Z"
+    return result
+
+
+def json_response(data, status=HTTPStatus.OK):
+    return HttpResponse(encode(data), content_type="application/json", status=status)
+
+
+class Serializer:
+    """
+    Builds response dicts straight from ``.values()`` rows.
+
+    ``fields`` is every field an endpoint may return, ``default_fields`` what
+    it returns when the client doesn't send ``?fields=``.
+    """
+
+    def __init__(self, model, fields, default_fields=None):
+        self.model = model
+        self.fields = tuple(fields)
+        self.default_fields = tuple(default_fields or fields)
+        self.attnames = {}
+        self.datetime_fields = set()
+        for name in self.fields:
+            field = model._meta.get_field(name)
+            self.attnames[name] = field.attname
+            if isinstance(field, models.DateTimeField):
+                self.datetime_fields.add(name)
+
+    def parse_fields(self, request):
+        requested = request.GET.get("fields")
+        if not requested:
+            return self.default_fields
+        fields = tuple(name for name in requested.split(",") if name)
+        if not fields or any(name not in self.attnames for name in fields):
+            raise InvalidFields(requested)
+        return fields
+
+    def values(self, queryset, fields, extra=()):
+        # Pagination keys may not be among the requested fields.
+        extra = tuple(name for name in extra if name not in fields)
+        return queryset.values(*(tuple(fields) + extra))
+
+    def serialize(self, row, fields):
+        data = {name: row[name] for name in fields}
+        for name in self.datetime_fields.intersection(fields):
+            data[name] = format_datetime(data[name])
+        return data
+
+    def project(self, data, fields):
+        return {name: data[name] for name in fields}
+
+    def from_instance(self, instance, fields=None):
+        fields = fields or self.fields
+        row = {name: getattr(instance, self.attnames[name]) for name in fields}
+        return self.serialize(row, fields)
+
+
+POST_FIELDS = (
+    "id",
+    "author",
+    "title",
+    "text",
+    "created_date",
+    "published_date",
+    "publish_at",
+    "updated_date",
+    "approved_comment_count",
+    "version",
+    "excerpt",
+    "word_count",
+    "reading_time",
+    "text_html",
+)
+
+post_serializer = Serializer(Post, POST_FIELDS)
+# Listings never read the body (not even with ?fields=text): the excerpt
+# stands in for it.
+post_list_serializer = Serializer(
+    Post, [name for name in POST_FIELDS if name not in ("text", "text_html")]
+)
+comment_serializer = Serializer(
+    Comment,
+    (
+        "id",
+        "post",
+        "author",
+        "text",
+        "created_date",
+        "updated_date",
+        "approved_comment",
+        "version",
+        "text_html",
+        "parent",
+        "depth",
+    ),
+)
+
+# Public profile fields embedded by post_detail?include=author
+author_serializer = Serializer(
+    get_user_model(), ("id", "username", "first_name", "last_name")
+)
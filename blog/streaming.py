@@ -0,0 +1,76 @@
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+NDJSON = "application/x-ndjson"
+
+DEFAULT_CHUNK_SIZE = 2000
+# Rows are batched into chunks of roughly this many bytes so the WSGI server
+# isn't asked to write one tiny string per row.
+WRITE_BUFFER_SIZE = 64 * 1024
+
+
+def wants_ndjson(request):
+    return NDJSON in request.META.get("HTTP_ACCEPT", "")
+
+
+def wants_stream(request):
+    return request.GET.get("stream") == "1" or wants_ndjson(request)
+
+
+def _buffered(pieces):
+    # The opening piece is sent on its own so the first byte leaves before
+    # the query has produced any rows.
+    pieces = iter(pieces)
+    yield next(pieces, "")
+
+    buffer = []
+    size = 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= WRITE_BUFFER_SIZE:
+            yield "".join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield "".join(buffer)
+
+
+def _json_array(rows, encode):
+    yield "["
+    separator = ""
+    for row in rows:
+        yield separator
+        yield encode(row)
+        separator = ","
+    yield "]"
+
+
+def _ndjson(rows, encode):
+    for row in rows:
+        yield encode(row)
+        yield "\n"
+
+
+def stream_response(request, queryset, serialize, encode=None):
+    """
+    Stream every row of ``queryset`` as a JSON array, or as NDJSON when the
+    client sends ``Accept: application/x-ndjson``. Rows are read with a
+    chunked iterator so memory stays flat regardless of the result size.
+    """
+    if encode is None:
+        encode = DjangoJSONEncoder().encode
+    chunk_size = getattr(settings, "BLOG_STREAM_CHUNK_SIZE", DEFAULT_CHUNK_SIZE)
+    rows = (serialize(row) for row in queryset.iterator(chunk_size=chunk_size))
+
+    if wants_ndjson(request):
+        pieces, content_type = _ndjson(rows, encode), NDJSON
+    else:
+        pieces, content_type = _json_array(rows, encode), "application/json"
+    return StreamingHttpResponse(_buffered(pieces), content_type=content_type)
+
+
+def ndjson_response(rows, encode):
+    """Stream an iterable of rows as NDJSON."""
+    return StreamingHttpResponse(_buffered(_ndjson(rows, encode)), content_type=NDJSON)
@@ -1,12 +1,43 @@
+import gzip
+import importlib
+import io
 import json
+import logging
+import os
+import re
+import tempfile
+import time
+import unittest
 from http import HTTPStatus
+from unittest import mock
+from wsgiref.util import setup_testing_defaults
 
 from django.contrib.auth.models import User
-from django.test import TestCase
-from django.urls import reverse
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
 from django.utils import timezone
-
-from .models import Post, Comment
+from django.utils.http import http_date
+
+from mysite import wsgi
+from mysite.wsgi import StaticFiles
+
+from . import cache as post_cache
+from . import dashboard, edits, ingest, publisher, purge, rendering, routers, threads
+from . import pagination, search, transfer, urls
+from .log import JsonFormatter, QueuedStreamHandler, RateLimitFilter, SamplingFilter
+from .management.commands import bench
+from .metrics import registry, render
+from .middleware import PIN_COOKIE, ReplicaRoutingMiddleware
+from .models import Post, Comment, RenderedText
+from .routers import ReplicaRouter
+from .serializers import format_datetime
 
 import json
 
@@ -23,6 +54,11 @@ class APITestMixin:
     def delete(self, path, data={}, *args, **kwargs):
         return self.client.delete(path, data, *args, **kwargs)
 
+    def patch(self, path, data={}, *args, **kwargs):
+        return self.client.patch(
+            path, json.dumps(data), content_type="application/json", *args, **kwargs
+        )
+
 
 class TestPost(APITestMixin, TestCase):
     def _create_post(self, user, title, text):
@@ -51,11 +87,18 @@ class TestPost(APITestMixin, TestCase):
         # When : 모든 Post 조회
         response = self.get(reverse("post_list"))
 
-        # Then : 생성된 모든 Post가 정상적으로 조회되는지 확인
+        # Then : 첫 페이지와 다음 페이지로 생성된 모든 Post가 정상적으로 조회되는지 확인
         data = response.json()
 
         self.assertEqual(response.status_code, HTTPStatus.OK)
-        self.assertEqual(len(data), 30)
+        self.assertEqual(len(data["results"]), 20)
+        self.assertIsNone(data["prev"])
+
+        response = self.get(reverse("post_list"), {"cursor": data["next"]})
+        data = response.json()
+
+        self.assertEqual(len(data["results"]), 10)
+        self.assertIsNone(data["next"])
 
     def test_get_post_detail(self):
         # Given : 새로운 Post 생성
@@ -267,7 +310,7 @@ class TestComment(APITestMixin, TestCase):
         self.assertEqual(response.status_code, HTTPStatus.OK)
 
         # And : Comment들이 정상적으로 모두 반환
-        data = response.json()
+        data = response.json()["results"]
         random_comment_pk = 3
         comment = data[random_comment_pk]
 
@@ -439,3 +482,2351 @@ class TestComment(APITestMixin, TestCase):
 
         # Then : 404 not found를 반환
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
+class TestPagination(APITestMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("author")
+        now = timezone.now()
+        # 같은 published_date를 가진 Post가 섞여 있어도 pk로 순서가 결정되어야 한다
+        self.posts = [
+            Post.objects.create(
+                author=self.user,
+                title="Post {}".format(i),
+                text="text",
+                published_date=now - timezone.timedelta(minutes=i // 2),
+            )
+            for i in range(7)
+        ]
+
+    def _walk(self, direction, params):
+        pages = []
+        while True:
+            data = self.get(reverse("post_list"), params).json()
+            pages.append([post["id"] for post in data["results"]])
+            if not data[direction]:
+                return pages, data
+            params = {"page_size": params["page_size"], "cursor": data[direction]}
+
+    def test_walk_all_pages_forward_without_gaps_or_duplicates(self):
+        # Given : published_date 순으로 정렬된 Post 7개
+
+        # When : page_size 3으로 next cursor를 따라 모든 페이지를 조회
+        pages, _ = self._walk("next", {"page_size": 3})
+
+        # Then : 모든 Post가 published_date, pk 순서로 한 번씩 조회
+        expected = [
+            post.pk
+            for post in sorted(self.posts, key=lambda p: (p.published_date, p.pk))
+        ]
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual(sum(pages, []), expected)
+
+    def test_prev_cursor_returns_previous_page(self):
+        # Given : 두 번째 페이지
+        first = self.get(reverse("post_list"), {"page_size": 3}).json()
+        second = self.get(
+            reverse("post_list"), {"page_size": 3, "cursor": first["next"]}
+        ).json()
+
+        # When : prev cursor로 이전 페이지를 조회
+        response = self.get(
+            reverse("post_list"), {"page_size": 3, "cursor": second["prev"]}
+        )
+
+        # Then : 첫 번째 페이지와 같은 결과를 반환
+        data = response.json()
+        self.assertEqual(data["results"], first["results"])
+        self.assertIsNone(data["prev"])
+        self.assertEqual(data["next"], first["next"])
+
+    def test_page_size_is_capped(self):
+        # Given : 최대 page_size보다 큰 요청
+        with self.settings(BLOG_MAX_PAGE_SIZE=5):
+            # When : Post 목록을 조회
+            response = self.get(reverse("post_list"), {"page_size": 1000})
+
+        # Then : 최대 page_size만큼만 반환
+        self.assertEqual(len(response.json()["results"]), 5)
+
+    def test_return_bad_request_when_cursor_is_invalid(self):
+        # Given : 잘못된 cursor 값
+        tampered = [
+            ["n", "2020-01-01T00:00:00+00:00", {"a": 1}],
+            ["n", "2020-01-01T00:00:00+00:00", "abc"],
+            ["n", "2020-01-01T00:00:00+00:00", 2**64],
+            ["n", "2020-01-01T00:00:00", 1],
+            ["n", "2020-13-45T00:00:00+00:00", 1],
+        ]
+        for cursor in ["not-a-cursor", "W10"] + [
+            pagination.encode_cursor(payload[0], payload[1:]) for payload in tampered
+        ]:
+            # When : 잘못된 cursor로 조회
+            response = self.get(reverse("post_list"), {"cursor": cursor})
+
+            # Then : 400 Bad Request를 반환
+            self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+
+class TestStreaming(APITestMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("author")
+        for i in range(25):
+            Post.objects.create(
+                author=self.user,
+                title="Post {}".format(i),
+                text="text",
+                published_date=timezone.now(),
+            )
+
+    def test_stream_all_posts_as_json_array(self):
+        # Given : page_size보다 많은 25개의 Post
+
+        # When : stream 모드로 Post 목록을 조회
+        response = self.get(reverse("post_list"), {"stream": "1"})
+
+        # Then : 페이지 구분 없이 모든 Post가 하나의 JSON 배열로 스트리밍
+        self.assertTrue(response.streaming)
+        data = json.loads(b"".join(response.streaming_content).decode())
+
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(len(data), 25)
+        self.assertEqual(data[0]["title"], "Post 0")
+
+    def test_stream_posts_as_ndjson(self):
+        # Given : NDJSON을 요청하는 Accept 헤더
+
+        # When : Post 목록을 조회
+        response = self.get(reverse("post_list"), HTTP_ACCEPT="application/x-ndjson")
+
+        # Then : 한 줄에 하나의 Post가 담긴 NDJSON이 반환
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+
+        self.assertEqual(len(lines), 25)
+        self.assertEqual(json.loads(lines[-1])["title"], "Post 24")
+
+    def test_stream_empty_comment_list(self):
+        # Given : Comment가 없는 Post
+        post = Post.objects.first()
+
+        # When : stream 모드로 Comment 목록을 조회
+        response = self.get(
+            reverse("comment_list", kwargs={"pk": post.pk}), {"stream": "1"}
+        )
+
+        # Then : 빈 배열을 반환
+        self.assertEqual(b"".join(response.streaming_content), b"[]")
+
+
+@unittest.skipUnless(connection.vendor == "sqlite", "EXPLAIN QUERY PLAN is SQLite only")
+class TestQueryPlans(APITestMixin, TestCase):
+    FULL_SCAN = re.compile(r"^SCAN (TABLE )?blog_\w+$")
+
+    def setUp(self):
+        self.user = User.objects.create_user("username", password="password")
+        self.client.login(username="username", password="password")
+        self.post = Post.objects.create(
+            author=self.user, title="title", text="text", published_date=timezone.now()
+        )
+        Post.objects.create(author=self.user, title="draft", text="text")
+        Comment.objects.create(post=self.post, author="author", text="text")
+
+    def _plans(self, run):
+        with CaptureQueriesContext(connection) as context:
+            run()
+
+        plans = []
+        with connection.cursor() as cursor:
+            for query in context.captured_queries:
+                if "blog_" not in query["sql"]:
+                    continue
+                cursor.execute("EXPLAIN QUERY PLAN " + query["sql"])
+                plans.append([row[-1] for row in cursor.fetchall()])
+        return plans
+
+    def assertUsesIndex(self, run, index_name):
+        plans = self._plans(run)
+        details = sum(plans, [])
+
+        for detail in details:
+            self.assertIsNone(self.FULL_SCAN.match(detail), detail)
+            self.assertNotIn("TEMP B-TREE", detail)
+        self.assertTrue(
+            any(index_name in detail for detail in details),
+            "{} not used: {}".format(index_name, plans),
+        )
+
+    def test_post_list_uses_published_index(self):
+        self.assertUsesIndex(
+            lambda: self.get(reverse("post_list")), "blog_post_published_idx"
+        )
+
+    def test_post_draft_list_uses_draft_index(self):
+        self.assertUsesIndex(
+            lambda: self.get(reverse("post_draft_list")), "blog_post_draft_idx"
+        )
+
+    def test_author_draft_list_uses_author_draft_index(self):
+        self.assertUsesIndex(
+            lambda: self.get(reverse("post_draft_list"), {"author": "me"}),
+            "blog_post_author_draft_idx",
+        )
+
+    def test_publisher_uses_due_index(self):
+        self.assertUsesIndex(lambda: publisher.publish_due(), "blog_post_due_idx")
+
+    def test_comment_list_uses_post_index(self):
+        self.assertUsesIndex(
+            lambda: self.get(reverse("comment_list", kwargs={"pk": self.post.pk})),
+            "blog_comment_",
+        )
+
+    def test_comment_thread_uses_thread_index(self):
+        root = Comment.objects.get().pk
+        self.assertUsesIndex(
+            lambda: self.get(
+                reverse("comment_thread", kwargs={"pk": self.post.pk}),
+                {"root": root, "depth": 1},
+            ),
+            "blog_comment_thread_idx",
+        )
+
+    def test_approved_comments_uses_approved_index(self):
+        self.assertUsesIndex(
+            lambda: list(self.post.approved_comments()), "blog_comment_approved_idx"
+        )
+
+
+class TestApprovedCommentCount(APITestMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("author")
+        self.post = Post.objects.create(
+            author=self.user, title="title", text="text", published_date=timezone.now()
+        )
+
+    def _count(self):
+        return Post.objects.get(pk=self.post.pk).approved_comment_count
+
+    def test_approve_increments_count_once(self):
+        # Given : 승인되지 않은 Comment
+        comment = Comment.objects.create(post=self.post, author="a", text="t")
+        stale_copy = Comment.objects.get(pk=comment.pk)
+
+        # When : 같은 Comment를 두 번 approve
+        comment.approve()
+        stale_copy.approve()
+
+        # Then : count는 한 번만 증가
+        self.assertEqual(self._count(), 1)
+
+    def test_create_edit_and_delete_approved_comment(self):
+        # Given : 처음부터 승인된 Comment 생성
+        comment = Comment.objects.create(
+            post=self.post, author="a", text="t", approved_comment=True
+        )
+        self.assertEqual(self._count(), 1)
+
+        # When : 승인을 취소하고 다시 승인한 뒤 삭제
+        comment.approved_comment = False
+        comment.save()
+        self.assertEqual(self._count(), 0)
+
+        comment.approve()
+        self.assertEqual(self._count(), 1)
+
+        comment.delete()
+
+        # Then : count가 0으로 돌아온다
+        self.assertEqual(self._count(), 0)
+
+    def test_rebuild_command_repairs_drift(self):
+        # Given : 실제 승인된 Comment 수와 맞지 않는 count
+        for _ in range(3):
+            Comment.objects.create(
+                post=self.post, author="a", text="t", approved_comment=True
+            )
+        Comment.objects.create(post=self.post, author="a", text="t")
+        Post.objects.update(approved_comment_count=42)
+
+        # When : rebuild 명령을 실행
+        call_command("rebuild_comment_counts", stdout=io.StringIO())
+
+        # Then : 승인된 Comment 수로 다시 계산
+        self.assertEqual(self._count(), 3)
+
+    def test_post_list_returns_counts_without_querying_comments(self):
+        # Given : 승인된 Comment가 있는 Post
+        Comment.objects.create(
+            post=self.post, author="a", text="t", approved_comment=True
+        )
+
+        # When : Post 목록을 조회
+        with CaptureQueriesContext(connection) as context:
+            response = self.get(reverse("post_list"))
+
+        # Then : comment 테이블을 조회하지 않고 count를 반환
+        self.assertEqual(response.json()["results"][0]["approved_comment_count"], 1)
+        self.assertFalse(
+            any("blog_comment" in query["sql"] for query in context.captured_queries)
+        )
+
+
+class TestPostDetailCache(APITestMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.username = "username"
+        self.password = "password"
+        self.user = User.objects.create_user(self.username, password=self.password)
+        self.saved_post = Post.objects.create(
+            author=self.user, title="title", text="text", published_date=timezone.now()
+        )
+
+    def _detail(self):
+        return self.get(reverse("post_detail", kwargs={"pk": self.saved_post.pk}))
+
+    def test_second_request_is_served_from_cache(self):
+        # Given : 한 번 조회된 Post
+        self._detail()
+        before = post_cache.stats()
+
+        # When : 같은 Post를 다시 조회
+        with CaptureQueriesContext(connection) as context:
+            response = self._detail()
+
+        # Then : conditional GET 검증 쿼리 외에는 DB 조회 없이 cache hit로 응답
+        self.assertEqual(len(context.captured_queries), 1)
+        self.assertIn("MAX(", context.captured_queries[0]["sql"])
+        self.assertEqual(response.json()["title"], "title")
+        self.assertEqual(post_cache.stats()["hits"], before["hits"] + 1)
+
+    def test_edit_invalidates_cached_post(self):
+        # Given : cache에 저장된 Post
+        self._detail()
+        self.client.login(username=self.username, password=self.password)
+
+        # When : Post를 수정
+        self.post(
+            reverse("post_edit", kwargs={"pk": self.saved_post.pk}),
+            {"title": "new title", "text": "new text"},
+        )
+
+        # Then : 수정된 내용이 조회
+        self.assertEqual(self._detail().json()["title"], "new title")
+
+    def test_comment_approve_invalidates_cached_post(self):
+        # Given : cache에 저장된 Post와 승인되지 않은 Comment
+        comment = Comment.objects.create(post=self.saved_post, author="a", text="t")
+        self._detail()
+
+        # When : Comment를 승인
+        comment.approve()
+
+        # Then : 승인된 Comment 수가 반영된 Post가 조회
+        self.assertEqual(self._detail().json()["approved_comment_count"], 1)
+
+    def test_only_lock_holder_recomputes_stale_entry(self):
+        # Given : 만료된 cache 항목과 다른 worker가 잡고 있는 재계산 lock
+        with self.settings(BLOG_POST_CACHE_TIMEOUT=0):
+            self._detail()
+        version = post_cache._current_version(cache, self.saved_post.pk)
+        cache.add(post_cache._lock_key(self.saved_post.pk, version), 1)
+
+        def loader():
+            raise AssertionError("loader must not run while another worker recomputes")
+
+        # When : 같은 Post를 조회
+        payload = post_cache.get_post_payload(self.saved_post.pk, loader)
+
+        # Then : 재계산 없이 기존 값을 반환
+        self.assertEqual(payload["post"]["title"], "title")
+
+
+class TestConditionalGet(APITestMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("author")
+        self.saved_post = Post.objects.create(
+            author=self.user, title="title", text="text", published_date=timezone.now()
+        )
+        self.comment = Comment.objects.create(
+            post=self.saved_post, author="a", text="t"
+        )
+
+    def test_return_not_modified_when_etag_matches(self):
+        # Given : 이전에 받은 ETag
+        for url in (
+            reverse("post_list"),
+            reverse("post_detail", kwargs={"pk": self.saved_post.pk}),
+            reverse("comment_list", kwargs={"pk": self.saved_post.pk}),
+        ):
+            etag = self.get(url)["ETag"]
+
+            # When : If-None-Match와 함께 다시 조회
+            with self.assertNumQueries(1):
+                response = self.get(url, HTTP_IF_NONE_MATCH=etag)
+
+            # Then : 직렬화 없이 304 Not Modified를 반환
+            self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+            self.assertEqual(response.content, b"")
+
+    def test_return_not_modified_when_not_modified_since(self):
+        # Given : 이전에 받은 Last-Modified
+        url = reverse("post_detail", kwargs={"pk": self.saved_post.pk})
+        last_modified = self.get(url)["Last-Modified"]
+
+        # When : If-Modified-Since와 함께 다시 조회
+        response = self.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+
+        # Then : 304 Not Modified를 반환
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_collections_send_no_last_modified(self):
+        # Given : 어제 수정된 댓글과 목록 조회 이후의 시각
+        url = reverse("comment_list", kwargs={"pk": self.saved_post.pk})
+        older = Comment.objects.create(post=self.saved_post, author="a", text="old")
+        Comment.objects.filter(pk=older.pk).update(
+            updated_date=timezone.now() - timezone.timedelta(days=1)
+        )
+        since = http_date(time.time() + 60)
+
+        # When : 댓글이 삭제되어 가장 최근 updated_date가 과거로 돌아간 뒤 조회
+        self.comment.delete()
+        response = self.get(url, HTTP_IF_MODIFIED_SINCE=since)
+
+        # Then : If-Modified-Since로는 304를 주지 않는다
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        for name in ("post_list", "comment_list", "comment_thread"):
+            kwargs = {} if name == "post_list" else {"pk": self.saved_post.pk}
+            self.assertNotIn("Last-Modified", self.get(reverse(name, kwargs=kwargs)))
+
+    def test_bulk_update_changes_etag(self):
+        # Given : 이전에 받은 Comment 목록의 ETag
+        url = reverse("comment_list", kwargs={"pk": self.saved_post.pk})
+        etag = self.get(url)["ETag"]
+
+        # When : QuerySet.update로 Comment를 수정
+        Comment.objects.filter(pk=self.comment.pk).update(text="changed")
+
+        # Then : updated_date가 갱신되어 전체 응답을 다시 받는다
+        response = self.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_different_pages_have_different_etags(self):
+        # Given : 같은 목록의 서로 다른 쿼리
+
+        # When : page_size만 다르게 조회
+        first = self.get(reverse("post_list"))
+        second = self.get(reverse("post_list"), {"page_size": 1})
+
+        # Then : 서로 다른 ETag를 반환
+        self.assertNotEqual(first["ETag"], second["ETag"])
+
+
+class TestSparseFields(APITestMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("author")
+        self.saved_post = Post.objects.create(
+            author=self.user, title="title", text="text", published_date=timezone.now()
+        )
+
+    def test_post_list_omits_text_by_default(self):
+        # Given : 본문이 있는 Post
+
+        # When : Post 목록을 조회
+        post = self.get(reverse("post_list")).json()["results"][0]
+
+        # Then : 목록에는 본문이 포함되지 않는다
+        self.assertNotIn("text", post)
+        self.assertEqual(post["title"], "title")
+        self.assertEqual(post["author"], self.user.pk)
+
+    def test_return_only_requested_fields(self):
+        # Given : 필요한 필드만 지정한 요청
+        params = {"fields": "id,title"}
+
+        # When : 목록과 상세를 조회
+        listed = self.get(reverse("post_list"), params).json()["results"][0]
+        detail = self.get(
+            reverse("post_detail", kwargs={"pk": self.saved_post.pk}), params
+        ).json()
+
+        # Then : 요청한 필드만 반환
+        self.assertEqual(listed, {"id": self.saved_post.pk, "title": "title"})
+        self.assertEqual(detail, {"id": self.saved_post.pk, "title": "title"})
+
+    def test_return_bad_request_on_unknown_field(self):
+        # Given : 존재하지 않는 필드
+
+        # When : 해당 필드를 요청
+        response = self.get(reverse("post_list"), {"fields": "id,password"})
+
+        # Then : 400 Bad Request를 반환
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_datetimes_match_django_json_encoder(self):
+        # Given : 마이크로초가 있는 UTC datetime
+        value = timezone.now().replace(microsecond=123456)
+
+        # When : 직렬화
+        # Then : DjangoJSONEncoder와 같은 문자열을 만든다
+        self.assertEqual(
+            json.dumps(format_datetime(value)), DjangoJSONEncoder().encode(value)
+        )
+
+
+class TestBulkModeration(APITestMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("username", password="password")
+        self.client.login(username="username", password="password")
+        self.posts = [
+            Post.objects.create(author=self.user, title="title", text="text")
+            for _ in range(2)
+        ]
+        self.spam = [
+            Comment.objects.create(post=post, author="spammer", text="spam")
+            for post in self.posts
+            for _ in range(3)
+        ]
+        self.approved = Comment.objects.create(
+            post=self.posts[0], author="reader", text="hello", approved_comment=True
+        )
+
+    def _counts(self):
+        return [
+            Post.objects.get(pk=post.pk).approved_comment_count for post in self.posts
+        ]
+
+    def test_approve_by_ids(self):
+        # Given : 여러 Post에 걸친 승인되지 않은 Comment들의 pk
+        ids = [comment.pk for comment in self.spam[:4]] + [self.approved.pk]
+
+        # When : 일괄 승인을 요청
+        with self.settings(BLOG_MODERATION_CHUNK_SIZE=2):
+            response = self.post(reverse("comment_bulk_approve"), {"ids": ids})
+
+        # Then : 새로 승인된 Comment 수를 반환하고 Post의 count가 함께 갱신
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.json(), {"approved": 4})
+        self.assertEqual(self._counts(), [4, 1])
+
+    def test_remove_by_filter(self):
+        # Given : 특정 작성자의 Comment를 지정하는 filter
+        data = {"author": "spammer", "post": self.posts[0].pk}
+
+        # When : 일괄 삭제를 요청
+        response = self.post(reverse("comment_bulk_remove"), data)
+
+        # Then : 해당 Comment들만 삭제
+        self.assertEqual(response.json(), {"removed": 3})
+        self.assertEqual(Comment.objects.filter(author="spammer").count(), 3)
+        self.assertTrue(Comment.objects.filter(pk=self.approved.pk).exists())
+
+    def test_remove_approved_comment_updates_count(self):
+        # Given : 승인된 Comment
+
+        # When : 일괄 삭제를 요청
+        self.post(reverse("comment_bulk_remove"), {"ids": [self.approved.pk]})
+
+        # Then : Post의 count가 감소
+        self.assertEqual(self._counts(), [0, 0])
+
+    def test_return_bad_request_without_selection(self):
+        # Given : ids도 filter도 없는 요청
+        for data in (
+            {},
+            {"ids": "1,2"},
+            {"created_before": "yesterday"},
+            {"post": {"a": 1}},
+            {"post": True},
+            {"post": 2**64},
+            {"ids": [2**64]},
+            {"author": ["a"]},
+        ):
+            # When : 일괄 승인을 요청
+            response = self.post(reverse("comment_bulk_approve"), data)
+
+            # Then : 400 Bad Request를 반환하고 아무것도 바뀌지 않는다
+            self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertEqual(self._counts(), [1, 0])
+
+
+@unittest.skipUnless(connection.vendor == "sqlite", "FTS5 index is SQLite only")
+class TestSearch(APITestMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("author")
+        self.django_post = Post.objects.create(
+            author=self.user,
+            title="Django tips",
+            text="Keyset pagination keeps deep pages fast.",
+            published_date=timezone.now(),
+        )
+        self.other_post = Post.objects.create(
+            author=self.user,
+            title="Cooking",
+            text="Mention django once <script>alert(1)</script>",
+            published_date=timezone.now(),
+        )
+        Post.objects.create(author=self.user, title="django draft", text="hidden")
+
+    def _search(self, **params):
+        return self.get(reverse("post_search"), params)
+
+    def test_results_are_ranked_by_relevance(self):
+        # Given : 제목에 검색어가 있는 Post와 본문에만 있는 Post, 그리고 draft
+
+        # When : 검색
+        results = self._search(q="django").json()["results"]
+
+        # Then : 제목이 일치하는 Post가 먼저 오고 draft는 제외
+        self.assertEqual(
+            [result["id"] for result in results],
+            [self.django_post.pk, self.other_post.pk],
+        )
+
+    def test_snippet_is_escaped_and_highlighted(self):
+        # Given : 본문에 HTML이 포함된 Post
+
+        # When : 검색
+        results = self._search(q="mention").json()["results"]
+
+        # Then : 검색어는 <mark>로 감싸고 HTML은 escape
+        snippet = results[0]["snippet"]
+        self.assertIn("<mark>Mention</mark>", snippet)
+        self.assertNotIn("<script>", snippet)
+
+    def test_index_follows_edits_and_comment_approval(self):
+        # Given : 수정된 Post와 승인 전후의 Comment
+        self.django_post.text = "Now about sqlite"
+        self.django_post.save()
+        comment = Comment.objects.create(
+            post=self.other_post, author="reader", text="sqlite rocks"
+        )
+        self.assertEqual(len(self._search(q="sqlite").json()["results"]), 1)
+
+        # When : Comment를 승인
+        comment.approve()
+
+        # Then : 수정 내용과 승인된 Comment가 검색된다
+        results = self._search(q="sqlite").json()["results"]
+        self.assertEqual(
+            sorted(result["kind"] for result in results), ["comment", "post"]
+        )
+        self.assertEqual(self._search(q="keyset").json()["results"], [])
+
+    def test_korean_terms_match_inflected_words(self):
+        # Given : 조사와 어미가 붙은 한국어 본문
+        korean = Post.objects.create(
+            author=self.user,
+            title="인사",
+            text="장고 블로그에 오신 것을 환영합니다",
+            published_date=timezone.now(),
+        )
+
+        # When : 어간만으로 검색
+        found = [self._search(q=q).json()["results"] for q in ("블로그", "환영")]
+
+        # Then : 둘 다 찾고 일치한 부분을 표시
+        for results in found:
+            self.assertEqual([result["id"] for result in results], [korean.pk])
+        self.assertIn("<mark>블로그에</mark>", found[0][0]["snippet"])
+
+    def test_paginate_results(self):
+        # Given : page_size 1
+
+        # When : 두 페이지를 조회
+        first = self._search(q="django", page_size=1).json()
+        second = self._search(q="django", page_size=1, page=first["next"]).json()
+
+        # Then : 결과가 나뉘어 반환
+        self.assertEqual(first["results"][0]["id"], self.django_post.pk)
+        self.assertEqual(second["results"][0]["id"], self.other_post.pk)
+        self.assertIsNone(second["next"])
+
+    def test_reject_pages_past_the_last(self):
+        # When : 마지막 페이지, 그 다음 페이지, OFFSET이 넘치는 페이지
+        with self.settings(BLOG_SEARCH_MAX_PAGE=1):
+            last = self._search(q="django", page_size=1)
+            past = self._search(q="django", page_size=1, page=2)
+        overflow = self._search(q="django", page=2**64)
+
+        # Then : 마지막 페이지에는 next가 없고 나머지는 400
+        self.assertIsNone(last.json()["next"])
+        self.assertEqual(past.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertEqual(overflow.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_rebuild_command_restores_index(self):
+        # Given : 비워진 검색 index
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM blog_search")
+
+        # When : rebuild 명령을 실행
+        call_command("rebuild_search_index", batch_size=1, stdout=io.StringIO())
+
+        # Then : 다시 검색된다
+        self.assertEqual(len(self._search(q="django").json()["results"]), 2)
+
+    def test_triggers_match_the_migration(self):
+        # Given : 0006이 만든 trigger
+        migration = importlib.import_module("blog.migrations.0006_search_index")
+
+        # Then : 다시 만들 때(ensure_triggers)도 같은 trigger
+        self.assertEqual(search.SQLITE_TRIGGERS, migration.SQLITE_TRIGGERS)
+
+    def test_return_bad_request_on_empty_query(self):
+        # Given : 공백뿐인 검색어
+
+        # When : 검색
+        response = self._search(q=" ")
+
+        # Then : 400 Bad Request를 반환
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+
+class TestPostDetailIncludes(APITestMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("author", first_name="Song")
+        self.saved_post = Post.objects.create(
+            author=self.user, title="title", text="text", published_date=timezone.now()
+        )
+
+    def _detail(self, include, **extra):
+        url = reverse("post_detail", kwargs={"pk": self.saved_post.pk})
+        return self.get(url, {"include": include}, **extra)
+
+    def _add_comments(self, count):
+        for i in range(count):
+            Comment.objects.create(
+                post=self.saved_post,
+                author="reader",
+                text="comment {}".format(i),
+                approved_comment=True,
+            )
+        Comment.objects.create(post=self.saved_post, author="spam", text="pending")
+
+    def test_embed_author_and_approved_comments(self):
+        # Given : 승인된 Comment 2개와 승인되지 않은 Comment 1개
+        self._add_comments(2)
+
+        # When : comments와 author를 포함해 조회
+        data = self._detail("comments,author").json()
+
+        # Then : 작성자의 공개 정보와 승인된 Comment만 함께 반환
+        self.assertEqual(
+            data["author"],
+            {
+                "id": self.user.pk,
+                "username": "author",
+                "first_name": "Song",
+                "last_name": "",
+            },
+        )
+        self.assertEqual(
+            [comment["text"] for comment in data["comments"]],
+            ["comment 0", "comment 1"],
+        )
+
+    def test_query_count_does_not_depend_on_comment_count(self):
+        # Given : Comment가 많은 Post
+        self._add_comments(20)
+
+        # When : cache가 비어있는 상태에서 comments와 author를 포함해 조회
+        # Then : 검증 쿼리, Post+author, Comment prefetch의 3개 쿼리만 실행
+        with self.assertNumQueries(3):
+            response = self._detail("comments,author")
+        self.assertEqual(len(response.json()["comments"]), 20)
+
+    def test_comment_edit_changes_etag_of_embedded_comments(self):
+        # Given : comments를 포함해 받은 ETag
+        self._add_comments(1)
+        etag = self._detail("comments")["ETag"]
+
+        # When : 승인된 Comment의 내용을 수정
+        comment = Comment.objects.filter(approved_comment=True).get()
+        comment.text = "edited"
+        comment.save()
+
+        # Then : 304가 아닌 수정된 내용을 받는다
+        response = self._detail("comments", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.json()["comments"][0]["text"], "edited")
+
+    def test_return_bad_request_on_unknown_include(self):
+        # Given : 지원하지 않는 include
+
+        # When : 조회
+        response = self._detail("likes")
+
+        # Then : 400 Bad Request를 반환
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+
+@override_settings(BLOG_METRICS_PATH="/metrics")
+class TestMetrics(APITestMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("author")
+        Post.objects.create(
+            author=self.user, title="title", text="text", published_date=timezone.now()
+        )
+
+    def _sample(self, body, name):
+        pattern = r"^{} (\S+)$".format(re.escape(name))
+        match = re.search(pattern, body, re.MULTILINE)
+        return float(match.group(1)) if match else 0.0
+
+    def test_record_latency_and_queries_per_view(self):
+        # Given : 수집 전의 post_list 요청 수
+        before = self.get("/metrics").content.decode()
+        count = 'blog_request_queries_count{view="post_list"}'
+
+        # When : post_list를 두 번 요청
+        self.get(reverse("post_list"))
+        self.get(reverse("post_list"))
+
+        # Then : Prometheus 형식으로 view별 요청 수와 쿼리 수가 노출
+        response = self.get("/metrics")
+        body = response.content.decode()
+
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        self.assertEqual(self._sample(body, count), self._sample(before, count) + 2)
+        self.assertIn("# TYPE blog_request_duration_seconds histogram", body)
+        self.assertIn(
+            'blog_request_duration_seconds_bucket{view="post_list",le="+Inf"}', body
+        )
+        self.assertGreater(
+            self._sample(body, 'blog_request_queries_sum{view="post_list"}'), 0
+        )
+
+    def test_metrics_path_is_opt_in(self):
+        # Given : BLOG_METRICS_PATH가 설정되지 않은 상태
+        with self.settings(BLOG_METRICS_PATH=None):
+            # When : /metrics를 요청
+            response = self.get("/metrics")
+
+        # Then : 노출되지 않는다
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_sum_snapshots_of_all_workers(self):
+        # Given : 다른 worker가 남긴 snapshot
+        with tempfile.TemporaryDirectory() as directory:
+            other_worker = {
+                "histograms": [],
+                "counters": [
+                    [
+                        "blog_requests_total",
+                        [["view", "post_list"], ["method", "GET"], ["status", 200]],
+                        5,
+                    ]
+                ],
+            }
+            with open(os.path.join(directory, "metrics-1.json"), "w") as snapshot:
+                json.dump(other_worker, snapshot)
+            name = 'blog_requests_total{view="post_list",method="GET",status="200"}'
+            local = self._sample(self.get("/metrics").content.decode(), name)
+
+            # When : metrics 디렉터리를 설정하고 조회
+            with self.settings(BLOG_METRICS_DIR=directory):
+                body = self.get("/metrics").content.decode()
+
+        # Then : 모든 worker의 값이 합산
+        self.assertEqual(self._sample(body, name), local + 5)
+
+
+class TestAuthorDashboard(APITestMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("username", password="password")
+        self.other = User.objects.create_user("other")
+        self.client.login(username="username", password="password")
+
+        now = timezone.now()
+        self.saved_post = Post.objects.create(
+            author=self.user, title="published", text="text", published_date=now
+        )
+        Post.objects.create(
+            author=self.user,
+            title="scheduled",
+            text="text",
+            published_date=now + timezone.timedelta(days=1),
+        )
+        self.drafts = [
+            Post.objects.create(author=self.user, title="draft", text="text")
+            for _ in range(2)
+        ]
+        other_post = Post.objects.create(
+            author=self.other, title="other", text="text", published_date=now
+        )
+        Post.objects.create(author=self.other, title="other draft", text="text")
+
+        Comment.objects.create(post=self.saved_post, author="a", text="pending")
+        Comment.objects.create(post=self.saved_post, author="b", text="pending")
+        Comment.objects.create(
+            post=self.saved_post, author="c", text="approved", approved_comment=True
+        )
+        Comment.objects.create(post=other_post, author="d", text="other")
+
+    def test_counts_come_from_one_query(self):
+        # When : 작성자별 집계
+        with self.assertNumQueries(1):
+            counts = dashboard.author_counts(self.user)
+
+        # Then : 다른 작성자의 글과 댓글, 예약된 글은 빠진다
+        self.assertEqual(
+            counts,
+            {
+                "drafts": 2,
+                "published": 1,
+                "pending_comments": 2,
+                "approved_comments": 1,
+            },
+        )
+
+    def test_dashboard_returns_recent_items(self):
+        # When : 대시보드 조회
+        response = self.get(reverse("author_dashboard"))
+
+        # Then : 최근 초안이 먼저 오고 내 글의 승인 대기 댓글만 포함
+        data = response.json()
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(data["counts"]["drafts"], 2)
+        self.assertEqual(
+            [post["id"] for post in data["drafts"]],
+            [post.pk for post in reversed(self.drafts)],
+        )
+        self.assertEqual([post["title"] for post in data["published"]], ["published"])
+        self.assertEqual(
+            {comment["text"] for comment in data["pending_comments"]}, {"pending"}
+        )
+        self.assertEqual(len(data["pending_comments"]), 2)
+
+    def test_dashboard_requires_login(self):
+        # Given : 로그아웃
+        self.client.logout()
+
+        # When
+        response = self.get(reverse("author_dashboard"))
+
+        # Then : 로그인 페이지로 보낸다
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+
+    def test_draft_list_filters_by_author(self):
+        # When : 작성자를 지정해 초안 조회
+        mine = self.get(reverse("post_draft_list"), {"author": "me"}).json()
+        other = self.get(reverse("post_draft_list"), {"author": self.other.pk}).json()
+        invalid = self.get(reverse("post_draft_list"), {"author": "nobody"})
+        huge = self.get(reverse("post_draft_list"), {"author": 2**64})
+
+        # Then
+        self.assertEqual(
+            [post["id"] for post in mine["results"]],
+            [post.pk for post in self.drafts],
+        )
+        self.assertEqual([post["title"] for post in other["results"]], ["other draft"])
+        self.assertEqual(invalid.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertEqual(huge.status_code, HTTPStatus.BAD_REQUEST)
+
+
+class TestScheduledPublishing(APITestMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("username", password="password")
+        self.client.login(username="username", password="password")
+        self.now = timezone.now()
+
+    def _schedule(self, seconds):
+        return Post.objects.create(
+            author=self.user,
+            title="scheduled",
+            text="text",
+            publish_at=self.now + timezone.timedelta(seconds=seconds),
+        )
+
+    def _lag(self, suffix):
+        body = render([registry.snapshot()])
+        match = re.search(
+            r"^blog_publish_lag_seconds_{} (\S+)$".format(suffix), body, re.MULTILINE
+        )
+        return float(match.group(1)) if match else 0.0
+
+    def test_publish_due_posts_once(self):
+        # Given : 지난 예약 글 2개, 아직 이른 예약 글, 예약 없는 초안
+        due = [self._schedule(-30), self._schedule(-10)]
+        later = self._schedule(60)
+        draft = Post.objects.create(author=self.user, title="draft", text="text")
+        count, total = self._lag("count"), self._lag("sum")
+
+        # When : 두 publisher가 같은 시각에 실행
+        first = publisher.publish_due(self.now)
+        second = publisher.publish_due(self.now)
+
+        # Then : 지난 글만 한 번씩 게시되고 지연 시간이 기록된다
+        self.assertEqual(sorted(first), [post.pk for post in due])
+        self.assertEqual(second, {})
+        self.assertEqual(first, {due[0].pk: 30.0, due[1].pk: 10.0})
+        for post in due:
+            post.refresh_from_db()
+            self.assertEqual(post.published_date, self.now)
+        for post in (later, draft):
+            post.refresh_from_db()
+            self.assertIsNone(post.published_date)
+        self.assertEqual(self._lag("count"), count + 2)
+        self.assertAlmostEqual(self._lag("sum"), total + 40)
+
+    def test_published_post_is_not_served_stale(self):
+        # Given : cache된 예약 글
+        post = self._schedule(-1)
+        self.get(reverse("post_detail", kwargs={"pk": post.pk}))
+
+        # When
+        publisher.publish_due(self.now)
+
+        # Then : 게시된 상태로 조회된다
+        response = self.get(reverse("post_detail", kwargs={"pk": post.pk}))
+        self.assertIsNotNone(response.json()["published_date"])
+
+    def test_create_and_edit_schedule(self):
+        # When : publish_at과 함께 글을 쓰고, 수정으로 예약을 취소
+        response = self.post(
+            reverse("post_new"),
+            {"title": "title", "text": "text", "publish_at": "2030-01-01T09:00:00Z"},
+        )
+        pk = response.json()["id"]
+        edited = self.post(
+            reverse("post_edit", kwargs={"pk": pk}),
+            {"title": "title", "text": "text", "publish_at": None},
+        )
+        invalid = self.post(
+            reverse("post_new"),
+            {"title": "title", "text": "text", "publish_at": "tomorrow"},
+        )
+
+        # Then
+        self.assertEqual(response.json()["publish_at"], "2030-01-01T09:00:00Z")
+        self.assertIsNone(edited.json()["publish_at"])
+        self.assertEqual(invalid.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_run_publisher_once(self):
+        # Given
+        post = self._schedule(-1)
+        stdout, stderr = io.StringIO(), io.StringIO()
+
+        # When : metrics 디렉터리 없이 실행
+        with self.settings(BLOG_METRICS_DIR=None):
+            call_command("run_publisher", once=True, stdout=stdout, stderr=stderr)
+
+        # Then : 지연 시간을 출력하고 metrics가 수집되지 않는다고 경고
+        post.refresh_from_db()
+        self.assertIsNotNone(post.published_date)
+        self.assertRegex(stdout.getvalue(), r"Published 1 posts, lag up to \d+\.\d{3}s")
+        self.assertIn("BLOG_METRICS_DIR is not set", stderr.getvalue())
+
+
+class TestPartialEdits(APITestMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("username", password="password")
+        self.client.login(username="username", password="password")
+        self.saved_post = Post.objects.create(
+            author=self.user, title="title", text="long text", published_date=None
+        )
+        self.comment = Comment.objects.create(
+            post=self.saved_post, author="author", text="text"
+        )
+
+    def test_patch_writes_only_submitted_fields_in_one_query(self):
+        # When : 제목만 PATCH
+        with CaptureQueriesContext(connection) as context:
+            response = self.patch(
+                reverse("post_edit", kwargs={"pk": self.saved_post.pk}),
+                {"title": "new title"},
+            )
+
+        # Then : blog_post에는 UPDATE 한 번, text는 쓰지 않는다
+        statements = [
+            query["sql"]
+            for query in context.captured_queries
+            if "blog_post" in query["sql"]
+        ]
+        self.assertEqual(len(statements), 1)
+        self.assertTrue(statements[0].startswith("UPDATE"))
+        self.assertNotIn('"text"', statements[0].split(" WHERE ")[0])
+
+        data = response.json()
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(data["title"], "new title")
+        self.assertEqual(data["text"], "long text")
+        self.assertEqual(data["version"], 2)
+        self.assertEqual(response["ETag"], '"2"')
+
+    def test_stale_if_match_fails_precondition(self):
+        # Given : 다른 사람이 먼저 수정
+        url = reverse("post_edit", kwargs={"pk": self.saved_post.pk})
+        self.patch(url, {"text": "first"}, HTTP_IF_MATCH='"1"')
+
+        # When : 같은 version을 기준으로 다시 수정
+        response = self.patch(url, {"text": "second"}, HTTP_IF_MATCH='"1"')
+
+        # Then : 412와 현재 version, 먼저 한 수정이 남는다
+        self.assertEqual(response.status_code, HTTPStatus.PRECONDITION_FAILED)
+        self.assertEqual(response.json()["version"], 2)
+        self.saved_post.refresh_from_db()
+        self.assertEqual(self.saved_post.text, "first")
+
+    def test_if_match_with_post_detail_etag(self):
+        # Given : post_detail에서 받은 ETag
+        url = reverse("post_edit", kwargs={"pk": self.saved_post.pk})
+        detail = reverse("post_detail", kwargs={"pk": self.saved_post.pk})
+        etag = self.get(detail)["ETag"]
+
+        # When : 그 ETag로 두 번 수정, 모르는 ETag로 수정
+        first = self.patch(url, {"text": "first"}, HTTP_IF_MATCH=etag)
+        second = self.patch(url, {"text": "second"}, HTTP_IF_MATCH=etag)
+        unknown = self.patch(url, {"text": "third"}, HTTP_IF_MATCH="yesterday")
+        huge = self.patch(url, {"text": "fourth"}, HTTP_IF_MATCH='"{}"'.format(2**64))
+
+        # Then : 처음만 성공하고 나머지는 precondition 실패
+        self.assertEqual(first.status_code, HTTPStatus.OK)
+        self.assertEqual(second.status_code, HTTPStatus.PRECONDITION_FAILED)
+        self.assertEqual(unknown.status_code, HTTPStatus.PRECONDITION_FAILED)
+        self.assertEqual(huge.status_code, HTTPStatus.PRECONDITION_FAILED)
+        self.assertEqual(unknown.json()["version"], 2)
+        self.assertNotEqual(self.get(detail)["ETag"], etag)
+
+    def test_version_in_body(self):
+        url = reverse("comment_edit", kwargs={"pk": self.comment.pk})
+
+        # When : body의 version으로 댓글을 두 번 수정
+        first = self.patch(url, {"text": "edited", "version": 1})
+        second = self.patch(url, {"text": "again", "version": 1})
+
+        # Then : 두 번째는 충돌
+        self.assertEqual(first.status_code, HTTPStatus.OK)
+        self.assertEqual(first.json()["author"], "author")
+        self.assertEqual(first.json()["text"], "edited")
+        self.assertEqual(second.status_code, HTTPStatus.CONFLICT)
+
+    def test_invalid_patches(self):
+        url = reverse("post_edit", kwargs={"pk": self.saved_post.pk})
+
+        # When : 빈 PATCH, 모르는 필드, 잘못된 version
+        responses = [
+            self.patch(url, {}),
+            self.patch(url, {"titel": "typo"}),
+            self.patch(url, {"title": "title", "version": "yesterday"}),
+            self.patch(url, {"title": "title", "version": 2**64}),
+        ]
+
+        # Then : 모두 400
+        for response in responses:
+            self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_publish_keeps_concurrent_edit(self):
+        # Given : 게시 전에 읽어 둔 글과 그 사이의 수정
+        loaded = Post.objects.get(pk=self.saved_post.pk)
+        self.patch(
+            reverse("post_edit", kwargs={"pk": self.saved_post.pk}), {"text": "edited"}
+        )
+
+        # When : 읽어 둔 글을 게시
+        loaded.publish()
+
+        # Then : 수정한 내용이 남는다
+        self.saved_post.refresh_from_db()
+        self.assertEqual(self.saved_post.text, "edited")
+        self.assertIsNotNone(self.saved_post.published_date)
+
+    def test_update_returning_fallback(self):
+        # Given : UPDATE ... RETURNING이 없는 데이터베이스
+        with mock.patch("blog.edits._can_return", return_value=False):
+            # When
+            row = edits.edit(
+                Post, self.saved_post.pk, {"title": "fallback"}, ["title", "version"]
+            )
+
+            removed = self.delete(
+                reverse("post_remove", kwargs={"pk": self.saved_post.pk})
+            )
+
+        # Then : 같은 결과
+        self.assertEqual(row, {"title": "fallback", "version": 2})
+        self.assertEqual(removed.status_code, HTTPStatus.NO_CONTENT)
+        self.assertTrue(Post.all_objects.get(pk=self.saved_post.pk).is_removed)
+
+
+class TestSoftDelete(APITestMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("username", password="password")
+        self.client.login(username="username", password="password")
+        self.saved_post = Post.objects.create(
+            author=self.user,
+            title="removed",
+            text="searchable text",
+            published_date=timezone.now(),
+        )
+        self.kept_post = Post.objects.create(
+            author=self.user, title="kept", text="text", published_date=timezone.now()
+        )
+        for number in range(5):
+            Comment.objects.create(
+                post=self.saved_post,
+                author="author",
+                text="comment {}".format(number),
+                approved_comment=number % 2 == 0,
+            )
+        Comment.objects.create(post=self.kept_post, author="author", text="kept")
+
+    def _remove(self):
+        return self.delete(reverse("post_remove", kwargs={"pk": self.saved_post.pk}))
+
+    def test_remove_is_one_update(self):
+        # When : 댓글이 있는 글을 삭제
+        with CaptureQueriesContext(connection) as context:
+            response = self._remove()
+
+        # Then : UPDATE 한 번, 댓글은 읽지도 지우지도 않는다
+        statements = [query["sql"] for query in context.captured_queries]
+        self.assertEqual(response.status_code, HTTPStatus.NO_CONTENT)
+        self.assertEqual(len(statements), 1)
+        self.assertTrue(statements[0].startswith("UPDATE"))
+        self.assertEqual(Comment.objects.filter(post=self.saved_post).count(), 5)
+        self.assertEqual(self._remove().status_code, HTTPStatus.NOT_FOUND)
+
+    def test_removed_post_is_hidden_everywhere(self):
+        # Given : 삭제 전에 받아 둔 댓글 목록의 ETag
+        comments_url = reverse("comment_list", kwargs={"pk": self.saved_post.pk})
+        etag = self.get(comments_url)["ETag"]
+
+        # When
+        self._remove()
+
+        # Then : 목록, 상세, 댓글, 검색, 대시보드에서 바로 사라진다
+        listed = [
+            post["id"] for post in self.get(reverse("post_list")).json()["results"]
+        ]
+        self.assertEqual(listed, [self.kept_post.pk])
+        detail = self.get(reverse("post_detail", kwargs={"pk": self.saved_post.pk}))
+        self.assertEqual(detail.status_code, HTTPStatus.NOT_FOUND)
+        comments = self.get(comments_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(comments.status_code, HTTPStatus.NOT_FOUND)
+        found = self.get(reverse("post_search"), {"q": "searchable"}).json()
+        self.assertEqual(found["results"], [])
+        counts = self.get(reverse("author_dashboard")).json()["counts"]
+        self.assertEqual(counts["published"], 1)
+        self.assertEqual(counts["pending_comments"], 1)
+
+    def test_purge_deletes_in_chunks(self):
+        # Given : 삭제 표시된 글
+        self._remove()
+
+        # When : 2개씩 지우는 purge
+        with CaptureQueriesContext(connection) as context:
+            posts, comments = purge.purge_removed(limit=10, chunk_size=2)
+
+        # Then : 댓글을 메모리로 읽지 않고 나눠 지운 뒤 글을 지운다
+        selects = [
+            query["sql"]
+            for query in context.captured_queries
+            if query["sql"].startswith("SELECT") and "blog_comment" in query["sql"]
+        ]
+        self.assertEqual(selects, [])
+        self.assertEqual((posts, comments), (1, 5))
+        self.assertFalse(Post.all_objects.filter(pk=self.saved_post.pk).exists())
+        self.assertFalse(Comment.objects.filter(post_id=self.saved_post.pk).exists())
+        self.assertEqual(self.kept_post.comments.count(), 1)
+
+    def test_purge_command_once(self):
+        # Given
+        self._remove()
+        stdout = io.StringIO()
+
+        # When
+        call_command("purge_removed_posts", once=True, chunk_size=2, stdout=stdout)
+
+        # Then
+        self.assertIn("Purged 1 posts and 5 comments", stdout.getvalue())
+        self.assertEqual(list(Post.all_objects.all()), [self.kept_post])
+
+
+class TestPostSummary(APITestMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("username", password="password")
+        self.client.login(username="username", password="password")
+        self.body = " ".join(["word"] * 450)
+        self.saved_post = Post.objects.create(
+            author=self.user,
+            title="long",
+            text=self.body,
+            published_date=timezone.now(),
+        )
+
+    def test_summary_is_computed_on_save(self):
+        # Then : 200자로 자른 요약, 단어 수, 분 단위 읽기 시간
+        self.assertEqual(len(self.saved_post.excerpt), 200)
+        self.assertTrue(self.saved_post.excerpt.endswith("..."))
+        self.assertEqual(self.saved_post.word_count, 450)
+        self.assertEqual(self.saved_post.reading_time, 3)
+
+        # When : text만 저장
+        self.saved_post.text = "short\n\n  text"
+        self.saved_post.save(update_fields=["text"])
+
+        # Then : 요약도 함께 저장된다
+        self.saved_post.refresh_from_db()
+        self.assertEqual(self.saved_post.excerpt, "short text")
+        self.assertEqual(self.saved_post.word_count, 2)
+        self.assertEqual(self.saved_post.reading_time, 1)
+
+    def test_patch_updates_summary(self):
+        # When : PATCH로 text 수정
+        response = self.patch(
+            reverse("post_edit", kwargs={"pk": self.saved_post.pk}), {"text": "new"}
+        )
+
+        # Then
+        self.assertEqual(response.json()["excerpt"], "new")
+        self.assertEqual(response.json()["word_count"], 1)
+
+    def test_listings_never_read_text(self):
+        # When : 목록 조회
+        with CaptureQueriesContext(connection) as context:
+            response = self.get(reverse("post_list"))
+            self.get(reverse("post_draft_list"))
+            self.get(reverse("author_dashboard"))
+        with_text = self.get(reverse("post_list"), {"fields": "id,text"})
+
+        # Then : 본문 대신 요약을 보내고 본문 column은 읽지 않는다
+        post = response.json()["results"][0]
+        self.assertNotIn("text", post)
+        self.assertEqual(post["excerpt"], self.saved_post.excerpt)
+        self.assertEqual(post["reading_time"], 3)
+        for query in context.captured_queries:
+            self.assertNotIn('"blog_post"."text"', query["sql"])
+        self.assertEqual(with_text.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_backfill(self):
+        # Given : 요약 column이 생기기 전에 저장된 글들
+        Post.objects.create(author=self.user, title="second", text="two words")
+        Post.objects.update(excerpt="", word_count=0, reading_time=0)
+
+        # When
+        stdout = io.StringIO()
+        call_command("backfill_post_summaries", batch_size=1, stdout=stdout)
+
+        # Then
+        self.assertIn("Backfilled summaries for 2 posts", stdout.getvalue())
+        self.assertEqual(
+            sorted(Post.objects.values_list("word_count", "reading_time")),
+            [(2, 1), (450, 3)],
+        )
+
+
+class TestRenderedText(APITestMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("username", password="password")
+        self.client.login(username="username", password="password")
+        self.saved_post = Post.objects.create(
+            author=self.user,
+            title="title",
+            text="<b>first</b>\nline\n\nsecond",
+            published_date=timezone.now(),
+        )
+        self.saved_comment = Comment.objects.create(
+            post=self.saved_post,
+            author="reader",
+            text="<i>hi</i>",
+            approved_comment=True,
+        )
+
+    def test_text_is_rendered_on_save(self):
+        # Then : escape된 문단과 줄바꿈
+        self.assertEqual(
+            self.saved_post.text_html,
+            "<p>&lt;b&gt;first&lt;/b&gt;<br />line</p>\n\n<p>second</p>",
+        )
+        self.assertEqual(self.saved_comment.text_html, "<p>&lt;i&gt;hi&lt;/i&gt;</p>")
+
+        # When : 댓글 목록 조회
+        response = self.get(reverse("comment_list", kwargs={"pk": self.saved_post.pk}))
+
+        # Then : 저장된 HTML을 그대로 보낸다
+        self.assertEqual(
+            response.json()["results"][0]["text_html"], self.saved_comment.text_html
+        )
+
+    def test_same_text_is_rendered_once(self):
+        # When : 같은 본문을 여러 번 저장
+        with mock.patch(
+            "blog.rendering.render", side_effect=rendering.render
+        ) as render_text:
+            for _ in range(3):
+                Comment.objects.create(
+                    post=self.saved_post, author="reader", text="same text"
+                )
+            self.saved_post.save()
+
+        # Then : 처음 한 번만 render하고 이후에는 digest로 찾는다
+        self.assertEqual(render_text.call_count, 1)
+        self.assertEqual(
+            RenderedText.objects.get(digest=rendering.digest("same text")).html,
+            "<p>same text</p>",
+        )
+
+    def test_renderer_version_is_part_of_digest(self):
+        # When : renderer version이 바뀌면
+        with mock.patch("blog.rendering.RENDERER_VERSION", "2"):
+            changed = rendering.digest("same text")
+
+        # Then : 같은 본문도 다시 render된다
+        self.assertNotEqual(changed, rendering.digest("same text"))
+
+    def test_patch_rerenders(self):
+        # When : PATCH로 본문 수정
+        response = self.patch(
+            reverse("post_edit", kwargs={"pk": self.saved_post.pk}), {"text": "a & b"}
+        )
+        comment = self.patch(
+            reverse("comment_edit", kwargs={"pk": self.saved_comment.pk}),
+            {"text": "c < d"},
+        )
+
+        # Then
+        self.assertEqual(response.json()["text_html"], "<p>a &amp; b</p>")
+        self.assertEqual(comment.json()["text_html"], "<p>c &lt; d</p>")
+
+    def test_html_is_not_listed(self):
+        # When
+        detail = self.get(reverse("post_detail", kwargs={"pk": self.saved_post.pk}))
+        listing = self.get(reverse("post_list"))
+
+        # Then : 상세에는 HTML이 있고 목록에는 없다
+        self.assertEqual(detail.json()["text_html"], self.saved_post.text_html)
+        self.assertNotIn("text_html", listing.json()["results"][0])
+
+    def test_backfill(self):
+        # Given : text_html이 생기기 전에 저장된 글과 댓글
+        Post.objects.update(text_html="")
+        Comment.objects.update(text_html="")
+
+        # When
+        stdout = io.StringIO()
+        call_command("backfill_text_html", batch_size=1, stdout=stdout)
+
+        # Then
+        self.assertIn(
+            "Backfilled text_html for 1 posts and 1 comments", stdout.getvalue()
+        )
+        self.saved_comment.refresh_from_db()
+        self.assertEqual(self.saved_comment.text_html, "<p>&lt;i&gt;hi&lt;/i&gt;</p>")
+
+    def test_prune_unused_rendered_text(self):
+        # Given : 수정 전 본문과 삭제된 댓글의 HTML
+        self.patch(
+            reverse("post_edit", kwargs={"pk": self.saved_post.pk}), {"text": "edited"}
+        )
+        Comment.objects.filter(pk=self.saved_comment.pk).delete()
+
+        # When
+        stdout = io.StringIO()
+        call_command("backfill_text_html", prune=True, batch_size=1, stdout=stdout)
+
+        # Then : 지금 본문의 HTML만 남는다
+        self.assertIn("Pruned 2 unused rendered texts", stdout.getvalue())
+        self.assertEqual(
+            list(RenderedText.objects.values_list("digest", flat=True)),
+            [rendering.digest("edited")],
+        )
+
+
+class TestCommentThreads(APITestMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("username", password="password")
+        self.client.login(username="username", password="password")
+        self.saved_post = Post.objects.create(
+            author=self.user, title="title", text="text", published_date=timezone.now()
+        )
+        # first
+        #   reply
+        #     nested
+        #   second reply
+        # second
+        self.first = self._comment("first")
+        self.reply = self._comment("reply", parent=self.first)
+        self.second = self._comment("second")
+        self.nested = self._comment("nested", parent=self.reply)
+        self.second_reply = self._comment("second reply", parent=self.first)
+
+    def _comment(self, text, parent=None):
+        return Comment.objects.create(
+            post=self.saved_post,
+            author="reader",
+            text=text,
+            parent=parent,
+            approved_comment=True,
+        )
+
+    def _thread(self, **params):
+        return self.get(
+            reverse("comment_thread", kwargs={"pk": self.saved_post.pk}), params
+        )
+
+    def _texts(self, nodes):
+        return [[node["text"], self._texts(node["replies"])] for node in nodes]
+
+    def test_reply_is_placed_under_parent(self):
+        # When : 답글 작성
+        response = self.post(
+            reverse("add_comment_to_post", kwargs={"pk": self.saved_post.pk}),
+            {"author": "reader", "text": "deeper", "parent": self.nested.pk},
+        )
+
+        # Then : 부모의 path 아래, 한 단계 깊게
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        self.assertEqual(response.json()["parent"], self.nested.pk)
+        self.assertEqual(response.json()["depth"], 3)
+        created = Comment.objects.get(pk=response.json()["id"])
+        self.assertTrue(created.path.startswith(self.nested.path))
+        self.assertEqual(len(created.path), 4 * threads.SEGMENT_WIDTH)
+
+    def test_reject_invalid_parent(self):
+        other_post = Post.objects.create(author=self.user, title="other", text="x")
+        other = Comment.objects.create(post=other_post, author="reader", text="x")
+        deepest = self.first
+        for _ in range(threads.MAX_DEPTH):
+            deepest = self._comment("deep", parent=deepest)
+
+        # When : 다른 글의 댓글, 숫자가 아닌 값, 최대 깊이의 댓글에 답글
+        url = reverse("add_comment_to_post", kwargs={"pk": self.saved_post.pk})
+        responses = [
+            self.post(url, {"author": "reader", "text": "x", "parent": parent})
+            for parent in (other.pk, "1", deepest.pk, 2**64)
+        ]
+
+        # Then
+        for response in responses:
+            self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_thread_is_nested_in_order(self):
+        # When
+        with self.assertNumQueries(3):
+            response = self._thread()
+
+        # Then : 부모 아래에 작성 순서대로
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(
+            self._texts(response.json()["results"]),
+            [
+                ["first", [["reply", [["nested", []]]], ["second reply", []]]],
+                ["second", []],
+            ],
+        )
+
+    def test_subtree_to_depth(self):
+        # When : 첫 댓글의 한 단계 아래까지
+        response = self._thread(root=self.first.pk, depth=1)
+        top_level = self._thread(depth=0)
+        deepest = self._thread(root=self.first.pk, depth=2**62)
+
+        # Then
+        self.assertEqual(
+            self._texts(response.json()["results"]),
+            [["first", [["reply", []], ["second reply", []]]]],
+        )
+        self.assertEqual(
+            self._texts(top_level.json()["results"]),
+            [["first", []], ["second", []]],
+        )
+        self.assertEqual(
+            self._texts(deepest.json()["results"]),
+            [["first", [["reply", [["nested", []]]], ["second reply", []]]]],
+        )
+
+    def test_thread_pages_continue_the_thread(self):
+        # When : 한 페이지에 두 개씩
+        first_page = self._thread(page_size=2)
+        second_page = self._thread(page_size=2, cursor=first_page.json()["next"])
+
+        # Then : 이전 페이지에 부모가 있는 답글은 최상위에 parent와 함께 온다
+        self.assertEqual(
+            self._texts(first_page.json()["results"]), [["first", [["reply", []]]]]
+        )
+        results = second_page.json()["results"]
+        self.assertEqual(self._texts(results), [["nested", []], ["second reply", []]])
+        self.assertEqual(results[0]["parent"], self.reply.pk)
+
+    def test_invalid_thread_requests(self):
+        # When
+        unknown_root = self._thread(root=1234)
+        bad_depth = self._thread(depth=-1)
+        huge_root = self._thread(root=2**64)
+        huge_depth = self._thread(depth=2**64)
+        missing_post = self.get(reverse("comment_thread", kwargs={"pk": 1234}))
+
+        # Then
+        self.assertEqual(unknown_root.status_code, HTTPStatus.NOT_FOUND)
+        self.assertEqual(bad_depth.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertEqual(huge_root.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertEqual(huge_depth.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertEqual(missing_post.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_remove_takes_replies_along(self):
+        # When : 답글이 달린 댓글을 삭제
+        response = self.delete(reverse("comment_remove", kwargs={"pk": self.reply.pk}))
+
+        # Then : 답글도 지워지고 승인된 댓글 수가 맞는다
+        self.assertEqual(response.status_code, HTTPStatus.NO_CONTENT)
+        self.assertFalse(Comment.objects.filter(pk=self.nested.pk).exists())
+        self.saved_post.refresh_from_db()
+        self.assertEqual(self.saved_post.approved_comment_count, 3)
+
+    def test_bulk_remove_takes_replies_along(self):
+        # When
+        response = self.post(reverse("comment_bulk_remove"), {"ids": [self.first.pk]})
+
+        # Then
+        self.assertEqual(response.json()["removed"], 4)
+        self.assertEqual(
+            list(self.saved_post.comments.values_list("text", flat=True)), ["second"]
+        )
+
+    def test_purge_deletes_replies_before_parents(self):
+        # Given : 삭제된 글
+        Post.objects.filter(pk=self.saved_post.pk).update(is_removed=True)
+
+        # When : 한 번에 두 개씩 purge
+        with CaptureQueriesContext(connection) as context:
+            purge.purge_post(self.saved_post.pk, chunk_size=2)
+
+        # Then
+        self.assertFalse(Comment.objects.exists())
+        deletes = [
+            query["sql"]
+            for query in context.captured_queries
+            if "DELETE" in query["sql"]
+        ]
+        self.assertIn("ORDER BY path DESC", deletes[0])
+
+    def test_fill_paths_after_bulk_insert(self):
+        # Given : path 없이 한꺼번에 넣은 댓글과 그 답글
+        Comment.objects.bulk_create(
+            [Comment(post=self.saved_post, author="bulk", text="top")]
+        )
+        top = Comment.objects.get(text="top")
+        Comment.objects.bulk_create(
+            [Comment(post=self.saved_post, parent=top, author="bulk", text="under")]
+        )
+
+        # When
+        filled = threads.fill_paths([self.saved_post.pk])
+
+        # Then
+        self.assertEqual(filled, 2)
+        under = Comment.objects.get(text="under")
+        self.assertEqual(
+            under.path, threads.segment(top.pk) + threads.segment(under.pk)
+        )
+        self.assertEqual(under.depth, 1)
+
+
+class TestPostBatch(APITestMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("username", password="password")
+        self.posts = [
+            Post.objects.create(
+                author=self.user,
+                title=str(i),
+                text="text",
+                published_date=timezone.now(),
+            )
+            for i in range(3)
+        ]
+        self.saved_post = self.posts[0]
+
+    def test_keep_requested_order_and_report_missing(self):
+        first, second, third = [post.pk for post in self.posts]
+
+        # When : 없는 id와 중복이 섞인 요청
+        with CaptureQueriesContext(connection) as context:
+            response = self.get(
+                reverse("post_batch"),
+                {"ids": "{},1234,{},{},{}".format(third, first, third, second)},
+            )
+
+        # Then : 한 번의 query로 요청한 순서대로
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(
+            [post["id"] for post in response.json()["results"]], [third, first, second]
+        )
+        self.assertEqual(response.json()["missing"], [1234])
+        self.assertEqual(len(context.captured_queries), 1)
+
+    def test_same_visibility_as_post_detail(self):
+        # Given : 삭제된 글
+        removed = self.posts[1]
+        Post.objects.filter(pk=removed.pk).update(is_removed=True)
+
+        # When
+        response = self.get(reverse("post_batch"), {"ids": str(removed.pk)})
+
+        # Then : post_detail처럼 찾을 수 없다
+        self.assertEqual(response.json(), {"results": [], "missing": [removed.pk]})
+        detail = self.get(reverse("post_detail", kwargs={"pk": removed.pk}))
+        self.assertEqual(detail.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_post_body_and_sparse_fields(self):
+        ids = [post.pk for post in self.posts]
+
+        # When : 긴 목록은 POST body로
+        response = self.client.post(
+            reverse("post_batch") + "?fields=id,title",
+            json.dumps({"ids": ids}),
+            content_type="application/json",
+        )
+
+        # Then
+        self.assertEqual(
+            response.json()["results"],
+            [{"id": post.pk, "title": post.title} for post in self.posts],
+        )
+
+    @override_settings(BLOG_POST_BATCH_LIMIT=2)
+    def test_reject_invalid_ids(self):
+        # When : 숫자가 아닌 id, 빈 목록, 한도를 넘는 목록
+        responses = [
+            self.get(reverse("post_batch"), {"ids": "1,x"}),
+            self.get(reverse("post_batch")),
+            self.get(reverse("post_batch"), {"ids": "1,2,3"}),
+            self.get(reverse("post_batch"), {"ids": "99999999999999999999999"}),
+            self.post(reverse("post_batch"), {"ids": [-(2**64)]}),
+            self.post(reverse("post_batch"), {"ids": ["1"]}),
+        ]
+
+        # Then
+        for response in responses:
+            self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+
+class TestTransfer(APITestMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("username", password="password")
+        self.client.login(username="username", password="password")
+        self.saved_post = Post.objects.create(
+            author=self.user, title="title", text="text", published_date=timezone.now()
+        )
+        Comment.objects.create(
+            post=self.saved_post, author="reader", text="hello", approved_comment=True
+        )
+
+    def _import(self, body):
+        return self.client.post(
+            reverse("post_import"), body, content_type="application/x-ndjson"
+        )
+
+    def _lines(self, *records):
+        return "".join(json.dumps(record) + "\n" for record in records)
+
+    def test_export_then_import_remaps_comment_posts(self):
+        # Given : export한 NDJSON
+        response = self.get(reverse("post_export"))
+        body = b"".join(response.streaming_content).decode()
+
+        # When : 같은 내용을 import
+        response = self._import(body)
+
+        # Then : 새 Post가 만들어지고 Comment는 새 Post를 가리킨다
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.json(), {"imported": {"post": 1, "comment": 1}})
+        imported = Post.objects.exclude(pk=self.saved_post.pk).get()
+        self.assertEqual(imported.author, self.user)
+        self.assertEqual(imported.published_date, self.saved_post.published_date)
+        self.assertEqual(imported.approved_comment_count, 1)
+        self.assertEqual(imported.comments.get().text, "hello")
+
+    def test_export_then_import_keeps_threads(self):
+        # Given : 답글과 그 답글이 있는 글을 한 batch로 export
+        parent = self.saved_post.comments.get()
+        reply = Comment.objects.create(
+            post=self.saved_post, parent=parent, author="a", text="reply"
+        )
+        Comment.objects.create(
+            post=self.saved_post, parent=reply, author="a", text="re"
+        )
+        body = b"".join(self.get(reverse("post_export")).streaming_content).decode()
+
+        # When
+        self._import(body)
+
+        # Then : 새 댓글들끼리 같은 모양의 thread를 이룬다
+        imported = Post.objects.exclude(pk=self.saved_post.pk).get()
+        rows = list(imported.comments.order_by("path").values_list("text", "depth"))
+        self.assertEqual(rows, [("hello", 0), ("reply", 1), ("re", 2)])
+        self.assertEqual(
+            imported.comments.get(text="re").parent,
+            imported.comments.get(text="reply"),
+        )
+
+    def test_export_skips_removed_posts_and_their_comments(self):
+        # Given : purge 전에 삭제된 글과 그 댓글
+        removed = Post.objects.create(author=self.user, title="removed", text="x")
+        Comment.objects.create(post=removed, author="reader", text="gone")
+        self.delete(reverse("post_remove", kwargs={"pk": removed.pk}))
+
+        # When : export한 내용을 import
+        body = b"".join(self.get(reverse("post_export")).streaming_content).decode()
+        response = self._import(body)
+
+        # Then : 삭제된 글의 댓글 없이 성공한다
+        self.assertNotIn("gone", body)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.json(), {"imported": {"post": 1, "comment": 1}})
+
+    def test_export_requires_login(self):
+        # Given : 로그아웃한 사용자
+        self.client.logout()
+
+        # When : export를 요청
+        response = self.get(reverse("post_export"))
+
+        # Then : 로그인 페이지로 redirect
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+
+    def test_undecodable_line_and_impossible_date(self):
+        post = {"type": "post", "id": 1, "author": "new", "title": "t", "text": "x"}
+        for body, line in (
+            (self._lines(post).encode() + b"\xff\xfe\n", 2),
+            (self._lines(dict(post, created_date="2020-13-45T00:00:00Z")), 1),
+        ):
+            # When : UTF-8이 아닌 줄, 있을 수 없는 날짜
+            response = self._import(body)
+
+            # Then : 500이 아니라 해당 줄을 알려주는 400
+            self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+            self.assertEqual(response.json()["line"], line)
+
+    def test_resume_with_idempotency_key(self):
+        body = self._lines(
+            {"type": "post", "id": 1, "author": "new", "title": "t", "text": "x"},
+            {"type": "comment", "id": 1, "post": 1, "author": "a", "text": "x"},
+        )
+        with tempfile.TemporaryDirectory() as directory, self.settings(
+            BLOG_IMPORT_CHECKPOINT_DIR=directory, BLOG_IMPORT_BATCH_SIZE=1
+        ):
+            # Given : 두 번째 줄에서 실패한 import
+            broken = body.replace('"post": 1,', '"post": "1",')
+            failed = self.client.post(
+                reverse("post_import"),
+                broken,
+                content_type="application/x-ndjson",
+                HTTP_IDEMPOTENCY_KEY="feed-1",
+            )
+
+            # When : 고친 파일을 같은 key로 두 번 보낸다
+            responses = [
+                self.client.post(
+                    reverse("post_import"),
+                    body,
+                    content_type="application/x-ndjson",
+                    HTTP_IDEMPOTENCY_KEY="feed-1",
+                )
+                for _ in range(2)
+            ]
+
+        # Then : 남은 줄만 import되고 다시 보내도 중복되지 않는다
+        self.assertEqual(failed.json()["imported"], {"post": 1, "comment": 0})
+        self.assertEqual(
+            [response.json()["imported"] for response in responses],
+            [{"post": 0, "comment": 1}, {"post": 0, "comment": 0}],
+        )
+        self.assertEqual(Post.objects.filter(author__username="new").count(), 1)
+        imported = Post.objects.get(author__username="new")
+        self.assertEqual(imported.comments.count(), 1)
+
+    def test_invalid_record_keeps_committed_batches(self):
+        # Given : 두 번째 줄이 잘못된 NDJSON
+        body = self._lines(
+            {"type": "post", "id": 1, "author": "new", "title": "t", "text": "x"},
+            {"type": "comment", "id": 1, "post": 2, "author": "a", "text": "x"},
+        )
+
+        # When : batch 크기 1로 import
+        with self.settings(BLOG_IMPORT_BATCH_SIZE=1):
+            response = self._import(body)
+
+        # Then : 실패한 줄을 알려주고 앞선 batch는 남는다
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertEqual(response.json()["line"], 2)
+        self.assertEqual(response.json()["imported"], {"post": 1, "comment": 0})
+        self.assertTrue(Post.objects.filter(author__username="new").exists())
+
+    def test_resume_from_checkpoint(self):
+        records = [
+            {"type": "post", "id": 7, "author": "username", "title": "t", "text": "x"},
+            {"type": "comment", "id": 1, "post": 7, "author": "a", "text": "first"},
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            source = os.path.join(directory, "blog.ndjson")
+            checkpoint = os.path.join(directory, "checkpoint")
+            # Given : 세 번째 줄에서 실패한 import
+            with open(source, "w") as output:
+                output.write(self._lines(*records) + "not json\n")
+            with self.assertRaises(CommandError):
+                call_command("blog_import", source, checkpoint=checkpoint, batch_size=1)
+
+            # When : 고친 파일을 같은 checkpoint로 다시 import
+            records.append(
+                {"type": "comment", "id": 2, "post": 7, "author": "a", "text": "last"}
+            )
+            with open(source, "w") as output:
+                output.write(self._lines(*records))
+            call_command(
+                "blog_import",
+                source,
+                checkpoint=checkpoint,
+                batch_size=1,
+                stdout=io.StringIO(),
+            )
+
+        # Then : 남은 줄만 import되고 Comment는 import된 Post에 달린다
+        imported = Post.objects.exclude(pk=self.saved_post.pk).get()
+        self.assertEqual(
+            list(imported.comments.order_by("id").values_list("text", flat=True)),
+            ["first", "last"],
+        )
+
+    def test_checkpoint_ignores_uncommitted_batch(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "checkpoint")
+            # Given : commit되지 않은 batch가 남긴 checkpoint 기록
+            with open(path, "w") as log:
+                entry = {"line": 5, "kind": "post", "first": 999, "posts": [[1, 999]]}
+                log.write(json.dumps(entry) + "\n")
+
+            # When : checkpoint를 읽으면
+            checkpoint = transfer.Checkpoint(path)
+
+        # Then : 처음부터 다시 import한다
+        self.assertEqual(checkpoint.line, 0)
+        self.assertEqual(checkpoint.post_ids, {})
+
+
+@override_settings(BLOG_COMMENT_INGEST_BUFFERED=True)
+class TestCommentIngest(APITestMixin, TestCase):
+    def setUp(self):
+        user = User.objects.create_user("author")
+        self.saved_post = Post.objects.create(author=user, title="title", text="text")
+        self.buffer = ingest.CommentBuffer(interval=60, max_rows=100)
+        patcher = mock.patch.object(ingest, "_buffer", self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _add_comment(self, pk, data):
+        return self.post(reverse("add_comment_to_post", kwargs={"pk": pk}), data)
+
+    def test_accept_then_write_on_flush(self):
+        # When : 댓글을 작성
+        response = self._add_comment(
+            self.saved_post.pk, {"author": "reader", "text": "hello"}
+        )
+
+        # Then : 202와 임시 id를 돌려주고 flush 때 저장
+        self.assertEqual(response.status_code, HTTPStatus.ACCEPTED)
+        self.assertTrue(response.json()["provisional_id"])
+        self.assertFalse(Comment.objects.exists())
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(self.saved_post.comments.get().text, "hello")
+
+    def test_validate_before_accepting(self):
+        # When : 잘못된 입력과 없는 Post
+        invalid = self._add_comment(self.saved_post.pk, {"author": "reader"})
+        missing = self._add_comment(1234, {"author": "reader", "text": "hello"})
+
+        # Then : 버퍼에 넣지 않고 거절
+        self.assertEqual(invalid.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertEqual(missing.status_code, HTTPStatus.NOT_FOUND)
+        self.assertEqual(self.buffer.flush(), 0)
+
+    def test_buffered_reply(self):
+        # Given : 저장된 댓글
+        parent = Comment.objects.create(
+            post=self.saved_post, author="reader", text="hello"
+        )
+
+        # When : 답글을 작성하고 flush
+        response = self._add_comment(
+            self.saved_post.pk, {"author": "reader", "text": "hi", "parent": parent.pk}
+        )
+        self.buffer.flush()
+
+        # Then : path와 depth가 채워진다
+        self.assertEqual(response.json()["parent"], parent.pk)
+        reply = parent.replies.get()
+        self.assertEqual(reply.depth, 1)
+        self.assertEqual(reply.path, parent.path + threads.segment(reply.pk))
+
+    def test_drop_comments_of_deleted_posts(self):
+        # Given : 버퍼에 있는 동안 Post가 삭제된 댓글
+        self._add_comment(self.saved_post.pk, {"author": "reader", "text": "hello"})
+        Post.objects.filter(pk=self.saved_post.pk).delete()
+
+        # When : flush
+        # Then : 해당 댓글은 버린다
+        self.assertEqual(self.buffer.flush(), 0)
+
+    def test_journal_is_removed_after_flush(self):
+        with tempfile.TemporaryDirectory() as directory:
+            # Given : journal을 쓰는 버퍼에 쌓인 댓글
+            self.buffer.journal = ingest.Journal(directory)
+            self._add_comment(self.saved_post.pk, {"author": "reader", "text": "hi"})
+            self.assertEqual(len(os.listdir(directory)), 1)
+
+            # When : flush
+            self.buffer.flush()
+
+            # Then : 저장된 댓글의 journal은 지운다
+            self.assertEqual(os.listdir(directory), [])
+
+    def test_start_buffer_with_wsgi_worker(self):
+        # When : 버퍼 사용 설정으로 WSGI application을 불러오면
+        with mock.patch.object(ingest, "get_buffer") as get_buffer:
+            importlib.reload(wsgi)
+
+        # Then : 첫 댓글을 기다리지 않고 시작해 journal을 replay한다
+        get_buffer.assert_called_once_with()
+
+    def test_replay_orphaned_journals_only(self):
+        with tempfile.TemporaryDirectory() as directory:
+            # Given : 죽은 worker가 남긴 journal과 살아있는 worker의 journal
+            orphan = ingest.Journal(directory)
+            orphan.append(
+                {
+                    "id": "orphan",
+                    "post": self.saved_post.pk,
+                    "author": "reader",
+                    "text": "orphaned",
+                    "created_date": timezone.now().isoformat(),
+                }
+            )
+            orphan.rotate().close()
+            live = ingest.Journal(directory)
+            live.append(
+                {
+                    "id": "live",
+                    "post": self.saved_post.pk,
+                    "author": "reader",
+                    "text": "live",
+                    "created_date": timezone.now().isoformat(),
+                }
+            )
+
+            # When : replay
+            replayed = ingest.replay(directory)
+
+            # Then : 잠기지 않은 journal만 저장하고 지운다
+            self.assertEqual(replayed, 1)
+            self.assertEqual(self.saved_post.comments.get().text, "orphaned")
+            self.assertEqual(len(os.listdir(directory)), 1)
+            live.rotate().close()
+
+
+@override_settings(BLOG_READ_REPLICAS=["replica1", "replica2"])
+class TestReplicaRouting(SimpleTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def tearDown(self):
+        routers.read_from(None)
+
+    def _request(self, method, name, status=HTTPStatus.OK, **extra):
+        # process_view는 URL resolve 뒤에 handler가 호출한다
+        request = getattr(self.factory, method)(reverse(name), **extra)
+        request.resolver_match = resolve(request.path)
+        routed = []
+
+        def view(request):
+            middleware.process_view(request, None, (), {})
+            routed.append(self.router.db_for_read(Post))
+            return HttpResponse(status=status)
+
+        middleware = ReplicaRoutingMiddleware(view)
+        return middleware(request), routed[0]
+
+    def test_read_views_use_replica(self):
+        # When : post_list를 조회
+        response, alias = self._request("get", "post_list")
+
+        # Then : replica에서 읽고 primary 고정 cookie는 없다
+        self.assertIn(alias, ["replica1", "replica2"])
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_other_views_use_primary(self):
+        # When : replica 대상이 아닌 view를 조회
+        response, alias = self._request("get", "post_draft_list")
+
+        # Then : primary에서 읽는다
+        self.assertEqual(alias, "default")
+
+    def test_write_pins_client_to_primary(self):
+        # Given : 글을 쓴 응답이 준 cookie와 header
+        response, _ = self._request("post", "post_new", status=HTTPStatus.CREATED)
+        until = response.cookies[PIN_COOKIE].value
+        self.assertEqual(response["X-Blog-Primary-Until"], until)
+
+        # When : cookie 또는 header와 함께 post_list를 조회
+        self.factory.cookies[PIN_COOKIE] = until
+        _, with_cookie = self._request("get", "post_list")
+        del self.factory.cookies[PIN_COOKIE]
+        _, with_header = self._request(
+            "get", "post_list", HTTP_X_BLOG_PRIMARY_UNTIL=until
+        )
+
+        # Then : 둘 다 primary에서 읽는다
+        self.assertEqual([with_cookie, with_header], ["default", "default"])
+
+    def test_expired_pin_uses_replica(self):
+        # When : 만료된 header와 함께 조회
+        _, alias = self._request(
+            "get", "post_list", HTTP_X_BLOG_PRIMARY_UNTIL=str(int(time.time()) - 1)
+        )
+
+        # Then : 다시 replica에서 읽는다
+        self.assertNotEqual(alias, "default")
+
+    def test_failed_write_does_not_pin(self):
+        # When : 실패한 쓰기 요청
+        response, _ = self._request("post", "post_new", status=HTTPStatus.BAD_REQUEST)
+
+        # Then : primary에 고정하지 않는다
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_writes_and_other_apps_use_primary(self):
+        # Given : replica를 고른 요청
+        routers.read_from("replica1")
+
+        # Then : 쓰기와 blog 외의 model은 primary
+        self.assertEqual(self.router.db_for_write(Post), "default")
+        self.assertEqual(self.router.db_for_read(User), "default")
+        with routers.primary():
+            self.assertEqual(self.router.db_for_read(Post), "default")
+        self.assertEqual(self.router.db_for_read(Post), "replica1")
+
+    @override_settings(BLOG_REPLICA_POLICY="round_robin")
+    def test_round_robin_policy(self):
+        # When : replica를 네 번 고르면
+        chosen = [routers.choose_replica() for _ in range(4)]
+
+        # Then : 번갈아 고른다
+        self.assertEqual(chosen[:2], chosen[2:])
+        self.assertEqual(sorted(chosen[:2]), ["replica1", "replica2"])
+
+    def test_replicas_are_not_migrated(self):
+        self.assertFalse(self.router.allow_migrate("replica1", "blog"))
+        self.assertTrue(self.router.allow_migrate("default", "blog"))
+
+
+class TestCompression(APITestMixin, TestCase):
+    def setUp(self):
+        user = User.objects.create_user("author")
+        Post.objects.bulk_create(
+            Post(
+                author=user,
+                title="title {}".format(index),
+                text="text",
+                published_date=timezone.now(),
+            )
+            for index in range(30)
+        )
+
+    def test_gzip_large_json(self):
+        # When : gzip을 받는 client가 post_list를 조회
+        response = self.get(reverse("post_list"), HTTP_ACCEPT_ENCODING="gzip")
+
+        # Then : 압축된 JSON을 돌려준다
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        data = json.loads(gzip.decompress(response.content).decode())
+        self.assertEqual(len(data["results"]), 20)
+
+    def test_small_json_is_not_compressed(self):
+        # When : 기준 크기보다 작은 응답
+        response = self.get(
+            reverse("post_list"), {"page_size": 1}, HTTP_ACCEPT_ENCODING="gzip"
+        )
+
+        # Then : 압축하지 않는다
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+    def test_gzip_streamed_ndjson(self):
+        # When : NDJSON stream을 gzip으로 요청
+        response = self.get(
+            reverse("post_list"),
+            HTTP_ACCEPT="application/x-ndjson",
+            HTTP_ACCEPT_ENCODING="gzip",
+        )
+
+        # Then : 전체가 하나의 gzip stream이고 ETag는 weak
+        body = gzip.decompress(b"".join(response.streaming_content)).decode()
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(len(body.splitlines()), 30)
+        self.assertTrue(response["ETag"].startswith('W/"'))
+
+
+class TestStaticFiles(SimpleTestCase):
+    def _get(self, application, path):
+        environ = {"PATH_INFO": path, "HTTP_ACCEPT_ENCODING": "gzip"}
+        setup_testing_defaults(environ)
+        started = {}
+
+        def start_response(status, headers):
+            started.update(headers)
+
+        application(environ, start_response)
+        return started
+
+    def test_hashed_files_are_immutable(self):
+        with tempfile.TemporaryDirectory() as root:
+            # Given : collectstatic이 만든 hash 붙은 파일과 원본
+            os.mkdir(os.path.join(root, "css"))
+            for name in ("blog.css", "blog.0123456789ab.css"):
+                with open(os.path.join(root, "css", name), "w") as static_file:
+                    static_file.write("body { color: black; }")
+            storage = mock.Mock(
+                hashed_files={"css/blog.css": "css/blog.0123456789ab.css"}
+            )
+            application = StaticFiles(None, root, "/static/", storage)
+
+            # When : 두 파일을 요청
+            hashed = self._get(application, "/static/css/blog.0123456789ab.css")
+            plain = self._get(application, "/static/css/blog.css")
+
+        # Then : hash 붙은 파일만 immutable로 영구 cache
+        self.assertIn("immutable", hashed["Cache-Control"])
+        self.assertNotIn("immutable", plain["Cache-Control"])
+
+
+class TestLogging(SimpleTestCase):
+    def _record(self, name, level=logging.DEBUG, msg="query", args=(), **extra):
+        record = logging.makeLogRecord(
+            {"name": name, "levelno": level, "msg": msg, "args": args}
+        )
+        record.levelname = logging.getLevelName(level)
+        record.__dict__.update(extra)
+        return record
+
+    def test_sampling_by_logger_prefix(self):
+        # Given : SQL log은 버리고 나머지는 모두 남기는 sampling
+        sampling = SamplingFilter({"django.db.backends": 0})
+
+        # When/Then : 하위 logger의 DEBUG는 버리고 WARNING과 다른 logger는 남김
+        self.assertFalse(sampling.filter(self._record("django.db.backends.schema")))
+        self.assertTrue(
+            sampling.filter(self._record("django.db.backends", logging.WARNING))
+        )
+        self.assertTrue(sampling.filter(self._record("django.request")))
+
+    def test_rate_limit_per_second(self):
+        # Given : 초당 2개까지 허용
+        limit = RateLimitFilter({"django.request": 2})
+        record = self._record("django.request", logging.ERROR)
+
+        with mock.patch("blog.log.time.monotonic", return_value=100.0):
+            # When : 같은 순간에 3개
+            allowed = [limit.filter(record) for _ in range(3)]
+        with mock.patch("blog.log.time.monotonic", return_value=100.5):
+            # When : 0.5초 뒤에 token 1개가 다시 참
+            refilled = limit.filter(record)
+
+        # Then
+        self.assertEqual(allowed, [True, True, False])
+        self.assertTrue(refilled)
+        self.assertTrue(limit.filter(self._record("django.db.backends")))
+
+    def test_json_formatter(self):
+        # Given : extra 속성이 있는 record
+        record = self._record(
+            "django.request", logging.ERROR, "%s failed", ("/api/",), status_code=500
+        )
+
+        # When
+        data = json.loads(JsonFormatter().format(record))
+
+        # Then
+        self.assertEqual(data["level"], "ERROR")
+        self.assertEqual(data["logger"], "django.request")
+        self.assertEqual(data["message"], "/api/ failed")
+        self.assertEqual(data["status_code"], 500)
+        self.assertNotIn("args", data)
+
+    def test_queued_handler_writes_in_background(self):
+        # Given : StringIO에 쓰는 queue handler
+        stream = io.StringIO()
+        handler = QueuedStreamHandler(stream)
+        handler.setFormatter(logging.Formatter("%(levelname)s %(message)s"))
+        self.addCleanup(handler.close)
+
+        # When : 기록하고 queue가 빌 때까지 flush
+        handler.handle(self._record("blog", logging.INFO, "hello %s", ("world",)))
+        handler.flush()
+
+        # Then : listener thread가 format해서 씀
+        self.assertEqual(stream.getvalue(), "INFO hello world\n")
+
+    def test_queued_handler_drops_when_full(self):
+        # Given : listener가 아직 꺼내 가지 못한 크기 1의 queue
+        stream = io.StringIO()
+        handler = QueuedStreamHandler(stream, queue_size=1)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        self.addCleanup(handler.close)
+        handler.target.acquire()
+        try:
+            # When : queue보다 많이 기록
+            for number in range(5):
+                handler.handle(self._record("blog", logging.INFO, str(number)))
+        finally:
+            handler.target.release()
+        handler.flush()
+        handler.handle(self._record("blog", logging.INFO, "last"))
+        handler.flush()
+
+        # Then : 호출은 막히지 않고 버린 개수가 경고로 남음
+        self.assertIn("log records, the log queue was full", stream.getvalue())
+        self.assertTrue(stream.getvalue().endswith("last\n"))
+
+
+class TestBench(TestCase):
+    def _report(self, p95, queries):
+        return {
+            "endpoints": {
+                "post_list": {
+                    "latency_ms": {"p95": p95},
+                    "queries_per_request": queries,
+                }
+            }
+        }
+
+    def test_every_endpoint_has_a_scenario(self):
+        # Given : blog/urls.py의 모든 endpoint
+        names = [pattern.name for pattern in urls.urlpatterns]
+
+        # Then : 모두 benchmark 시나리오가 있다
+        self.assertEqual([name for name in names if name not in bench.SCENARIOS], [])
+
+    def test_compare_fails_on_regression(self):
+        # Given : baseline보다 p95가 50% 느린 결과
+        command = bench.Command(stdout=io.StringIO(), stderr=io.StringIO())
+
+        # When : 10% 허용치로 비교
+        # Then : CommandError
+        with self.assertRaises(CommandError):
+            command._compare(self._report(10.0, 2), self._report(15.0, 2), 0.1)
+
+    def test_compare_passes_within_threshold(self):
+        # Given : 허용치 안의 결과
+        command = bench.Command(stdout=io.StringIO(), stderr=io.StringIO())
+
+        # When : 10% 허용치로 비교
+        # Then : 통과
+        command._compare(self._report(10.0, 2), self._report(10.5, 2), 0.1)
@@ -0,0 +1,102 @@
+from django.db import connection, transaction
+from django.db.models import Q
+
+# A comment's path is the path of its parent followed by its own id,
+# zero-padded to SEGMENT_WIDTH digits. Sorting by path lists a thread depth
+# first, replies in the order they were written, and a comment's subtree is
+# the range of paths that start with its own.
+SEGMENT_WIDTH = 10
+MAX_DEPTH = 24
+PATH_LENGTH = SEGMENT_WIDTH * (MAX_DEPTH + 1)
+# Sorts after every digit, so path + END bounds the paths below path.
+END = ":"
+
+
+class InvalidParent(ValueError):
+    pass
+
+
+def segment(pk):
+    return "{:0{}d}".format(pk, SEGMENT_WIDTH)
+
+
+def subtree(path):
+    """Condition matching the comment at ``path`` and every reply below it."""
+    return Q(path__gte=path, path__lt=path + END)
+
+
+def thread(comments, root=None, depth=None):
+    """
+    ``comments`` (one post's) in thread order: all of them, or the subtree of
+    comment ``root``; with ``depth``, only that many levels below the top
+    level or below ``root``. Raises DoesNotExist for an unknown ``root``.
+    """
+    if root is None:
+        rows = comments
+        top = 0
+    else:
+        path, top = comments.values_list("path", "depth").get(pk=root)
+        rows = comments.filter(subtree(path))
+    if depth is not None:
+        rows = rows.filter(depth__lte=top + depth)
+    return rows.order_by("path")
+
+
+def nest(rows, serialize):
+    """
+    Nest ``rows`` (dicts with ``id`` and ``parent``, in path order) under
+    their parents in one pass. Rows whose parent isn't among them, such as
+    the first replies on a later page, stay at the top level.
+    """
+    nodes = {}
+    top = []
+    for row in rows:
+        node = serialize(row)
+        node["replies"] = []
+        nodes[row["id"]] = node
+        parent = nodes.get(row["parent"])
+        (parent["replies"] if parent else top).append(node)
+    return top
+
+
+def fill_paths(post_ids):
+    """
+    Set path and depth on comments of ``post_ids`` inserted without them.
+    Bulk inserts can't compute paths, which contain the comment's own id.
+    """
+    from .models import Comment
+
+    pending = list(
+        Comment.objects.filter(post_id__in=post_ids, path="")
+        .order_by("id")
+        .values_list("id", "parent_id", "parent__path")
+    )
+    paths = {}
+    values = []
+    for pk, parent, parent_path in pending:
+        # Ordered by id, so a parent that was pending too is filled in by now.
+        prefix = paths.get(parent, parent_path) if parent else ""
+        paths[pk] = prefix + segment(pk)
+        values.append([paths[pk], len(paths[pk]) // SEGMENT_WIDTH - 1, pk])
+    if not values:
+        return 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(
+            "UPDATE blog_comment SET path = %s, depth = %s WHERE id = %s", values
+        )
+    return len(values)
+
+
+def with_replies(ids, chunk_size=500):
+    """``ids`` and the ids of every reply below them, sorted."""
+    from .models import Comment
+
+    found = set(ids)
+    for start in range(0, len(ids), chunk_size):
+        roots = Comment.objects.filter(pk__in=ids[start : start + chunk_size])
+        condition = Q()
+        for post_id, path in roots.values_list("post_id", "path"):
+            condition |= Q(subtree(path), post_id=post_id)
+        if condition:
+            found.update(Comment.objects.filter(condition).values_list("id", flat=True))
+    return sorted(found)
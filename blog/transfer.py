@@ -0,0 +1,426 @@
+import json
+import os
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .cache import invalidate_post
+from .models import Comment, Post, summarize
+from .rendering import render_many
+from .streaming import DEFAULT_CHUNK_SIZE
+from .threads import fill_paths
+
+POST = "post"
+COMMENT = "comment"
+
+DEFAULT_BATCH_SIZE = 1000
+# A batch whose reserved ids were taken by a concurrent writer is retried.
+INSERT_ATTEMPTS = 3
+# Values of these fields are passed to the driver as they are.
+PASSTHROUGH_FIELDS = (
+    models.BooleanField,
+    models.CharField,
+    models.ForeignKey,
+    models.IntegerField,
+    models.TextField,
+)
+
+
+class InvalidRecord(ValueError):
+    def __init__(self, line, message):
+        super().__init__("line {}: {}".format(line, message))
+        self.line = line
+
+
+def _isoformat(value):
+    # Full precision, unlike the API's millisecond timestamps, so a round
+    # trip through export and import doesn't change any dates.
+    return value.isoformat() if value is not None else None
+
+
+def export_records():
+    """
+    Every post, then every comment, as dicts ready for NDJSON. Posts refer to
+    their author by username and comments to their post and parent comment
+    by their exported ids. Replies come after the comment they reply to.
+    """
+    chunk_size = getattr(settings, "BLOG_STREAM_CHUNK_SIZE", DEFAULT_CHUNK_SIZE)
+    posts = (
+        Post.objects.order_by("id")
+        .values_list(
+            "id",
+            "author__username",
+            "title",
+            "text",
+            "created_date",
+            "published_date",
+            "publish_at",
+        )
+        .iterator(chunk_size=chunk_size)
+    )
+    for pk, author, title, text, created_date, published_date, publish_at in posts:
+        yield {
+            "type": POST,
+            "id": pk,
+            "author": author,
+            "title": title,
+            "text": text,
+            "created_date": _isoformat(created_date),
+            "published_date": _isoformat(published_date),
+            "publish_at": _isoformat(publish_at),
+        }
+
+    comments = (
+        # Comments of removed posts would refer to a post the export skips.
+        Comment.objects.filter(post__is_removed=False)
+        .order_by("id")
+        .values_list(
+            "id",
+            "post_id",
+            "parent_id",
+            "author",
+            "text",
+            "created_date",
+            "approved_comment",
+        )
+        .iterator(chunk_size=chunk_size)
+    )
+    for pk, post_id, parent_id, author, text, created_date, approved in comments:
+        yield {
+            "type": COMMENT,
+            "id": pk,
+            "post": post_id,
+            "parent": parent_id,
+            "author": author,
+            "text": text,
+            "created_date": _isoformat(created_date),
+            "approved_comment": approved,
+        }
+
+
+class Checkpoint:
+    """
+    Append-only NDJSON log of committed import batches: the last input line
+    of the batch, the first id it inserted and the post id mapping it added.
+
+    Entries are written (and fsynced) inside the batch's transaction, so on
+    load an entry whose first row doesn't exist belongs to a batch that
+    never committed and is ignored.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.line = 0
+        self.post_ids = {}
+        self.comment_ids = {}
+        if path and os.path.exists(path):
+            self._load()
+
+    def _load(self):
+        valid = 0
+        with open(self.path, "rb") as log:
+            for raw in log:
+                try:
+                    entry = json.loads(raw.decode())
+                except ValueError:
+                    # A write cut short by a crash; drop it and what follows.
+                    break
+                valid += len(raw)
+                model = Post if entry["kind"] == POST else Comment
+                if model._base_manager.filter(pk=entry["first"]).exists():
+                    self.line = entry["line"]
+                    self.post_ids.update(entry["posts"])
+                    self.comment_ids.update(entry.get("comments", ()))
+        with open(self.path, "r+b") as log:
+            log.truncate(valid)
+
+    def record(self, line, kind, first, posts, comments=()):
+        if not self.path:
+            return
+        entry = {"line": line, "kind": kind, "first": first, "posts": posts}
+        if comments:
+            entry["comments"] = comments
+        with open(self.path, "a") as log:
+            log.write(json.dumps(entry, separators=(",", ":")) + "\n")
+            log.flush()
+            os.fsync(log.fileno())
+
+
+def _integer(number, record, name):
+    value = record.get(name)
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise InvalidRecord(number, "{} must be an integer".format(name))
+    return value
+
+
+def _string(number, record, name):
+    value = record.get(name)
+    if not isinstance(value, str):
+        raise InvalidRecord(number, "{} must be a string".format(name))
+    return value
+
+
+def _datetime(number, record, name, row):
+    value = record.get(name)
+    if value is None:
+        return
+    try:
+        parsed = parse_datetime(value) if isinstance(value, str) else None
+    except ValueError:
+        # Well-formed but impossible, like month 13.
+        parsed = None
+    if parsed is None:
+        raise InvalidRecord(number, "{} must be an ISO 8601 datetime".format(name))
+    row[name] = parsed
+
+
+def _adapter(field):
+    if isinstance(field, models.DateTimeField):
+        return connection.ops.adapt_datetimefield_value
+    if isinstance(field, PASSTHROUGH_FIELDS):
+        return lambda value: value
+    return partial(field.get_db_prep_save, connection=connection)
+
+
+def _column_values(model, rows):
+    # Fill every concrete column the way Model.save() would (defaults,
+    # auto_now) and adapt it for the driver, without building instances.
+    # Defaults are computed once per batch rather than once per row.
+    now = timezone.now()
+    fields = [field for field in model._meta.concrete_fields if not field.primary_key]
+    columns = []
+    for field in fields:
+        adapt = _adapter(field)
+        if getattr(field, "auto_now", False) or getattr(field, "auto_now_add", False):
+            default = now
+        else:
+            default = field.get_default()
+        if default is not None:
+            default = adapt(default)
+        columns.append((field.attname, adapt, default))
+
+    values = []
+    for row in rows:
+        row_values = []
+        for attname, adapt, default in columns:
+            value = row.get(attname)
+            if value is None:
+                row_values.append(default if attname not in row else None)
+            else:
+                row_values.append(adapt(value))
+        values.append(row_values)
+    return fields, values
+
+
+def _insert_rows(model, rows):
+    """Insert ``rows`` (dicts keyed by attname) and return their new ids."""
+    if connection.features.can_return_ids_from_bulk_insert:
+        objects = model.objects.bulk_create(model(**row) for row in rows)
+        return [instance.pk for instance in objects]
+
+    # Without RETURNING the database can't report the new ids, so reserve a
+    # block after the current maximum and insert with explicit ids. A
+    # concurrent insert into that block fails the batch with IntegrityError
+    # and it is retried. One prepared executemany() also avoids compiling
+    # the INSERT per row, which is most of bulk_create's cost on SQLite.
+    start = (model._base_manager.aggregate(last=Max("id"))["last"] or 0) + 1
+    ids = list(range(start, start + len(rows)))
+    fields, values = _column_values(model, rows)
+    quote = connection.ops.quote_name
+    sql = "INSERT INTO {} ({}) VALUES ({})".format(
+        quote(model._meta.db_table),
+        ", ".join(quote(field.column) for field in [model._meta.pk] + fields),
+        ", ".join(["%s"] * (len(fields) + 1)),
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            sql, [[pk] + row_values for pk, row_values in zip(ids, values)]
+        )
+    return ids
+
+
+class Importer:
+    """
+    Reads NDJSON lines produced by ``export_records`` and inserts them in
+    batches of up to ``batch_size`` records of the same type, one
+    transaction per batch. Post and comment ids are remapped, so comments
+    follow their post, and replies their parent, to its new id.
+    """
+
+    def __init__(self, batch_size=None, checkpoint=None):
+        self.batch_size = batch_size or getattr(
+            settings, "BLOG_IMPORT_BATCH_SIZE", DEFAULT_BATCH_SIZE
+        )
+        self.checkpoint = checkpoint or Checkpoint()
+        self.post_ids = self.checkpoint.post_ids
+        self.comment_ids = self.checkpoint.comment_ids
+        self.author_ids = {}
+        self.counts = {POST: 0, COMMENT: 0}
+        self.recounted = set()
+
+    def run(self, lines):
+        try:
+            return self._read(lines)
+        finally:
+            # Once per post at the end rather than once per comment batch;
+            # posts only get comments from the import that created them.
+            for post_id in self.recounted:
+                invalidate_post(post_id)
+            self.recounted.clear()
+
+    def _read(self, lines):
+        batch = []
+        kind = None
+        last = self.checkpoint.line
+        for number, line in enumerate(lines, 1):
+            if number <= self.checkpoint.line:
+                continue
+            if isinstance(line, bytes):
+                try:
+                    line = line.decode()
+                except UnicodeDecodeError:
+                    raise InvalidRecord(number, "not UTF-8")
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                raise InvalidRecord(number, "invalid JSON")
+            if not isinstance(record, dict) or record.get("type") not in (
+                POST,
+                COMMENT,
+            ):
+                raise InvalidRecord(number, "type must be post or comment")
+
+            if batch and (record["type"] != kind or len(batch) >= self.batch_size):
+                self._flush(kind, batch, last)
+                batch = []
+            kind = record["type"]
+            batch.append((number, record))
+            last = number
+
+        if batch:
+            self._flush(kind, batch, last)
+        return self.counts
+
+    def _flush(self, kind, batch, line):
+        build = self._build_posts if kind == POST else self._build_comments
+        rows, source_ids = build(batch)
+        for attempt in range(INSERT_ATTEMPTS):
+            try:
+                with transaction.atomic():
+                    ids = _insert_rows(Post if kind == POST else Comment, rows)
+                    mapped = [[source, pk] for source, pk in zip(source_ids, ids)]
+                    if kind == POST:
+                        posts, comments = mapped, []
+                    else:
+                        posts, comments = [], mapped
+                        self._thread(batch, rows, ids, dict(mapped))
+                        self._recount(rows)
+                    self.checkpoint.record(line, kind, ids[0], posts, comments)
+            except IntegrityError:
+                if attempt == INSERT_ATTEMPTS - 1:
+                    raise
+            else:
+                break
+
+        self.post_ids.update(posts)
+        self.comment_ids.update(comments)
+        self.counts[kind] += len(rows)
+
+    def _thread(self, batch, rows, ids, batch_ids):
+        # Replies to a comment of the same batch only learn its id now.
+        replies = [
+            [batch_ids[record["parent"]], pk]
+            for (_, record), row, pk in zip(batch, rows, ids)
+            if record.get("parent") is not None and row.get("parent_id") is None
+        ]
+        if replies:
+            with connection.cursor() as cursor:
+                cursor.executemany(
+                    "UPDATE blog_comment SET parent_id = %s WHERE id = %s", replies
+                )
+        fill_paths({row["post_id"] for row in rows})
+
+    def _recount(self, comments):
+        approved_posts = {
+            comment["post_id"] for comment in comments if comment["approved_comment"]
+        }
+        Post.objects.filter(pk__in=approved_posts).recount_approved_comments()
+        self.recounted |= approved_posts
+
+    def _authors(self, usernames):
+        missing = usernames.difference(self.author_ids)
+        if missing:
+            User = get_user_model()
+            self.author_ids.update(
+                User.objects.filter(username__in=missing).values_list("username", "id")
+            )
+            unknown = missing.difference(self.author_ids)
+            if unknown:
+                # Authors that don't exist here get an account they can't
+                # log in to until a password is set.
+                User.objects.bulk_create(
+                    User(username=name, password=make_password(None))
+                    for name in sorted(unknown)
+                )
+                self.author_ids.update(
+                    User.objects.filter(username__in=unknown).values_list(
+                        "username", "id"
+                    )
+                )
+        return self.author_ids
+
+    def _build_posts(self, batch):
+        authors = self._authors(
+            {_string(number, record, "author") for number, record in batch}
+        )
+        html = render_many(_string(number, record, "text") for number, record in batch)
+        posts = []
+        source_ids = []
+        for number, record in batch:
+            row = {
+                "author_id": authors[record["author"]],
+                "title": _string(number, record, "title"),
+                "text": _string(number, record, "text"),
+            }
+            row.update(summarize(row["text"]), text_html=html[row["text"]])
+            _datetime(number, record, "created_date", row)
+            _datetime(number, record, "published_date", row)
+            _datetime(number, record, "publish_at", row)
+            posts.append(row)
+            source_ids.append(_integer(number, record, "id"))
+        return posts, source_ids
+
+    def _build_comments(self, batch):
+        html = render_many(_string(number, record, "text") for number, record in batch)
+        comments = []
+        source_ids = []
+        for number, record in batch:
+            post_id = self.post_ids.get(_integer(number, record, "post"))
+            if post_id is None:
+                raise InvalidRecord(number, "post was not imported")
+            parent_id = None
+            if record.get("parent") is not None:
+                parent = _integer(number, record, "parent")
+                parent_id = self.comment_ids.get(parent)
+                if parent_id is None and parent not in source_ids:
+                    raise InvalidRecord(number, "parent was not imported")
+            row = {
+                "post_id": post_id,
+                "parent_id": parent_id,
+                "author": _string(number, record, "author"),
+                "text": record["text"],
+                "text_html": html[record["text"]],
+                "approved_comment": record.get("approved_comment") is True,
+            }
+            _datetime(number, record, "created_date", row)
+            comments.append(row)
+            source_ids.append(_integer(number, record, "id"))
+        return comments, source_ids
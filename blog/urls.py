@@ -7,16 +7,24 @@ from . import views
 urlpatterns = [
     path("", views.post_list, name="post_list"),
     path("post/<int:pk>/", views.post_detail, name="post_detail"),
+    path("posts/", views.post_batch, name="post_batch"),
     path("post/new/", views.post_new, name="post_new"),
     path("post/<int:pk>/edit/", views.post_edit, name="post_edit"),
     path("drafts/", views.post_draft_list, name="post_draft_list"),
+    path("me/dashboard/", views.author_dashboard, name="author_dashboard"),
     path("post/<int:pk>/publish/", views.post_publish, name="post_publish"),
     path("post/<int:pk>/remove/", views.post_remove, name="post_remove"),
     path(
         "post/<int:pk>/comment/", views.add_comment_to_post, name="add_comment_to_post"
     ),
     path("post/<int:pk>/comments/", views.comment_list, name="comment_list"),
+    path("post/<int:pk>/comments/thread/", views.comment_thread, name="comment_thread"),
     path("comment/<int:pk>/approve/", views.comment_approve, name="comment_approve"),
     path("comment/<int:pk>/remove/", views.comment_remove, name="comment_remove"),
     path("comment/<int:pk>/edit", views.comment_edit, name="comment_edit"),
+    path("search/", views.post_search, name="post_search"),
+    path("comments/approve/", views.comment_bulk_approve, name="comment_bulk_approve"),
+    path("comments/remove/", views.comment_bulk_remove, name="comment_bulk_remove"),
+    path("export/", views.post_export, name="post_export"),
+    path("import/", views.post_import, name="post_import"),
 ]
@@ -1,29 +1,242 @@
+from django.conf import settings
 from django.shortcuts import get_object_or_404, redirect
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.contrib.auth.decorators import login_required
-from .models import Post, Comment
-from django.http import JsonResponse
+from .models import Post, Comment, summarize
+from django.db.models import Count, Max, Prefetch, Q
+from django.http import Http404, JsonResponse
+from collections import OrderedDict
+import hashlib
+import os
+import tempfile
 from http import HTTPStatus
 import json
-from django.forms.models import model_to_dict
 from django.views.decorators.http import require_POST, require_http_methods
 
+from . import dashboard, edits, routers, threads
+from .cache import get_post_payload, invalidate_post
+from .conditional import collection_state, conditional
+from .ingest import submit_comment
+from .moderation import (
+    InvalidSelection,
+    approve_comments,
+    remove_comments,
+    select_comment_ids,
+)
+from .pagination import (
+    MAX_ID,
+    MIN_ID,
+    InvalidCursor,
+    get_page_size,
+    is_id,
+    paginate,
+)
+from .rendering import render_one
+from .search import MAX_PAGE, search
+from .serializers import (
+    InvalidFields,
+    author_serializer,
+    comment_serializer,
+    encode,
+    json_response,
+    post_list_serializer,
+    post_serializer,
+)
+from .streaming import ndjson_response, stream_response, wants_stream
+from .transfer import Checkpoint, Importer, InvalidRecord, export_records
 
+
+def _bad_request():
+    return JsonResponse({"message": "잘못된 입력입니다"}, status=HTTPStatus.BAD_REQUEST)
+
+
+def _list_response(request, queryset, keys, serializer):
+    try:
+        fields = serializer.parse_fields(request)
+    except InvalidFields:
+        return _bad_request()
+
+    if wants_stream(request):
+        return stream_response(
+            request,
+            serializer.values(queryset, fields).order_by(*keys),
+            lambda row: serializer.serialize(row, fields),
+            encode=encode,
+        )
+
+    try:
+        rows, next_cursor, prev_cursor = paginate(
+            request, serializer.values(queryset, fields, extra=keys), keys
+        )
+    except InvalidCursor:
+        return _bad_request()
+
+    return json_response(
+        {
+            "results": [serializer.serialize(row, fields) for row in rows],
+            "next": next_cursor,
+            "prev": prev_cursor,
+        }
+    )
+
+
+def _published_posts():
+    return Post.objects.filter(published_date__lte=timezone.now())
+
+
+@conditional(lambda request: collection_state(_published_posts()), modified_since=False)
 def post_list(request):
-    posts = Post.objects.filter(published_date__lte=timezone.now()).order_by(
-        "published_date"
+    return _list_response(
+        request, _published_posts(), ("published_date", "id"), post_list_serializer
+    )
+
+
+POST_INCLUDES = ("comments", "author")
+
+
+def _parse_includes(request):
+    includes = set(name for name in request.GET.get("include", "").split(",") if name)
+    if not includes.issubset(POST_INCLUDES):
+        raise InvalidFields(request.GET["include"])
+    return includes
+
+
+def _load_post_payload(pk):
+    # Two queries however many comments the post has: the post joined with
+    # its author, and one prefetch for the approved comments.
+    approved = Comment.objects.filter(approved_comment=True).order_by(
+        "created_date", "id"
+    )
+    post = (
+        Post.objects.select_related("author")
+        .prefetch_related(Prefetch("comments", queryset=approved, to_attr="approved"))
+        .get(pk=pk)
     )
+    return {
+        "post": post_serializer.from_instance(post),
+        "author": author_serializer.from_instance(post.author),
+        "comments": [
+            comment_serializer.from_instance(comment) for comment in post.approved
+        ],
+    }
+
+
+def _load_post_payload_from_primary(pk):
+    # The payload is cached for every client, so it must not be filled from
+    # a replica that hasn't caught up with the write that invalidated it.
+    with routers.primary():
+        return _load_post_payload(pk)
+
+
+def _post_detail_state(request, pk):
+    posts = Post.objects.filter(pk=pk)
+    try:
+        includes = _parse_includes(request)
+    except InvalidFields:
+        return None
+    if "comments" not in includes:
+        return posts.aggregate(
+            count=Count("id"), last_modified=Max("updated_date"), version=Max("version")
+        )
 
-    return JsonResponse(
-        data=[model_to_dict(post) for post in posts],
-        status=HTTPStatus.OK,
-        safe=False,
+    # Comment approvals and removals touch the post's counter and therefore
+    # its updated_date; edits to approved comments have to be checked here.
+    state = posts.aggregate(
+        count=Count("id", distinct=True),
+        last_modified=Max("updated_date"),
+        version=Max("version"),
+        comments_modified=Max(
+            "comments__updated_date", filter=Q(comments__approved_comment=True)
+        ),
     )
+    comments_modified = state.pop("comments_modified")
+    if comments_modified and comments_modified > state["last_modified"]:
+        state["last_modified"] = comments_modified
+    return state
 
 
+@conditional(_post_detail_state)
 def post_detail(request, pk):
-    post = get_object_or_404(Post, pk=pk)
-    return JsonResponse(model_to_dict(post), status=HTTPStatus.OK)
+    try:
+        fields = post_serializer.parse_fields(request)
+        includes = _parse_includes(request)
+    except InvalidFields:
+        return _bad_request()
+
+    try:
+        payload = get_post_payload(pk, lambda: _load_post_payload_from_primary(pk))
+    except Post.DoesNotExist:
+        raise Http404("No Post matches the given query.")
+
+    data = post_serializer.project(payload["post"], fields)
+    for name in includes:
+        data[name] = payload[name]
+    return json_response(data)
+
+
+DEFAULT_BATCH_LIMIT = 500
+
+
+def _parse_ids(request):
+    # ?ids=1,2,3, or {"ids": [1, 2, 3]} in a POST body for lists too long for
+    # a URL. Duplicates are dropped, keeping the first occurrence.
+    if request.method == "POST":
+        ids = json.loads(request.body).get("ids")
+        if not isinstance(ids, list) or not all(
+            isinstance(pk, int) and not isinstance(pk, bool) for pk in ids
+        ):
+            raise ValueError("ids must be a list of integers")
+    else:
+        ids = [int(pk) for pk in request.GET.get("ids", "").split(",") if pk]
+    if any(not MIN_ID <= pk <= MAX_ID for pk in ids):
+        raise ValueError("ids must fit in 64 bits")
+    ids = list(OrderedDict.fromkeys(ids))
+    limit = getattr(settings, "BLOG_POST_BATCH_LIMIT", DEFAULT_BATCH_LIMIT)
+    if not ids or len(ids) > limit:
+        raise ValueError("between 1 and {} ids are required".format(limit))
+    return ids
+
+
+@require_http_methods(["GET", "POST"])
+def post_batch(request):
+    """
+    Many posts by id in one query, in the order they were asked for. Ids
+    that post_detail would 404 on are listed under ``missing``.
+    """
+    try:
+        fields = post_serializer.parse_fields(request)
+        ids = _parse_ids(request)
+    except (InvalidFields, ValueError, AttributeError):
+        return _bad_request()
+
+    posts = Post.objects.filter(pk__in=ids)
+    found = {
+        row["id"]: row for row in post_serializer.values(posts, fields, extra=("id",))
+    }
+    return json_response(
+        {
+            "results": [
+                post_serializer.serialize(found[pk], fields)
+                for pk in ids
+                if pk in found
+            ],
+            "missing": [pk for pk in ids if pk not in found],
+        }
+    )
+
+
+def _parse_publish_at(data):
+    # Optional ISO 8601 datetime; run_publisher publishes the draft after it.
+    value = data.get("publish_at")
+    if value is None:
+        return None
+    publish_at = parse_datetime(value) if isinstance(value, str) else None
+    if publish_at is None:
+        raise ValueError("publish_at must be an ISO 8601 datetime")
+    if timezone.is_naive(publish_at):
+        publish_at = timezone.make_aware(publish_at)
+    return publish_at
 
 
 @login_required
@@ -32,40 +245,109 @@ def post_new(request):
     data = json.loads(request.body)
     try:
         post = Post.objects.create(
-            author=request.user, title=data["title"], text=data["text"]
+            author=request.user,
+            title=data["title"],
+            text=data["text"],
+            publish_at=_parse_publish_at(data),
         )
-    except KeyError:
+    except (KeyError, ValueError):
         return JsonResponse({"message": "잘못된 입력입니다"}, status=HTTPStatus.BAD_REQUEST)
     else:
-        return JsonResponse(model_to_dict(post), status=HTTPStatus.CREATED)
+        return json_response(
+            post_serializer.from_instance(post), status=HTTPStatus.CREATED
+        )
+
+
+def _submitted_changes(request, data, required, optional=()):
+    # POST replaces the required fields; PATCH writes only what was sent.
+    if not isinstance(data, dict):
+        raise ValueError("expected a JSON object")
+    if request.method == "PATCH":
+        changes = {name: value for name, value in data.items() if name != "version"}
+        if not changes or not set(changes).issubset(required + optional):
+            raise ValueError("unknown or missing fields")
+    else:
+        changes = {name: data[name] for name in required}
+        changes.update((name, data[name]) for name in optional if name in data)
+    for name in required:
+        if name in changes and not isinstance(changes[name], str):
+            raise ValueError("{} must be a string".format(name))
+    return changes
+
+
+def _edited(serializer, row):
+    response = json_response(serializer.serialize(row, serializer.fields))
+    response["ETag"] = edits.etag(row["version"])
+    return response
+
+
+def _conflict(request, error):
+    # A failed If-Match is a failed precondition; a stale "version" in the
+    # body is a conflict.
+    if "HTTP_IF_MATCH" in request.META:
+        status = HTTPStatus.PRECONDITION_FAILED
+    else:
+        status = HTTPStatus.CONFLICT
+    return json_response(
+        {"message": "다른 곳에서 이미 수정되었습니다", "version": error.version},
+        status=status,
+    )
 
 
 @login_required
-@require_POST
+@require_http_methods(["POST", "PATCH"])
 def post_edit(request, pk):
-    post = get_object_or_404(Post, pk=pk)
+    try:
+        data = json.loads(request.body)
+        changes = _submitted_changes(request, data, ("title", "text"), ("publish_at",))
+        if "text" in changes:
+            # update() skips Post.save(), which keeps these in step with text.
+            changes.update(summarize(changes["text"]))
+            changes["text_html"] = render_one(changes["text"])
+        if "publish_at" in changes:
+            changes["publish_at"] = _parse_publish_at(changes)
+        version = edits.parse_version(request, data)
+    except (ValueError, KeyError):
+        if not Post.objects.filter(pk=pk).exists():
+            raise Http404("No Post matches the given query.")
+        return _bad_request()
 
-    data = json.loads(request.body)
-    post.author = request.user
+    if request.method == "POST":
+        # A full edit also makes the editor the author, as it always has.
+        changes["author"] = request.user
     try:
-        post.title = data["title"]
-        post.text = data["text"]
-    except KeyError:
-        return JsonResponse({"message": "잘못된 입력입니다"}, status=HTTPStatus.BAD_REQUEST)
-    else:
-        post.save()
-        return JsonResponse(model_to_dict(post), status=HTTPStatus.OK)
+        row = edits.edit(Post, pk, changes, post_serializer.fields, version)
+    except Post.DoesNotExist:
+        raise Http404("No Post matches the given query.")
+    except edits.EditConflict as error:
+        return _conflict(request, error)
+
+    # update() sends no post_save, so invalidate here.
+    invalidate_post(pk)
+    return _edited(post_serializer, row)
 
 
 @login_required
 def post_draft_list(request):
-    posts = Post.objects.filter(published_date__isnull=True).order_by("created_date")
+    posts = Post.objects.filter(published_date__isnull=True)
+    author = request.GET.get("author")
+    if author:
+        # ?author=me or ?author=<user id>, served by blog_post_author_draft_idx
+        if author == "me":
+            author = request.user.pk
+        try:
+            author = int(author)
+        except ValueError:
+            return _bad_request()
+        if not is_id(author):
+            return _bad_request()
+        posts = posts.filter(author_id=author)
+    return _list_response(request, posts, ("created_date", "id"), post_list_serializer)
 
-    return JsonResponse(
-        data=[model_to_dict(post) for post in posts],
-        status=HTTPStatus.OK,
-        safe=False,
-    )
+
+@login_required
+def author_dashboard(request):
+    return json_response(dashboard.author_dashboard(request.user))
 
 
 @login_required
@@ -73,29 +355,100 @@ def post_draft_list(request):
 def post_publish(request, pk):
     post = get_object_or_404(Post, pk=pk)
     post.publish()
-    return JsonResponse(model_to_dict(post), status=HTTPStatus.OK)
+    return json_response(post_serializer.from_instance(post))
 
 
 @require_http_methods("DELETE")
 def post_remove(request, pk):
-    post = get_object_or_404(Post, pk=pk)
-    post.delete()
-    return JsonResponse(model_to_dict(post), status=HTTPStatus.NO_CONTENT)
+    # Only a tombstone, one UPDATE however many comments the post has;
+    # `manage.py purge_removed_posts` deletes the rows later.
+    removed = edits.update_returning(
+        Post.objects.filter(pk=pk), {"is_removed": True}, post_serializer.fields
+    )
+    if not removed:
+        raise Http404("No Post matches the given query.")
+    invalidate_post(pk)
+    return json_response(
+        post_serializer.serialize(removed[0], post_serializer.fields),
+        status=HTTPStatus.NO_CONTENT,
+    )
+
+
+def _add_comment_buffered(request, pk):
+    # Validate now, write later: the comment joins the next batch INSERT.
+    try:
+        data = json.loads(request.body)
+        author, text = data["author"], data["text"]
+    except (ValueError, TypeError, KeyError):
+        return _bad_request()
+    author_field = Comment._meta.get_field("author")
+    if (
+        not isinstance(author, str)
+        or not isinstance(text, str)
+        or len(author) > author_field.max_length
+    ):
+        return _bad_request()
+    if not Post.objects.filter(pk=pk).exists():
+        raise Http404("No Post matches the given query.")
+    try:
+        parent = _reply_parent(pk, data)
+    except threads.InvalidParent:
+        return _bad_request()
+    parent_id = parent.pk if parent else None
+
+    return json_response(
+        {
+            "provisional_id": submit_comment(pk, author, text, parent_id),
+            "post": pk,
+            "author": author,
+            "text": text,
+            "approved_comment": False,
+            "parent": parent_id,
+        },
+        status=HTTPStatus.ACCEPTED,
+    )
+
+
+def _reply_parent(post_id, data):
+    # The comment a new comment replies to, if any: it must be on the same
+    # post and leave room for one more level.
+    parent = data.get("parent")
+    if parent is None:
+        return None
+    if not is_id(parent):
+        raise threads.InvalidParent(parent)
+    try:
+        parent = Comment.objects.only("id", "path", "depth").get(
+            pk=parent, post_id=post_id
+        )
+    except Comment.DoesNotExist:
+        raise threads.InvalidParent(parent)
+    if parent.depth >= threads.MAX_DEPTH:
+        raise threads.InvalidParent(parent.pk)
+    return parent
 
 
 @require_POST
 def add_comment_to_post(request, pk):
+    if getattr(settings, "BLOG_COMMENT_INGEST_BUFFERED", False):
+        return _add_comment_buffered(request, pk)
+
     post = get_object_or_404(Post, pk=pk)
     data = json.loads(request.body)
 
     try:
         comment = Comment.objects.create(
-            post=post, author=data["author"], text=data["text"]
+            post=post,
+            author=data["author"],
+            text=data["text"],
+            parent=_reply_parent(pk, data),
         )
-    except KeyError:
+    except (KeyError, threads.InvalidParent):
         return JsonResponse({"message": "잘못된 입력입니다"}, status=HTTPStatus.BAD_REQUEST)
     else:
-        return JsonResponse(model_to_dict(comment), status=HTTPStatus.CREATED)
+        return json_response(
+            comment_serializer.from_instance(comment), status=HTTPStatus.CREATED
+        )
 
 
 @login_required
@@ -106,7 +459,7 @@ def comment_approve(request, pk):
         return JsonResponse({}, status=HTTPStatus.NOT_FOUND)
 
     comment.approve()
-    return JsonResponse(model_to_dict(comment), status=HTTPStatus.OK)
+    return json_response(comment_serializer.from_instance(comment))
 
 
 @require_http_methods("DELETE")
@@ -120,31 +473,186 @@ def comment_remove(request, pk):
     return JsonResponse(data={}, status=HTTPStatus.NO_CONTENT)
 
 
-@require_POST
+@require_http_methods(["POST", "PATCH"])
 def comment_edit(request, pk):
-    data = json.loads(request.body)
     try:
-        comment = Comment.objects.get(pk=pk)
-        comment.author = data["author"]
-        comment.text = data["text"]
+        data = json.loads(request.body)
+        changes = _submitted_changes(request, data, ("author", "text"))
+        if "text" in changes:
+            changes["text_html"] = render_one(changes["text"])
+        version = edits.parse_version(request, data)
+        author_field = Comment._meta.get_field("author")
+        if len(changes.get("author", "")) > author_field.max_length:
+            raise ValueError("author is too long")
+    except (ValueError, KeyError):
+        if not Comment.objects.filter(pk=pk).exists():
+            return JsonResponse({}, status=HTTPStatus.NOT_FOUND)
+        return JsonResponse({}, status=HTTPStatus.BAD_REQUEST)
+
+    try:
+        row = edits.edit(Comment, pk, changes, comment_serializer.fields, version)
     except Comment.DoesNotExist:
         return JsonResponse({}, status=HTTPStatus.NOT_FOUND)
-    except KeyError:
-        return JsonResponse({}, status=HTTPStatus.BAD_REQUEST)
-    else:
-        comment.save()
-        return JsonResponse(model_to_dict(comment), status=HTTPStatus.OK)
+    except edits.EditConflict as error:
+        return _conflict(request, error)
+
+    invalidate_post(row["post"])
+    return _edited(comment_serializer, row)
+
+
+def post_search(request):
+    query = request.GET.get("q", "").strip()
+    try:
+        page = int(request.GET.get("page", 1))
+        page_size = get_page_size(request)
+    except (ValueError, InvalidCursor):
+        return _bad_request()
+    last_page = getattr(settings, "BLOG_SEARCH_MAX_PAGE", MAX_PAGE)
+    if not query or not 1 <= page <= last_page:
+        return _bad_request()
+
+    results = search(query, limit=page_size + 1, offset=(page - 1) * page_size)
+    return json_response(
+        {
+            "results": results[:page_size],
+            "next": page + 1 if len(results) > page_size and page < last_page else None,
+            "prev": page - 1 if page > 1 else None,
+        }
+    )
+
+
+def _bulk_moderate(request, moderate, result_key):
+    try:
+        ids = select_comment_ids(json.loads(request.body))
+    except (ValueError, InvalidSelection):
+        return _bad_request()
+
+    return json_response({result_key: moderate(ids)})
+
+
+@login_required
+@require_POST
+def comment_bulk_approve(request):
+    return _bulk_moderate(request, approve_comments, "approved")
 
-  
+
+@login_required
+@require_POST
+def comment_bulk_remove(request):
+    return _bulk_moderate(request, remove_comments, "removed")
+
+
+def _post_comments(pk):
+    return Comment.objects.filter(post_id=pk, post__is_removed=False)
+
+
+@conditional(
+    lambda request, pk: collection_state(_post_comments(pk)), modified_since=False
+)
 def comment_list(request, pk):
+    if not Post.objects.filter(pk=pk).exists():
+        return JsonResponse({}, status=HTTPStatus.NOT_FOUND)
+
+    comments = Comment.objects.filter(post__pk=pk)
+    return _list_response(request, comments, ("id",), comment_serializer)
+
+
+def _optional_int(request, name):
+    value = request.GET.get(name)
+    if value is None:
+        return None
+    if not value.isdigit() or not is_id(int(value)):
+        raise ValueError("{} must be a non-negative integer".format(name))
+    return int(value)
+
+
+@conditional(
+    lambda request, pk: collection_state(_post_comments(pk)), modified_since=False
+)
+def comment_thread(request, pk):
+    """
+    The post's comments as nested threads, or with ``?root=`` one comment's
+    subtree; ``?depth=`` limits how many levels below it are returned.
+
+    One range query on (post, path) in thread order, paged by path, so a
+    page continues the thread where the previous one stopped.
+    """
+    if not Post.objects.filter(pk=pk).exists():
+        return JsonResponse({}, status=HTTPStatus.NOT_FOUND)
+
     try:
-        Post.objects.get(pk=pk)
-    except Post.DoesNotExist:
+        fields = comment_serializer.parse_fields(request)
+        root = _optional_int(request, "root")
+        depth = _optional_int(request, "depth")
+    except (InvalidFields, ValueError):
+        return _bad_request()
+    if depth is not None:
+        # No thread goes deeper, and top + depth must still fit the column.
+        depth = min(depth, threads.MAX_DEPTH)
+
+    try:
+        comments = threads.thread(Comment.objects.filter(post_id=pk), root, depth)
+    except Comment.DoesNotExist:
         return JsonResponse({}, status=HTTPStatus.NOT_FOUND)
 
-    comments = Comment.objects.filter(post__pk=pk).order_by("pk")
-    return JsonResponse(
-        data=[model_to_dict(comment) for comment in comments],
-        status=HTTPStatus.OK,
-        safe=False,
+    try:
+        rows, next_cursor, prev_cursor = paginate(
+            request,
+            comment_serializer.values(comments, fields, extra=("id", "parent", "path")),
+            ("path",),
+        )
+    except InvalidCursor:
+        return _bad_request()
+
+    return json_response(
+        {
+            "results": threads.nest(
+                rows, lambda row: comment_serializer.serialize(row, fields)
+            ),
+            "next": next_cursor,
+            "prev": prev_cursor,
+        }
     )
+
+
+@login_required
+def post_export(request):
+    return ndjson_response(export_records(), encode)
+
+
+def _import_checkpoint(request):
+    key = request.META.get("HTTP_IDEMPOTENCY_KEY")
+    if not key:
+        return Checkpoint()
+    directory = getattr(settings, "BLOG_IMPORT_CHECKPOINT_DIR", None)
+    if not directory:
+        directory = os.path.join(tempfile.gettempdir(), "blog-import")
+    os.makedirs(directory, exist_ok=True)
+    # Hashed, so any key is a safe file name and one user can't resume
+    # another's import.
+    name = hashlib.sha256("{}\0{}".format(request.user.pk, key).encode()).hexdigest()
+    return Checkpoint(os.path.join(directory, name))
+
+
+@login_required
+@require_POST
+def post_import(request):
+    """
+    Load NDJSON written by post_export. The body is read line by line, never
+    loaded whole.
+
+    With an ``Idempotency-Key`` header, progress is checkpointed under that
+    key: posting the same file with the same key again resumes after the
+    last committed batch, or imports nothing if the first attempt finished.
+    Without one, a failed import can't be resumed; re-posting the file
+    imports the committed batches again.
+    """
+    importer = Importer(checkpoint=_import_checkpoint(request))
+    try:
+        importer.run(request)
+    except InvalidRecord as error:
+        return json_response(
+            {"message": str(error), "line": error.line, "imported": importer.counts},
+            status=HTTPStatus.BAD_REQUEST,
+        )
+    return json_response({"imported": importer.counts})
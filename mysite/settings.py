@@ -36,11 +36,14 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
-    "blog",
+    "blog.apps.BlogConfig",
     "django_extensions",
 ]
 
 MIDDLEWARE = [
+    "blog.middleware.MetricsMiddleware",
+    "blog.middleware.ReplicaRoutingMiddleware",
+    "blog.middleware.CompressionMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -86,8 +89,36 @@ DATABASES = {
     }
 }
 
-# db_from_env = dj_database_url.config(conn_max_age=500)
-# DATABASES['default'].update(db_from_env)
+db_from_env = dj_database_url.config(conn_max_age=500)
+DATABASES["default"].update(db_from_env)
+
+# Read replicas for post_list, post_detail and comment_list, as a comma
+# separated BLOG_READ_REPLICA_URLS. Locally two SQLite files work: copy
+# db.sqlite3 and point the URL at the copy (sqlite:////path/to/replica.sqlite3).
+BLOG_READ_REPLICAS = []
+for index, url in enumerate(
+    url for url in os.environ.get("BLOG_READ_REPLICA_URLS", "").split(",") if url
+):
+    alias = "replica{}".format(index + 1)
+    DATABASES[alias] = dj_database_url.parse(url, conn_max_age=500)
+    # Tests read the replicas through the default test database.
+    DATABASES[alias]["TEST"] = {"MIRROR": "default"}
+    BLOG_READ_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ["blog.routers.ReplicaRouter"]
+# "random" or "round_robin"
+BLOG_REPLICA_POLICY = os.environ.get("BLOG_REPLICA_POLICY", "random")
+# After a write the client reads from the primary for this long, so it sees
+# its own changes despite replication lag.
+BLOG_PRIMARY_PIN_SECONDS = 10
+
+# Use a shared backend (memcached/redis) in production so cache entries and
+# recompute locks are shared by all workers.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
 
 # Password validation
 # https://docs.djangoproject.com/en/2.0/ref/settings/#auth-password-validators
@@ -125,7 +156,9 @@ USE_TZ = True
 
 STATIC_URL = "/static/"
 STATIC_ROOT = os.path.join(BASE_DIR, "static")
-# STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+# collectstatic writes content-hashed copies plus .gz versions, and
+# mysite.wsgi serves them with far-future immutable caching.
+STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 
 ALLOWED_HOSTS = [
     "127.0.0.1",
@@ -134,29 +167,94 @@ ALLOWED_HOSTS = [
 ]
 LOGIN_REDIRECT_URL = "/"
 
+# Keyset pagination for list endpoints; ?page_size= is capped at the maximum
+BLOG_PAGE_SIZE = 20
+BLOG_MAX_PAGE_SIZE = 100
+# Search is paged by ?page=, which can't go past this one
+BLOG_SEARCH_MAX_PAGE = 50
+
+# Read-through cache for post_detail payloads, invalidated by model signals
+BLOG_CACHE_ALIAS = "default"
+BLOG_POST_CACHE_TIMEOUT = 300
+
+# Most ids one post_batch request may ask for
+BLOG_POST_BATCH_LIMIT = 500
+
+# Comments per UPDATE/DELETE statement in bulk moderation
+BLOG_MODERATION_CHUNK_SIZE = 500
+
+# Per-view latency/query histograms. Set BLOG_METRICS_PATH (e.g. "/metrics")
+# to expose them; with BLOG_METRICS_DIR every worker writes snapshots there and
+# the endpoint sums them across workers.
+BLOG_METRICS_PATH = os.environ.get("BLOG_METRICS_PATH")
+BLOG_METRICS_DIR = os.environ.get("BLOG_METRICS_DIR")
+BLOG_METRICS_FLUSH_INTERVAL = 5.0
+
+# Rows fetched per database round trip by streaming (?stream=1 / NDJSON) exports
+BLOG_STREAM_CHUNK_SIZE = 2000
+
+# Records per bulk_create/transaction in blog_import and the import endpoint
+BLOG_IMPORT_BATCH_SIZE = 1000
+# Where the import endpoint keeps the progress of imports sent with an
+# Idempotency-Key header (default: a directory in the system temp dir). Use
+# a shared directory when several hosts serve the endpoint.
+BLOG_IMPORT_CHECKPOINT_DIR = os.environ.get("BLOG_IMPORT_CHECKPOINT_DIR")
+
+# JSON/NDJSON responses smaller than this are sent uncompressed
+BLOG_GZIP_MIN_SIZE = 1024
+
+# Opt-in write coalescing for add_comment_to_post: comments are validated,
+# answered with 202 and a provisional id, and written by a background thread
+# in one INSERT every BLOG_COMMENT_INGEST_INTERVAL seconds or as soon as
+# BLOG_COMMENT_INGEST_MAX_ROWS are waiting. With a journal directory, accepted
+# comments are also appended to a local file that is replayed when the next
+# worker starts if the worker dies before writing them.
+BLOG_COMMENT_INGEST_BUFFERED = os.environ.get("BLOG_COMMENT_INGEST_BUFFERED") == "1"
+BLOG_COMMENT_INGEST_INTERVAL = 0.05
+BLOG_COMMENT_INGEST_MAX_ROWS = 500
+BLOG_COMMENT_INGEST_JOURNAL_DIR = os.environ.get("BLOG_COMMENT_INGEST_JOURNAL_DIR")
+BLOG_COMMENT_INGEST_FSYNC = False
+
+# Seconds between `manage.py run_publisher` ticks, i.e. the most a scheduled
+# post waits past its publish_at (see blog_publish_lag_seconds)
+BLOG_PUBLISHER_INTERVAL = 1.0
+
+# post_remove only marks a post removed; `manage.py purge_removed_posts`
+# deletes it and its comments, BLOG_PURGE_CHUNK_SIZE comments per DELETE
+BLOG_PURGE_CHUNK_SIZE = 1000
+BLOG_PURGE_INTERVAL = 5.0
+
+# Log records are filtered on the calling thread and formatted and written by
+# a background thread (blog.log.QueuedStreamHandler), so requests never wait
+# on stdout. SQL lines are sampled and request errors rate-limited per second.
+# BLOG_LOG_FORMAT=json switches to one JSON object per line.
 LOGGING = {
-     'version': 1,
-     'disable_existing_loggers': False,
-     'formatters': {
-         'verbose': {
-             'format': '%(asctime)s-%(module)s-%(levelname)s :: %(message)s'
-         },
-         'simple': {
-             'format': '%(levelname)s :: %(message)s'
-         }
-     },
-     'handlers': {
-           'console': {
-             'level': 'DEBUG',
-             'class': 'logging.StreamHandler',
-             'formatter': 'verbose'
-         },
-     },
-     'loggers': {
-         'django': {
-             'handlers': ['console'],
-             'propagate': False,
-             'level': 'DEBUG'
-         },
-     }
- }
+    "version": 1,
+    "disable_existing_loggers": False,
+    "filters": {
+        "sample": {
+            "()": "blog.log.SamplingFilter",
+            "rates": {"django.db.backends": 0.01},
+        },
+        "rate_limit": {
+            "()": "blog.log.RateLimitFilter",
+            "limits": {"django.request": 50},
+        },
+    },
+    "formatters": {
+        "verbose": {"format": "%(asctime)s-%(module)s-%(levelname)s :: %(message)s"},
+        "simple": {"format": "%(levelname)s :: %(message)s"},
+        "json": {"()": "blog.log.JsonFormatter"},
+    },
+    "handlers": {
+        "console": {
+            "level": "DEBUG",
+            "class": "blog.log.QueuedStreamHandler",
+            "formatter": os.environ.get("BLOG_LOG_FORMAT", "verbose"),
+            "filters": ["sample", "rate_limit"],
+        },
+    },
+    "loggers": {
+        "django": {"handlers": ["console"], "propagate": False, "level": "DEBUG"},
+    },
+}
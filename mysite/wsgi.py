@@ -9,12 +9,43 @@ https://docs.djangoproject.com/en/2.0/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
 from django.core.wsgi import get_wsgi_application
 from whitenoise import WhiteNoise
-# from my_project import MyWSGIApp
-#
-# application = MyWSGIApp()
-# application = WhiteNoise(application)
+
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "mysite.settings")
 
+
+class StaticFiles(WhiteNoise):
+    """
+    Serves collectstatic output before the request reaches Django. Files
+    listed in the staticfiles manifest have a content hash in their name and
+    are cached forever (Cache-Control: immutable); the .gz copies written by
+    collectstatic go to clients that accept gzip.
+    """
+
+    def __init__(self, application, root, prefix, storage):
+        # Set before super().__init__(), which calls immutable_file_test()
+        # for every file it adds.
+        self.static_prefix = "/" + prefix.strip("/") + "/"
+        self.hashed_names = set(getattr(storage, "hashed_files", {}).values())
+        super().__init__(application, root=root, prefix=prefix)
+
+    def immutable_file_test(self, path, url):
+        return url[len(self.static_prefix) :] in self.hashed_names
+
+
 application = get_wsgi_application()
+
+if getattr(settings, "BLOG_COMMENT_INGEST_BUFFERED", False):
+    # Start the comment writer with the worker rather than with its first
+    # comment, so journals left by a crashed worker are replayed right away.
+    from blog.ingest import get_buffer
+
+    get_buffer()
+
+if os.path.isdir(settings.STATIC_ROOT):
+    application = StaticFiles(
+        application, settings.STATIC_ROOT, settings.STATIC_URL, staticfiles_storage
+    )